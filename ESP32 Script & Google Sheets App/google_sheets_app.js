@@ -1,9 +1,15 @@
 /**
  * Greenhouse Google Sheets Ingestion Script
  * - Receives RAW samples and DAILY SUMMARY rows from Jetson
+ * - Accepts single-row payloads or versioned "batch" payloads
  * - Does NO computation
  * - NULL-safe
  * - Append-only
+ *
+ * Replies (always HTTP 200):
+ *   OK       rows written
+ *   INVALID  the payload itself is bad; the gateway sets it aside
+ *   ERROR    the script failed (quota, lock, sheet setup); the gateway retries
  */
 
 /* =========================
@@ -14,6 +20,131 @@ function sheetValue(v) {
   return (v === null || v === undefined) ? "" : v;
 }
 
+// An error in the payload rather than in the script: reported as INVALID
+function invalidPayload(message) {
+  var err = new Error(message);
+  err.name = "InvalidPayload";
+  return err;
+}
+
+function textOutput(text) {
+  return ContentService.createTextOutput(text)
+    .setMimeType(ContentService.MimeType.TEXT);
+}
+
+/* =========================
+   Row Builders
+   ========================= */
+
+function sampleRow(data) {
+  var timestamp = data.local_time
+    ? new Date(data.local_time)
+    : new Date();
+
+  return [
+    timestamp,
+    sheetValue(data.inside_temp_f),
+    sheetValue(data.inside_humidity_rh),
+    sheetValue(data.inside_brightness_lux),
+    sheetValue(data.outside_brightness_raw),
+    sheetValue(data.cloud_coverage_pct),
+    sheetValue(data.circulation_fan_pwm),
+    sheetValue(data.exhaust_fan_pwm),
+    sheetValue(data.grow_light_pwm),
+    sheetValue(data.intent_window),
+    sheetValue(data.control_mode),
+    sheetValue(data.control_reason)
+  ];
+}
+
+function summaryRow(dateString, data) {
+  return [
+    dateString,
+    sheetValue(data.season_state),
+    sheetValue(data.avg_temp_f),
+    sheetValue(data.min_temp_f),
+    sheetValue(data.max_temp_f),
+    sheetValue(data.avg_humidity_rh),
+    sheetValue(data.total_light_minutes),
+    sheetValue(data.total_exhaust_minutes),
+    sheetValue(data.total_circulation_minutes),
+    sheetValue(data.notes)
+  ];
+}
+
+/* =========================
+   Batch Writes
+   ========================= */
+
+var BATCH_PROTOCOL_VERSION = 1;
+
+// Write all rows below the current last row with one range write
+function appendRows(sheet, rows) {
+  if (rows.length === 0) return;
+  sheet.getRange(sheet.getLastRow() + 1, 1, rows.length, rows[0].length)
+    .setValues(rows);
+}
+
+/*
+ * Batch payload:
+ * {
+ *   "type": "batch",
+ *   "version": 1,
+ *   "days": [
+ *     { "date": "YYYY-MM-DD", "samples": [ {...}, ... ], "summaries": [ {...} ] }
+ *   ]
+ * }
+ */
+function handleBatch(ss, data) {
+  if (data.version !== BATCH_PROTOCOL_VERSION) {
+    throw invalidPayload("Unsupported batch version: " + data.version);
+  }
+
+  var days = data.days || [];
+  if (!Array.isArray(days)) throw invalidPayload("Batch days is not a list");
+  for (var v = 0; v < days.length; v++) {
+    if (!days[v] || !/^\d{4}-\d{2}-\d{2}$/.test(days[v].date)) {
+      throw invalidPayload("Batch day without a YYYY-MM-DD date");
+    }
+  }
+
+  // Sheet setup takes the script lock itself, so do it before writing
+  for (var i = 0; i < days.length; i++) {
+    ensureDailySheets(ss, days[i].date);
+  }
+
+  var lock = LockService.getScriptLock();
+  lock.waitLock(30000);
+
+  try {
+    for (var d = 0; d < days.length; d++) {
+      var day = days[d];
+      var samples = day.samples || [];
+      var summaries = day.summaries || [];
+
+      if (samples.length > 0) {
+        var rawSheet = ss.getSheetByName(day.date + " RAW");
+        if (!rawSheet) throw new Error("RAW sheet missing for " + day.date);
+        appendRows(rawSheet, samples.map(sampleRow));
+      }
+
+      if (summaries.length > 0) {
+        var summarySheet = ss.getSheetByName(day.date + " SUMMARY");
+        if (!summarySheet) throw new Error("SUMMARY sheet missing for " + day.date);
+
+        // Prevent duplicates: one summary row per day
+        if (summarySheet.getLastRow() > 1) {
+          Logger.log("INFO: Summary already exists for " + day.date);
+        } else {
+          appendRows(summarySheet, [summaryRow(day.date, summaries[summaries.length - 1])]);
+        }
+      }
+    }
+  } finally {
+    lock.releaseLock();
+  }
+}
+
 /* =========================
    Daily Sheet Setup
    ========================= */
@@ -23,11 +154,10 @@ function ensureDailySheets(ss, dateString) {
   var lastSetup = props.getProperty("last_setup_date");
   if (lastSetup === dateString) return;
 
+  // Throws on timeout: the request then fails with "ERROR" and the
+  // gateway retries it, instead of writing to sheets that do not exist
   var lock = LockService.getScriptLock();
-  if (!lock.tryLock(5000)) {
-    Logger.log("WARN: Could not acquire lock for daily sheet setup");
-    return;
-  }
+  lock.waitLock(30000);
 
   try {
     lastSetup = props.getProperty("last_setup_date");
@@ -63,20 +193,39 @@ function ensureDailySheets(ss, dateString) {
 
 function doPost(e) {
   if (!e || !e.postData || !e.postData.contents) {
-    return ContentService.createTextOutput("ERROR: No data")
-      .setMimeType(ContentService.MimeType.TEXT);
+    return textOutput("INVALID: No data");
+  }
+
+  var data;
+  try {
+    data = JSON.parse(e.postData.contents);
+  } catch (parseErr) {
+    return textOutput("INVALID: " + parseErr.toString());
+  }
+  if (!data || typeof data !== "object") {
+    return textOutput("INVALID: Payload is not an object");
   }
 
   try {
-    var data = JSON.parse(e.postData.contents);
     var ss = SpreadsheetApp.getActiveSpreadsheet();
     var tz = ss.getSpreadsheetTimeZone();
 
+    // -------------------------
+    // BATCH PAYLOAD
+    // -------------------------
+    if (data.type === "batch") {
+      handleBatch(ss, data);
+      return textOutput("OK");
+    }
+
     // -------------------------
     // DAILY SUMMARY PAYLOAD
     // -------------------------
     if (data.type === "summary") {
       var dateString = data.date;
+      if (!/^\d{4}-\d{2}-\d{2}$/.test(dateString)) {
+        throw invalidPayload("Summary without a YYYY-MM-DD date");
+      }
       ensureDailySheets(ss, dateString);
 
       var summarySheet = ss.getSheetByName(dateString + " SUMMARY");
@@ -89,23 +238,9 @@ function doPost(e) {
           .setMimeType(ContentService.MimeType.TEXT);
       }
 
-      var summaryRow = [
-        dateString,
-        sheetValue(data.season_state),
-        sheetValue(data.avg_temp_f),
-        sheetValue(data.min_temp_f),
-        sheetValue(data.max_temp_f),
-        sheetValue(data.avg_humidity_rh),
-        sheetValue(data.total_light_minutes),
-        sheetValue(data.total_exhaust_minutes),
-        sheetValue(data.total_circulation_minutes),
-        sheetValue(data.notes)
-      ];
-
-      summarySheet.appendRow(summaryRow);
-
-      return ContentService.createTextOutput("OK")
-        .setMimeType(ContentService.MimeType.TEXT);
+      summarySheet.appendRow(summaryRow(dateString, data));
+
+      return textOutput("OK");
     }
 
     // -------------------------
@@ -119,34 +254,17 @@ function doPost(e) {
     var rawSheet = ss.getSheetByName(dateString + " RAW");
     if (!rawSheet) throw new Error("RAW sheet missing");
 
-    var timestamp = data.local_time
-      ? new Date(data.local_time)
-      : new Date();
-
-    var rowData = [
-      timestamp,
-      sheetValue(data.inside_temp_f),
-      sheetValue(data.inside_humidity_rh),
-      sheetValue(data.inside_brightness_lux),
-      sheetValue(data.outside_brightness_raw),
-      sheetValue(data.cloud_coverage_pct),
-      sheetValue(data.circulation_fan_pwm),
-      sheetValue(data.exhaust_fan_pwm),
-      sheetValue(data.grow_light_pwm),
-      sheetValue(data.intent_window),
-      sheetValue(data.control_mode),
-      sheetValue(data.control_reason)
-    ];
-
-    rawSheet.appendRow(rowData);
-
-    return ContentService.createTextOutput("OK")
-      .setMimeType(ContentService.MimeType.TEXT);
+    rawSheet.appendRow(sampleRow(data));
+
+    return textOutput("OK");
 
   } catch (err) {
+    if (err.name === "InvalidPayload") {
+      Logger.log("INVALID: " + err.message);
+      return textOutput("INVALID: " + err.message);
+    }
     Logger.log("ERROR: " + err);
     Logger.log(err.stack);
-    return ContentService.createTextOutput("ERROR: " + err.toString())
-      .setMimeType(ContentService.MimeType.TEXT);
+    return textOutput("ERROR: " + err.toString());
   }
 }
@@ -0,0 +1,74 @@
+# benchmarks/bench_baseline_analysis.py
+
+"""
+Benchmark for the baseline block analyzer.
+
+    python -m benchmarks.bench_baseline_analysis [--days 7]
+
+Builds a temporary database with `--days` of 5 s samples that follow
+the compiled baseline schedule, then times the single-query load and
+the vectorized per-run computation separately.
+"""
+
+import argparse
+import math
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from greenhouse_intelligence.baseline import analysis
+from greenhouse_intelligence.baseline.scheduler import CONTROL_MODE, BaselineScheduler
+
+INTERVAL_SECONDS = 5
+
+
+def _build_db(path: str, days: float) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE samples (device_id TEXT, timestamp_utc TEXT, control_mode TEXT, "
+        "control_reason TEXT, inside_temp_f REAL, inside_humidity_rh REAL, inside_vpd_kpa REAL, "
+        "PRIMARY KEY (device_id, timestamp_utc))"
+    )
+    scheduler = BaselineScheduler(state_path=None)
+    scheduler.anchor = 0.0
+    start = datetime(2026, 1, 1)
+    rows = []
+    for i in range(int(days * 86400 / INTERVAL_SECONDS)):
+        t = i * INTERVAL_SECONDS
+        segment = scheduler.block_at(t)
+        fan = (segment.circulation_fan_pwm + segment.exhaust_fan_pwm) / 255.0
+        temp = 70 + 5 * math.sin(t / 86400 * 2 * math.pi) - 2 * fan
+        rh = 60 - 8 * fan
+        rows.append((
+            "esp32", (start + timedelta(seconds=t)).isoformat(timespec="microseconds"),
+            CONTROL_MODE, f"{segment.block} ({segment.index + 1}/{len(scheduler.segments)})",
+            temp, rh, 0.6 + 0.3 * fan,
+        ))
+    conn.executemany("INSERT INTO samples VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    return conn
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=float, default=7)
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile(suffix=".db") as f:
+        conn = _build_db(f.name, args.days)
+
+        start = time.perf_counter()
+        arrays = analysis.load_arrays("esp32", "", conn)
+        loaded = time.perf_counter()
+        runs = analysis.compute_runs(arrays)
+        done = time.perf_counter()
+
+        print(f"{len(arrays['ts']):,} samples, {len(runs)} runs")
+        print(f"load     {(loaded - start) * 1e3:8.1f} ms")
+        print(f"compute  {(done - loaded) * 1e3:8.1f} ms")
+        print(f"total    {(done - start) * 1e3:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
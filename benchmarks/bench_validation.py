@@ -0,0 +1,80 @@
+# benchmarks/bench_validation.py
+
+"""
+Microbenchmark for the packet validation stage.
+
+    python -m benchmarks.bench_validation [--n 200000]
+
+Reports the cost per packet for a clean ESP32 packet and for one with
+bad values. Quarantine writes are disabled so only validation itself
+is measured.
+"""
+
+import argparse
+import logging
+import time
+
+from greenhouse_gateway.ingest import validation
+
+GOOD_PACKET = {
+    "sensor_sht4_ok": True,
+    "sensor_apds_ok": True,
+    "sensor_tsl_ok": True,
+    "inside_temp_f": 68.4,
+    "inside_humidity_rh": 71.2,
+    "inside_dew_point_f": 58.7,
+    "inside_vpd_kpa": 0.68,
+    "inside_brightness_lux": 1520,
+    "tsl_full_spectrum": 4021,
+    "tsl_infrared": 1377,
+    "outside_brightness_raw": 812,
+    "outside_color_r": 301,
+    "outside_color_g": 287,
+    "outside_color_b": 244,
+    "circulation_fan_pwm": 120,
+    "grow_light_pwm": 0,
+    "exhaust_fan_pwm": 0,
+    "esp32_runtime_ms": 5761166,
+    "firmware_version": "1.0.0",
+    "wifi_rssi": -42,
+    "mqtt_reconnects": 1,
+}
+
+BAD_PACKET = dict(
+    GOOD_PACKET,
+    inside_temp_f=float("nan"),
+    inside_brightness_lux=4294967295,
+    exhaust_fan_pwm=300,
+)
+
+
+def _bench(packet: dict, n: int) -> float:
+    validate = validation.validate_packet
+    start = time.perf_counter()
+    for _ in range(n):
+        validate(packet)
+    return (time.perf_counter() - start) / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--n", type=int, default=200_000)
+    args = parser.parse_args()
+
+    # Measure validation only: no quarantine rows, no warning logs
+    validation.storage.insert_quarantined_packet = lambda *a: None
+    logging.disable(logging.WARNING)
+
+    for name, packet, n in (
+        ("valid packet", GOOD_PACKET, args.n),
+        ("invalid packet", BAD_PACKET, max(1, args.n // 10)),
+    ):
+        per_packet = _bench(packet, n)
+        print(
+            f"{name:15s} {per_packet * 1e6:8.2f} us/packet "
+            f"{1 / per_packet:12,.0f} packets/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
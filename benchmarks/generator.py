@@ -0,0 +1,126 @@
+# benchmarks/generator.py
+
+"""
+Synthetic ESP32 sensor packets.
+
+Mirrors publishSensorData() in esp32script.cpp: the three sensor_*_ok
+flags, SHT4x fields only when the SHT4x is up, TSL2591 fields only when
+the TSL is up, APDS9960 color fields only when the APDS is up, then
+PWM state and system health. Values follow a slow daily cycle with
+noise so aggregates and validation see realistic numbers.
+
+    gen = PacketGenerator(devices=3, missing_fraction=0.1, malformed_fraction=0.01, seed=1)
+    topic, payload = gen.next_message()
+"""
+
+import json
+import math
+import random
+from typing import Dict, Optional, Tuple
+
+FIRMWARE_VERSION = "1.0.0"
+PUBLISH_INTERVAL_MS = 5000  # ESP32 loop publishes every 5 s
+
+SENSORS = ("sht4", "tsl", "apds")
+
+
+def _c_to_f(c: float) -> float:
+    return c * 9.0 / 5.0 + 32.0
+
+
+def _dew_point_f(temp_c: float, rh: float) -> float:
+    a, b = 17.62, 243.12
+    gamma = math.log(max(rh, 0.1) / 100.0) + a * temp_c / (b + temp_c)
+    return _c_to_f(b * gamma / (a - gamma))
+
+
+def _vpd_kpa(temp_c: float, rh: float) -> float:
+    svp = 0.6108 * math.exp(17.27 * temp_c / (temp_c + 237.3))
+    return svp * (1.0 - rh / 100.0)
+
+
+class PacketGenerator:
+    def __init__(
+        self,
+        devices: int = 1,
+        missing_fraction: float = 0.0,
+        malformed_fraction: float = 0.0,
+        seed: Optional[int] = 0,
+        topic_template: str = "greenhouse/{device_id}/sensors",
+    ):
+        self.device_ids = [f"bench{i + 1}" for i in range(devices)]
+        self.missing_fraction = missing_fraction
+        self.malformed_fraction = malformed_fraction
+        self.topic_template = topic_template
+        self._rng = random.Random(seed)
+        self._runtime_ms: Dict[str, int] = {d: 0 for d in self.device_ids}
+        self._next_device = 0
+
+    def packet(self, device_id: str) -> dict:
+        """One well-formed packet; sensors may be missing."""
+        rng = self._rng
+        self._runtime_ms[device_id] += PUBLISH_INTERVAL_MS
+        runtime_ms = self._runtime_ms[device_id]
+        phase = (runtime_ms / 86_400_000.0) * 2 * math.pi
+
+        ok = {name: rng.random() >= self.missing_fraction for name in SENSORS}
+        doc = {
+            "sensor_sht4_ok": ok["sht4"],
+            "sensor_apds_ok": ok["apds"],
+            "sensor_tsl_ok": ok["tsl"],
+        }
+
+        if ok["sht4"]:
+            temp_c = 21.0 + 4.0 * math.sin(phase) + rng.gauss(0, 0.1)
+            rh = min(100.0, max(0.0, 65.0 - 10.0 * math.sin(phase) + rng.gauss(0, 0.5)))
+            doc["inside_temp_f"] = round(_c_to_f(temp_c), 5)
+            doc["inside_humidity_rh"] = round(rh, 5)
+            doc["inside_dew_point_f"] = round(_dew_point_f(temp_c, rh), 5)
+            doc["inside_vpd_kpa"] = round(_vpd_kpa(temp_c, rh), 5)
+
+        if ok["tsl"]:
+            full = max(0, int(20000 + 18000 * math.sin(phase) + rng.gauss(0, 200)))
+            ir = full // 3
+            doc["inside_brightness_lux"] = max(0, int(full * 0.4))
+            doc["tsl_full_spectrum"] = full & 0xFFFF
+            doc["tsl_infrared"] = ir & 0xFFFF
+
+        if ok["apds"]:
+            c = max(0, int(3000 + 2500 * math.sin(phase) + rng.gauss(0, 50))) & 0xFFFF
+            doc["outside_brightness_raw"] = c
+            doc["outside_color_r"] = c // 3
+            doc["outside_color_g"] = c // 3
+            doc["outside_color_b"] = c // 4
+
+        doc["circulation_fan_pwm"] = rng.choice((0, 112, 172, 227))
+        doc["grow_light_pwm"] = 0
+        doc["exhaust_fan_pwm"] = rng.choice((0, 0, 125))
+
+        doc["esp32_runtime_ms"] = runtime_ms
+        doc["firmware_version"] = FIRMWARE_VERSION
+        doc["wifi_rssi"] = rng.randint(-80, -40)
+        doc["mqtt_reconnects"] = 0
+        return doc
+
+    def _malformed(self, device_id: str) -> bytes:
+        """A payload the gateway must survive: bad JSON, wrong types, out of range."""
+        kind = self._rng.randrange(4)
+        if kind == 0:
+            return json.dumps(self.packet(device_id)).encode()[:-7]  # truncated JSON
+        doc = self.packet(device_id)
+        if kind == 1:
+            doc["inside_temp_f"] = "NaN"
+        elif kind == 2:
+            doc["exhaust_fan_pwm"] = 300
+        else:
+            return b"[1, 2, 3]"
+        return json.dumps(doc).encode()
+
+    def next_message(self) -> Tuple[str, bytes]:
+        """(topic, payload) for the next device in round-robin order."""
+        device_id = self.device_ids[self._next_device]
+        self._next_device = (self._next_device + 1) % len(self.device_ids)
+        topic = self.topic_template.format(device_id=device_id)
+        if self._rng.random() < self.malformed_fraction:
+            return topic, self._malformed(device_id)
+        return topic, json.dumps(self.packet(device_id), separators=(",", ":")).encode()
@@ -0,0 +1,345 @@
+# benchmarks/suite.py
+
+"""
+Gateway benchmark suite.
+
+    python -m benchmarks.suite [--n 5000] [--devices 3] [--rate 0]
+                               [--missing 0.05] [--malformed 0.01]
+                               [--out results.json] [--compare old.json]
+
+Runs against a throwaway database and runtime directory (nothing under
+db/ or runtime/ is touched), with an in-process MQTT stand-in that
+calls mqtt_client.on_message the way paho's network thread does, and a
+stub HTTP server in place of the Apps Script endpoint.
+
+Cases:
+  process_packet      data_collector.process_packet per packet
+  insert_reading      storage.insert_sensor_reading + final flush
+  compute_average     google_sheets._compute_average over 5-min windows
+  end_to_end          MQTT callback -> queue -> main loop -> DB/Sheets
+
+Each case reports packets/s, p50/p99 latency (ms) and process RSS.
+Results are written as JSON (default benchmarks/results/<time>-<git rev>.json)
+so runs from different versions can be diffed with --compare.
+"""
+
+import argparse
+import json
+import logging
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+
+from benchmarks.generator import PacketGenerator
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+# ---------------------------------------------------------------------
+# Environment
+# ---------------------------------------------------------------------
+
+class _StubSheets(BaseHTTPRequestHandler):
+    requests = 0
+    rows = 0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        type(self).requests += 1
+        if body.get("type") == "batch":
+            type(self).rows += sum(len(day["samples"]) + len(day["summaries"]) for day in body["days"])
+        else:
+            type(self).rows += 1
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(b"OK")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _start_stub_sheets() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubSheets)
+    threading.Thread(target=server.serve_forever, name="stub-sheets", daemon=True).start()
+    return server
+
+
+def _isolate(workdir: Path, sheets_url: str):
+    """Point every gateway file path at `workdir` before anything opens them."""
+    from greenhouse_gateway.control import command_dispatcher
+    from greenhouse_gateway.persist import history_ring, latest_state, storage
+    from greenhouse_gateway.publish import google_sheets
+
+    storage.DB_PATH = workdir / "bench.db"
+    latest_state.SNAPSHOT_PATH = workdir / "latest_packet.json"
+    history_ring.RUNTIME_DIR = workdir
+    command_dispatcher.COMMANDS_PATH = workdir / "commands.json"
+    google_sheets.GOOGLE_SHEETS_ENDPOINT = sheets_url
+
+
+def _rss_mb() -> dict:
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return {
+        "rss_mb": round(pages * resource.getpagesize() / 2**20, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def _latency_stats(samples: list, elapsed: float, count: int) -> dict:
+    ordered = sorted(samples)
+
+    def pct(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1e3, 4) if ordered else None
+
+    stats = {
+        "packets": count,
+        "seconds": round(elapsed, 3),
+        "packets_per_s": round(count / elapsed, 1) if elapsed else None,
+        "p50_ms": pct(0.50),
+        "p99_ms": pct(0.99),
+    }
+    stats.update(_rss_mb())
+    return stats
+
+
+def _packets(gen: PacketGenerator, n: int) -> list:
+    out = []
+    for i in range(n):
+        device_id = gen.device_ids[i % len(gen.device_ids)]
+        packet = gen.packet(device_id)
+        packet["device_id"] = device_id
+        out.append(packet)
+    return out
+
+
+# ---------------------------------------------------------------------
+# Cases
+# ---------------------------------------------------------------------
+
+def bench_process_packet(gen, n):
+    from greenhouse_gateway.ingest import data_collector
+    from greenhouse_gateway.persist import storage
+
+    packets = _packets(gen, n)
+    process = data_collector.process_packet
+    latencies = []
+    start = time.perf_counter()
+    for packet in packets:
+        t = time.perf_counter()
+        process(packet)
+        latencies.append(time.perf_counter() - t)
+    storage.flush()
+    return _latency_stats(latencies, time.perf_counter() - start, n)
+
+
+def bench_insert_reading(gen, n):
+    from greenhouse_gateway.ingest import data_collector
+    from greenhouse_gateway.persist import storage
+
+    rows = [data_collector.enrich_packet(data_collector.normalize_packet(p)) for p in _packets(gen, n)]
+    insert = storage.insert_sensor_reading
+    latencies = []
+    start = time.perf_counter()
+    for row in rows:
+        t = time.perf_counter()
+        insert(row)
+        latencies.append(time.perf_counter() - t)
+    flush_start = time.perf_counter()
+    storage.flush()
+    stats = _latency_stats(latencies, time.perf_counter() - start, n)
+    stats["flush_ms"] = round((time.perf_counter() - flush_start) * 1e3, 2)
+    return stats
+
+
+def bench_compute_average(gen, n):
+    from greenhouse_gateway.ingest import data_collector
+    from greenhouse_gateway.publish import google_sheets
+
+    window = int(google_sheets.UPLOAD_INTERVAL // 5) or 1  # packets per upload window
+    packets = [data_collector.enrich_packet(data_collector.normalize_packet(p)) for p in _packets(gen, window)]
+    calls = max(1, n // window)
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(calls):
+        t = time.perf_counter()
+        google_sheets._compute_average(packets)
+        latencies.append(time.perf_counter() - t)
+    stats = _latency_stats(latencies, time.perf_counter() - start, calls * window)
+    stats["window_packets"] = window
+    return stats
+
+
+def bench_end_to_end(gen, n, rate):
+    from greenhouse_gateway import main as gateway
+    from greenhouse_gateway.ingest import mqtt_client
+    from greenhouse_gateway.persist import storage
+    from greenhouse_gateway.publish import google_sheets
+
+    messages = [gen.next_message() for _ in range(n)]
+    done = threading.Event()
+
+    # Unthrottled runs measure sustained throughput: let the queue push
+    # back on the producer instead of dropping
+    queues = mqtt_client._sensor_queues
+    saved_policy = queues.policy
+    if not rate:
+        queues.policy = "block"
+
+    def produce():
+        # Stand-in for paho's network thread
+        interval = 1.0 / rate if rate else 0.0
+        next_at = time.perf_counter()
+        for topic, payload in messages:
+            if interval:
+                next_at += interval
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            if payload.startswith(b"{") and payload.endswith(b"}"):
+                # Stamp the send time; unknown keys pass through untouched
+                payload = payload[:-1] + b',"bench_sent_at":%r}' % time.perf_counter()
+            mqtt_client.on_message(None, None, SimpleNamespace(topic=topic, payload=payload))
+        done.set()
+
+    latencies = []
+    processed = 0
+    producer = threading.Thread(target=produce, name="bench-producer", daemon=True)
+    start = time.perf_counter()
+    producer.start()
+    while not (done.is_set() and mqtt_client.sensor_queue_depth() == 0):
+        for packet in mqtt_client.wait_for_sensor_packets(0.05, gateway.DRAIN_BATCH_SIZE):
+            gateway._process_packets([packet])
+            processed += 1
+            sent_at = packet.get("bench_sent_at") if isinstance(packet, dict) else None
+            if sent_at is not None:
+                latencies.append(time.perf_counter() - sent_at)
+    storage.flush()
+    elapsed = time.perf_counter() - start
+    queues.policy = saved_policy
+
+    # Give the uploader a moment to drain what the run queued
+    deadline = time.monotonic() + 10
+    while google_sheets.get_outbox_stats()["depth"] and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    stats = _latency_stats(latencies, elapsed, processed)
+    stats.update(
+        published=n,
+        dropped=sum(mqtt_client.sensor_queue_dropped().values()),
+        sheets_requests=_StubSheets.requests,
+        sheets_rows=_StubSheets.rows,
+        sheets_outbox_depth=google_sheets.get_outbox_stats()["depth"],
+        target_rate=rate or None,
+    )
+    return stats
+
+
+# ---------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------
+
+def _git_rev() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=Path(__file__).resolve().parent, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _compare(current: dict, previous_path: str) -> None:
+    previous = json.loads(Path(previous_path).read_text())
+    print(f"\nvs {previous_path} ({previous['meta'].get('git_rev')}):")
+    for case, stats in current["cases"].items():
+        old = previous.get("cases", {}).get(case)
+        if not old:
+            continue
+        parts = []
+        for key in ("packets_per_s", "p50_ms", "p99_ms", "peak_rss_mb"):
+            if stats.get(key) and old.get(key):
+                parts.append(f"{key} x{stats[key] / old[key]:.2f}")
+        print(f"  {case:16s} " + "  ".join(parts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--n", type=int, default=5000, help="packets per case")
+    parser.add_argument("--devices", type=int, default=3)
+    parser.add_argument("--rate", type=float, default=0, help="end-to-end publish rate, packets/s (0 = max)")
+    parser.add_argument("--missing", type=float, default=0.05, help="fraction of readings with a sensor down")
+    parser.add_argument("--malformed", type=float, default=0.01, help="fraction of malformed payloads")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="results JSON path")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    # Malformed payloads, quarantines and queue-full drops are expected here
+    logging.disable(logging.ERROR)
+
+    with tempfile.TemporaryDirectory(prefix="gh-bench-") as tmp:
+        stub = _start_stub_sheets()
+        _isolate(Path(tmp), f"http://127.0.0.1:{stub.server_address[1]}/exec")
+
+        from greenhouse_gateway.persist import storage
+        from greenhouse_gateway.publish import google_sheets
+
+        def generator():
+            return PacketGenerator(args.devices, args.missing, args.malformed, args.seed)
+
+        cases = {}
+        try:
+            # Separate generators keep packets unique across cases (no dedup hits)
+            cases["process_packet"] = bench_process_packet(generator(), args.n)
+            gen = generator()
+            gen.device_ids = [d + "-insert" for d in gen.device_ids]
+            gen._runtime_ms = {d: 0 for d in gen.device_ids}
+            cases["insert_reading"] = bench_insert_reading(gen, args.n)
+            cases["compute_average"] = bench_compute_average(generator(), args.n)
+            gen = generator()
+            gen.device_ids = [d + "-e2e" for d in gen.device_ids]
+            gen._runtime_ms = {d: 0 for d in gen.device_ids}
+            cases["end_to_end"] = bench_end_to_end(gen, args.n, args.rate)
+        finally:
+            google_sheets.shutdown()
+            storage.close_connection()
+            stub.shutdown()
+
+    results = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+            "git_rev": _git_rev(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "cases": cases,
+    }
+
+    out = Path(args.out) if args.out else RESULTS_DIR / (
+        f"{datetime.utcnow():%Y%m%dT%H%M%S}-{results['meta']['git_rev']}.json"
+    )
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(results, indent=2) + "\n")
+
+    for case, stats in cases.items():
+        print(
+            f"{case:16s} {stats['packets_per_s'] or 0:10,.0f} packets/s  "
+            f"p50 {stats['p50_ms']} ms  p99 {stats['p99_ms']} ms  RSS {stats['rss_mb']} MB"
+        )
+    print(f"results: {out}")
+    if args.compare:
+        _compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
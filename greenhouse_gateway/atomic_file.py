@@ -0,0 +1,32 @@
+# greenhouse_gateway/atomic_file.py
+
+import os
+import tempfile
+from pathlib import Path
+
+
+def atomic_write_text(path: Path, text: str, fsync: bool = False) -> None:
+    """
+    Replace `path` with `text` atomically: write a temp file in the same
+    directory, then rename it over the target. Readers see either the
+    old or the new file, never a partial one.
+
+    fsync=True also flushes the data to disk before the rename, for files
+    that must survive a power cut (commands); snapshots can skip it.
+    """
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)  # mkstemp creates files owner-only
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,35 @@
+# greenhouse_gateway/config.py
+
+import json
+import logging
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger("greenhouse_gateway.config")
+
+# Project root (greenhouse/), so config/ resolves the same from every module
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+CONFIG_PATH = PROJECT_ROOT / "config" / "config.json"
+
+_config = None
+
+
+def get_config() -> dict:
+    """
+    Return the parsed config.json, loaded once per process.
+    A missing or unreadable file yields an empty config so callers
+    fall back to their defaults.
+    """
+    global _config
+    if _config is None:
+        _config = {}
+        if CONFIG_PATH.exists():
+            try:
+                _config = json.loads(CONFIG_PATH.read_text())
+            except Exception as e:
+                logger.exception("Error loading config.json: %s", e)
+    return _config
+
+
+def get(key: str, default: Any = None) -> Any:
+    return get_config().get(key, default)
@@ -1,11 +1,18 @@
 # greenhouse_gateway/command_dispatcher.py
 
-import copy
+import ctypes
+import ctypes.util
 import json
 import logging
+import os
+import select
+import struct
+import sys
 import threading
 from pathlib import Path
 
+from ..atomic_file import atomic_write_text
+
 logger = logging.getLogger("greenhouse_gateway.command_dispatcher")
 
 # Point to project root runtime directory (greenhouse/runtime/)
@@ -15,47 +22,223 @@ RUNTIME_DIR.mkdir(parents=True, exist_ok=True)
 
 COMMANDS_PATH = RUNTIME_DIR / "commands.json"
 
-_last_sent = None  # cached copy of last sent commands
-_lock = threading.Lock()  # Thread safety for _last_sent access
+DEFAULT_COMMANDS = {
+    "circulation_fan_pwm": 0,
+    "grow_light_pwm": 0,
+    "exhaust_fan_pwm": 0
+}
+
+# Labels for whoever wrote the commands (baseline scheduler, controller).
+# Kept in commands.json for the samples, never sent to the ESP32.
+CONTROL_KEYS = ("control_mode", "control_reason")
+
+# commands.json switch for an in-process controller: "file" hands the
+# actuators back to commands.json. Never sent to the ESP32 either.
+CONTROLLER_KEY = "controller"
+
+_last_sent = None  # target (None = shared topic) -> last sent command dict
+_last_parsed = None  # parsed commands the last sync was based on
+_lock = threading.Lock()  # Thread safety for _last_sent and the file cache
+
+# Parsed commands.json, reused until the file's identity changes
+_cache_key = None  # (st_ino, st_size, st_mtime_ns)
+_cached_commands: dict = {}
+
+# In-process controller state: while suspended, commands.json is not
+# dispatched; the controller's labels override the file's per device
+# (None = all devices)
+_suspended = False
+_controller_context: dict = {}
+
+# inotify watcher state
+_watcher_thread = None
+_watcher_stop = threading.Event()
 
 
 def _load_commands() -> dict:
-    if not COMMANDS_PATH.exists():
+    """
+    Return the parsed commands, re-reading commands.json only when its
+    inode, size or mtime changed since the last read. The returned dict
+    is shared and must not be mutated.
+    """
+    global _cache_key, _cached_commands
+
+    try:
+        st = os.stat(COMMANDS_PATH)
+    except FileNotFoundError:
         # Initialize with sane defaults
-        default_cmds = {
-            "circulation_fan_pwm": 0,
-            "grow_light_pwm": 0,
-            "exhaust_fan_pwm": 0
-        }
-        COMMANDS_PATH.write_text(json.dumps(default_cmds, indent=2))
-        return default_cmds
+        write_commands(DEFAULT_COMMANDS)
+        st = os.stat(COMMANDS_PATH)
+
+    key = (st.st_ino, st.st_size, st.st_mtime_ns)
+    if key == _cache_key:
+        return _cached_commands
 
     try:
-        return json.loads(COMMANDS_PATH.read_text())
+        commands = json.loads(COMMANDS_PATH.read_text())
     except Exception as e:
+        # Keep serving the last good commands until the file is fixed
         logger.exception("Error reading commands.json: %s", e)
-        return {}
+        _cache_key = key
+        return _cached_commands
+
+    _cache_key = key
+    _cached_commands = commands
+    return commands
+
+
+def write_commands(cmds: dict) -> None:
+    """
+    Atomically replace commands.json (temp file + rename), so the
+    dispatcher never reads a half-written file.
+    """
+    atomic_write_text(COMMANDS_PATH, json.dumps(cmds, indent=2), fsync=True)
+
+
+def update_commands(changes: dict) -> dict:
+    """Merge `changes` into commands.json atomically and return the result."""
+    with _lock:
+        updated = dict(_load_commands())
+        updated.update(changes)
+        write_commands(updated)
+    return updated
+
+
+def _split_commands(commands: dict) -> dict:
+    """
+    Map target -> command dict. None is the shared command topic; each
+    entry under "devices" gets the shared commands with its own
+    overrides applied, published to that device's command topic:
+
+        {"exhaust_fan_pwm": 0, "devices": {"bench2": {"exhaust_fan_pwm": 150}}}
+    """
+    skip = CONTROL_KEYS + ("devices", CONTROLLER_KEY)
+    shared = {k: v for k, v in commands.items() if k not in skip}
+    targets = {None: shared}
+    devices = commands.get("devices")
+    if isinstance(devices, dict):
+        for device_id, overrides in devices.items():
+            if isinstance(overrides, dict):
+                overrides = {k: v for k, v in overrides.items() if k not in CONTROL_KEYS}
+                targets[device_id] = {**shared, **overrides}
+    return targets
 
 
 def check_and_send_commands(publish_func):
     """
-    publish_func should be something like mqtt_client.publish_command(cmd_dict).
+    publish_func should be something like mqtt_client.publish_command(cmd_dict, device_id=None).
     """
-    global _last_sent
+    global _last_sent, _last_parsed
+
+    with _lock:
+        if _suspended:
+            return
+        current = _load_commands()
+        if current is _last_parsed:
+            return
+        _last_parsed = current
+
+        initial = _last_sent is None
+        if initial:
+            _last_sent = {}
+
+        # The shared command comes first and reaches every node, so once
+        # it goes out each device override has to be re-applied after it
+        shared_sent = False
+        targets = _split_commands(current)
+        for device_id, cmd in targets.items():
+            if _last_sent.get(device_id) == cmd and not shared_sent:
+                continue
+            target = "ESP32" if device_id is None else device_id
+            if initial:
+                logger.info("Initial command sync, sending to %s: %s", target, cmd)
+            else:
+                logger.info("Commands changed, sending to %s: %s", target, cmd)
+            if device_id is None:
+                publish_func(cmd)
+                shared_sent = True
+            else:
+                publish_func(cmd, device_id)
+            _last_sent[device_id] = cmd
+
+        # A device whose override was removed still runs it until it gets
+        # the shared command, on its own topic unless it just went to all
+        for device_id in [d for d in _last_sent if d not in targets]:
+            if not shared_sent:
+                logger.info("Override for %s removed, sending: %s", device_id, targets[None])
+                publish_func(targets[None], device_id)
+            del _last_sent[device_id]
+
+
+def get_control_context(device_id=None) -> dict:
+    """control_mode/control_reason currently in effect for a device."""
+    with _lock:
+        commands = _load_commands()
+        context = {key: commands.get(key) for key in CONTROL_KEYS}
+        devices = commands.get("devices")
+        overrides = devices.get(device_id) if isinstance(devices, dict) else None
+        if isinstance(overrides, dict):
+            context.update((key, overrides[key]) for key in CONTROL_KEYS if key in overrides)
+        if _suspended:
+            context.update(_controller_context.get(device_id) or _controller_context.get(None) or {})
+    return context
 
-    current = _load_commands()
 
+def requested_controller():
+    """The commands.json controller switch, or None if it is not set."""
     with _lock:
-        if _last_sent is None:
-            logger.info("Initial command sync, sending to ESP32: %s", current)
-            publish_func(current)
-            _last_sent = copy.deepcopy(current)
+        return _load_commands().get(CONTROLLER_KEY)
+
+
+def suspend() -> None:
+    """Stop dispatching commands.json: an in-process controller owns the actuators."""
+    global _suspended
+    with _lock:
+        _suspended = True
+        _controller_context.clear()
+    logger.info("commands.json dispatch suspended")
+
+
+def resume(publish_func) -> None:
+    """Hand the actuators back to commands.json and resend it right away."""
+    global _suspended, _last_sent, _last_parsed
+    with _lock:
+        _suspended = False
+        _controller_context.clear()
+        # The ESP32 holds the controller's values: force a full resend
+        _last_sent = None
+        _last_parsed = None
+    logger.info("commands.json dispatch resumed")
+    check_and_send_commands(publish_func)
+
+
+def resend(publish_func, device_id=None) -> None:
+    """
+    Send commands.json to one device again (e.g. after safe defaults).
+    None, the shared topic, resends everything: the shared command
+    reaches every node, so each override has to follow it again.
+    """
+    global _last_sent, _last_parsed
+    if device_id is None:
+        with _lock:
+            _last_sent = None
+            _last_parsed = None
+        check_and_send_commands(publish_func)
+        return
+
+    with _lock:
+        if _suspended:
             return
+        targets = _split_commands(_load_commands())
+        cmd = targets.get(device_id, targets[None])
+        logger.info("Resending commands to %s: %s", device_id, cmd)
+        publish_func(cmd, device_id)
+
 
-        if current != _last_sent:
-            logger.info("Commands changed, sending to ESP32: %s", current)
-            publish_func(current)
-            _last_sent = copy.deepcopy(current)
+def set_control_context(context: dict, device_id=None) -> None:
+    """Label samples with the in-process controller's decision."""
+    with _lock:
+        _controller_context[device_id] = {key: context.get(key) for key in CONTROL_KEYS}
 
 
 def get_current_commands():
@@ -63,4 +246,89 @@ def get_current_commands():
     Return current commands from commands.json.
     Used by heartbeat system to include current state.
     """
-    return _load_commands()
+    with _lock:
+        return dict(_load_commands())
+
+
+# ---------------------------------------------------------------------
+# inotify watcher (Linux): push changes without waiting for the poll
+# ---------------------------------------------------------------------
+
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def start_watcher(publish_func) -> bool:
+    """
+    Watch the runtime directory with inotify and dispatch as soon as
+    commands.json is written or renamed into place. Returns False when
+    inotify is unavailable; the periodic check still covers that case.
+    """
+    global _watcher_thread
+
+    if _watcher_thread is not None:
+        return True
+    if not sys.platform.startswith("linux"):
+        return False
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fd = libc.inotify_init1(_IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        wd = libc.inotify_add_watch(
+            fd, str(RUNTIME_DIR).encode(), _IN_CLOSE_WRITE | _IN_MOVED_TO
+        )
+        if wd < 0:
+            os.close(fd)
+            raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+    except Exception as e:
+        logger.warning("inotify unavailable, falling back to polling: %s", e)
+        return False
+
+    _watcher_stop.clear()
+    _watcher_thread = threading.Thread(
+        target=_watch_loop, args=(fd, publish_func),
+        name="commands-watcher", daemon=True,
+    )
+    _watcher_thread.start()
+    logger.info("Watching %s for command changes", COMMANDS_PATH)
+    return True
+
+
+def _watch_loop(fd: int, publish_func) -> None:
+    target = COMMANDS_PATH.name.encode()
+    try:
+        while not _watcher_stop.is_set():
+            ready, _, _ = select.select([fd], [], [], 1.0)
+            if not ready:
+                continue
+
+            data = os.read(fd, 4096)
+            changed = False
+            offset = 0
+            while offset < len(data):
+                _wd, _mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if name == target:
+                    changed = True
+
+            if changed:
+                try:
+                    check_and_send_commands(publish_func)
+                except Exception as e:
+                    logger.exception("Error dispatching commands: %s", e)
+    finally:
+        os.close(fd)
+
+
+def stop_watcher() -> None:
+    global _watcher_thread
+    if _watcher_thread is not None:
+        _watcher_stop.set()
+        _watcher_thread.join(timeout=2)
+        _watcher_thread = None
@@ -0,0 +1,184 @@
+# greenhouse_gateway/control/vpd_controller.py
+
+"""
+Closed-loop VPD controller, run in-process on every sensor packet.
+
+Ventilation is a ladder of (circulation, exhaust) fan intents. Each
+intent maps to the middle of its FAN_RANGES band:
+
+    0  circulation LOW,  exhaust OFF
+    1  circulation MED,  exhaust OFF
+    2  circulation MED,  exhaust LOW
+    3  circulation HIGH, exhaust MED
+    4  circulation HIGH, exhaust HIGH
+
+If inside VPD (smoothed with an EWMA) drops below vpd_min -
+vpd_hysteresis_kpa, the air is too humid and the controller moves one
+stage up. Above vpd_max + vpd_hysteresis_kpa it moves one stage down.
+Inside the deadband the current stage is held. The stage changes at
+most once per vpd_min_step_seconds per device, so each step has time
+to show up in the readings before the next one.
+
+A new command is published with mqtt_client.publish_command as soon as
+the packet that triggered it has been processed. The file poll is not
+involved. While the controller is engaged, commands.json is not
+dispatched, and control_mode/control_reason describe the controller's
+latest decision. Setting "controller": "file" in commands.json hands
+the fans back to the file, which is resent at once. "vpd" (or removing
+the key) engages the controller again.
+"""
+
+import logging
+import time
+from typing import Callable, Dict, Optional
+
+from .. import config
+from .. import fields
+from . import command_dispatcher
+from greenhouse_intelligence.baseline.scheduler import FAN_COMMANDS, intent_pwm
+
+logger = logging.getLogger("greenhouse_gateway.vpd_controller")
+
+CONTROL_MODE = "vpd"
+
+VPD_MIN = float(config.get("vpd_min", 0.12))
+VPD_MAX = float(config.get("vpd_max", 0.25))
+HYSTERESIS = float(config.get("vpd_hysteresis_kpa", 0.01))
+MIN_STEP_SECONDS = float(config.get("vpd_min_step_seconds", 60))
+SMOOTHING = float(config.get("vpd_smoothing", 0.3))  # EWMA weight of the newest reading
+
+# (circulation_fan, exhaust_fan) intents, least to most ventilation
+STAGES = (
+    ("LOW", "OFF"),
+    ("MED", "OFF"),
+    ("MED", "LOW"),
+    ("HIGH", "MED"),
+    ("HIGH", "HIGH"),
+)
+INITIAL_STAGE = min(max(int(config.get("vpd_initial_stage", 1)), 0), len(STAGES) - 1)
+
+
+def stage_command(stage: int) -> dict:
+    circulation, exhaust = STAGES[stage]
+    return {
+        FAN_COMMANDS["circulation_fan"]: intent_pwm("circulation_fan", circulation),
+        FAN_COMMANDS["exhaust_fan"]: intent_pwm("exhaust_fan", exhaust),
+    }
+
+
+class _DeviceState:
+    __slots__ = ("vpd", "stage", "changed_at", "sent")
+
+    def __init__(self):
+        self.vpd = None             # smoothed VPD, kPa
+        self.stage = INITIAL_STAGE
+        self.changed_at = None      # monotonic time of the last stage change
+        self.sent = None            # last command published
+
+
+class VpdController:
+    """Per-device VPD -> fan PWM loop; call on_packet() for each packet."""
+
+    def __init__(self, publish_func: Callable[..., None]):
+        self.publish = publish_func
+        self.active = False
+        self._devices: Dict[str, _DeviceState] = {}
+        self._stats = {"decisions": 0, "commands": 0, "switches": 0}
+
+    # -----------------------------------------------------------------
+    # Hand-over with commands.json
+    # -----------------------------------------------------------------
+
+    def check_switch(self) -> None:
+        """Engage or release according to the commands.json switch."""
+        want = command_dispatcher.requested_controller() in (None, CONTROL_MODE)
+        if want == self.active:
+            return
+        self._stats["switches"] += 1
+        if want:
+            self.engage()
+        else:
+            self.release()
+
+    def engage(self) -> None:
+        command_dispatcher.suspend()
+        self._devices.clear()  # publish a fresh command on the next packet
+        self.active = True
+        logger.info("VPD controller engaged (target %.2f-%.2f kPa)", VPD_MIN, VPD_MAX)
+
+    def release(self) -> None:
+        self.active = False
+        command_dispatcher.resume(self.publish)
+        logger.info("VPD controller released, commands.json in control")
+
+    # -----------------------------------------------------------------
+    # Control loop
+    # -----------------------------------------------------------------
+
+    def _decide(self, state: _DeviceState, vpd: Optional[float], now: float) -> str:
+        if vpd is None:
+            return "no VPD reading: hold"
+        state.vpd = vpd if state.vpd is None else state.vpd + SMOOTHING * (vpd - state.vpd)
+
+        if state.vpd < VPD_MIN - HYSTERESIS:
+            step, relation, bound = 1, "<", VPD_MIN
+        elif state.vpd > VPD_MAX + HYSTERESIS:
+            step, relation, bound = -1, ">", VPD_MAX
+        else:
+            return f"VPD {state.vpd:.2f} in {VPD_MIN:.2f}-{VPD_MAX:.2f}: hold"
+
+        reason = f"VPD {state.vpd:.2f} {relation} {bound:.2f}"
+        target = min(max(state.stage + step, 0), len(STAGES) - 1)
+        if target == state.stage:
+            return f"{reason}: at limit"
+        if state.changed_at is not None and now - state.changed_at < MIN_STEP_SECONDS:
+            return f"{reason}: rate limited"
+        state.stage = target
+        state.changed_at = now
+        return f"{reason}: {'up' if step > 0 else 'down'}"
+
+    def on_packet(self, packet: dict) -> None:
+        self.check_switch()
+        if not self.active:
+            return
+
+        device_id = packet.get("device_id") or fields.DEFAULT_DEVICE_ID
+        state = self._devices.get(device_id)
+        if state is None:
+            state = self._devices[device_id] = _DeviceState()
+
+        vpd = packet.get("inside_vpd_kpa")
+        reason = self._decide(state, vpd if isinstance(vpd, (int, float)) else None, time.monotonic())
+        reason = f"{reason}, stage {state.stage + 1}/{len(STAGES)}"
+        self._stats["decisions"] += 1
+
+        # The default node listens on the shared topic, like file commands
+        target = None if device_id == fields.DEFAULT_DEVICE_ID else device_id
+        command = stage_command(state.stage)
+        if command != state.sent:
+            self.publish(command, target)
+            state.sent = command
+            self._stats["commands"] += 1
+            logger.info("VPD control %s: %s -> %s", device_id, reason, command)
+        command_dispatcher.set_control_context(
+            {"control_mode": CONTROL_MODE, "control_reason": reason}, device_id
+        )
+
+    def on_sensor_event(self, event: dict) -> None:
+        """Watchdog listener: resend the current stage once a device is back."""
+        if event["event"] in ("online", "recovered"):
+            state = self._devices.get(event["device_id"])
+            if state is not None:
+                state.sent = None
+
+    def get_status(self) -> dict:
+        status = dict(self._stats, active=self.active)
+        status["devices"] = {
+            device_id: {
+                "vpd": None if state.vpd is None else round(state.vpd, 3),
+                "stage": state.stage,
+                "command": state.sent,
+            }
+            for device_id, state in self._devices.items()
+        }
+        return status
@@ -0,0 +1,274 @@
+# greenhouse_gateway/enrich/pipeline.py
+
+"""
+Enrichment pipeline: registered context providers with cached results.
+
+A provider declares the fields it fills and how long its result stays
+valid, as a function of the time it was computed for:
+
+    register("calendar", enrich_calendar, ("day_of_year", "season_state"),
+             valid_until=next_midnight)
+
+For each packet, context() returns the merged output of every provider.
+A provider runs again only when the packet's local time reaches its
+expiry, or moves backwards before the time it was computed for (as in
+a replay). Between refreshes the merged dict is reused as is, so a
+packet costs one expiry check per provider.
+
+Providers registered with a timeout run on a small worker pool. If a
+call does not finish within the timeout, the provider keeps its
+previous values (or NULLs) and the call is left to finish in the
+background. Its result is picked up by a later packet, and no new call
+starts while one is still pending. Providers without a timeout are
+called inline; the built-in ones are pure CPU or memory lookups.
+
+Each provider call is timed as metrics stage "enrich_<name>". Plugins
+are modules listed in enrichment_plugins that call register() when
+imported.
+"""
+
+import importlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from .. import config
+from .. import metrics
+from .season_context import enrich_season
+from .time_context import enrich_calendar, enrich_intent_window
+from .weather_context import enrich_weather
+
+logger = logging.getLogger("greenhouse_gateway.enrich")
+
+PLUGINS = list(config.get("enrichment_plugins", []))
+DEFAULT_TIMEOUT = float(config.get("enrichment_timeout_ms", 50)) / 1000.0
+RETRY_SECONDS = float(config.get("enrichment_retry_seconds", 60))
+WORKERS = max(1, int(config.get("enrichment_workers", 2)))
+
+
+# ---------------------------------------------------------------------
+# Validity horizons
+# ---------------------------------------------------------------------
+
+def next_minute(t: datetime) -> datetime:
+    return t.replace(second=0, microsecond=0) + timedelta(minutes=1)
+
+
+def next_hour(t: datetime) -> datetime:
+    return t.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+
+
+def next_midnight(t: datetime) -> datetime:
+    return datetime.combine(t.date() + timedelta(days=1), datetime.min.time())
+
+
+def every(seconds: float) -> Callable[[datetime], datetime]:
+    def valid_until(t: datetime) -> datetime:
+        return t + timedelta(seconds=seconds)
+    return valid_until
+
+
+# ---------------------------------------------------------------------
+# Registry
+# ---------------------------------------------------------------------
+
+class Provider(NamedTuple):
+    name: str
+    func: Callable[[datetime], dict]        # local time -> field values
+    fields: tuple
+    valid_until: Callable[[datetime], datetime]
+    timeout: Optional[float]                # seconds; None = call inline
+
+
+class _State:
+    __slots__ = ("values", "valid_from", "expires", "pending")
+
+    def __init__(self, fields):
+        self.values = dict.fromkeys(fields)
+        self.valid_from = datetime.max  # forces the first refresh
+        self.expires = datetime.min
+        self.pending = None             # (future, computed-for time) of a timed-out call
+
+
+_lock = threading.Lock()
+_providers: List[Provider] = []
+_states: Dict[str, _State] = {}
+_merged: Optional[dict] = None
+_plugins_loaded = False
+_executor = None
+
+_stats: Dict[str, Dict[str, int]] = {}
+
+
+def register(
+    name: str,
+    func: Callable[[datetime], dict],
+    fields,
+    valid_until: Callable[[datetime], datetime] = next_minute,
+    timeout: Optional[float] = DEFAULT_TIMEOUT,
+) -> None:
+    """
+    Add a provider. func(now) gets the sample's local time and returns
+    a dict; only the declared fields are taken (missing ones are NULL).
+    Field names must not overlap with another provider's.
+    """
+    global _merged
+    fields = tuple(fields)
+    with _lock:
+        taken = {f: p.name for p in _providers if p.name != name for f in p.fields}
+        clashes = sorted(f for f in fields if f in taken)
+        if clashes:
+            raise ValueError(f"enrichment provider {name!r} redeclares fields {clashes}")
+        _providers[:] = [p for p in _providers if p.name != name]
+        _providers.append(Provider(name, func, fields, valid_until, timeout))
+        _states[name] = _State(fields)
+        _stats[name] = {"calls": 0, "errors": 0, "timeouts": 0}
+        _merged = None
+    metrics.add_stage(f"enrich_{name}")
+
+
+def unregister(name: str) -> None:
+    global _merged
+    with _lock:
+        _providers[:] = [p for p in _providers if p.name != name]
+        _states.pop(name, None)
+        _merged = None
+
+
+def providers() -> List[Provider]:
+    return list(_providers)
+
+
+def get_stats() -> dict:
+    """Per-provider call, error and timeout counts."""
+    with _lock:
+        return {name: dict(counts) for name, counts in _stats.items()}
+
+
+# ---------------------------------------------------------------------
+# Evaluation
+# ---------------------------------------------------------------------
+
+def _load_plugins() -> None:
+    global _plugins_loaded
+    _plugins_loaded = True
+    for module in PLUGINS:
+        try:
+            importlib.import_module(module)
+            logger.info("Loaded enrichment plugin %s", module)
+        except Exception as e:
+            logger.exception("Error loading enrichment plugin %s: %s", module, e)
+
+
+def _call(provider: Provider, now: datetime) -> dict:
+    start = time.perf_counter()
+    try:
+        result = provider.func(now) or {}
+        return {f: result.get(f) for f in provider.fields}
+    finally:
+        metrics.since(f"enrich_{provider.name}", start)
+
+
+def _store(provider: Provider, state: _State, values: dict, now: datetime) -> None:
+    state.values = values
+    state.valid_from = now
+    state.expires = provider.valid_until(now)
+
+
+def _fail(provider: Provider, state: _State, now: datetime, error: Exception) -> None:
+    _stats[provider.name]["errors"] += 1
+    logger.error("Enrichment provider %s failed: %s", provider.name, error)
+    state.values = dict.fromkeys(provider.fields)
+    state.valid_from = now
+    state.expires = now + timedelta(seconds=RETRY_SECONDS)
+
+
+def _refresh(provider: Provider, state: _State, now: datetime) -> None:
+    global _executor
+    _stats[provider.name]["calls"] += 1
+
+    if provider.timeout is None:
+        try:
+            _store(provider, state, _call(provider, now), now)
+        except Exception as e:
+            _fail(provider, state, now, e)
+        return
+
+    if state.pending is not None:
+        future, computed_for = state.pending
+        if not future.done():
+            return  # still running: keep the previous values
+        state.pending = None
+        try:
+            _store(provider, state, future.result(), computed_for)
+        except Exception as e:
+            _fail(provider, state, computed_for, e)
+        if state.valid_from <= now < state.expires:
+            return
+
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="enrich")
+    future = _executor.submit(_call, provider, now)
+    try:
+        _store(provider, state, future.result(timeout=provider.timeout), now)
+    except FutureTimeout:
+        _stats[provider.name]["timeouts"] += 1
+        logger.warning(
+            "Enrichment provider %s exceeded %.0f ms, using previous values",
+            provider.name, provider.timeout * 1000,
+        )
+        state.pending = (future, now)
+    except Exception as e:
+        _fail(provider, state, now, e)
+
+
+def context(now: datetime) -> dict:
+    """
+    Merged provider output for a sample taken at `now` (local time).
+    The returned dict is shared: copy it, do not modify it.
+    """
+    global _merged
+    if not _plugins_loaded:
+        _load_plugins()
+
+    stale = [
+        (provider, _states[provider.name])
+        for provider in _providers
+        if not (_states[provider.name].valid_from <= now < _states[provider.name].expires)
+    ]
+    if stale or _merged is None:
+        for provider, state in stale:
+            _refresh(provider, state, now)
+        merged = {}
+        for provider in _providers:
+            merged.update(_states[provider.name].values)
+        _merged = merged
+    return _merged
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+# ---------------------------------------------------------------------
+# Built-in providers
+# ---------------------------------------------------------------------
+
+register("calendar", enrich_calendar, ("day_of_year", "season_state"),
+         valid_until=next_midnight, timeout=None)
+register("intent_window", enrich_intent_window, ("intent_window",),
+         valid_until=next_hour, timeout=None)
+register("season", lambda now: enrich_season(), ("biological_phase", "growth_stage"),
+         valid_until=next_midnight, timeout=None)
+# Interpolated from the in-memory forecast cache; a minute of drift is negligible
+register("weather", enrich_weather, (
+    "outside_temp_f", "outside_humidity_rh", "cloud_coverage_pct",
+    "precip_probability_pct", "weather_code", "weather_stale", "weather_source",
+    "forecast_confidence", "expected_light_trajectory", "expected_humidity_decay",
+), valid_until=next_minute, timeout=None)
@@ -24,18 +24,29 @@ def _intent_window_from_hour(hour: int) -> str:
     return "night"
 
 
-def enrich_time(now: Optional[datetime] = None) -> Dict[str, object]:
-    """
-    Add time-based metadata.
-    """
+def enrich_calendar(now: Optional[datetime] = None) -> Dict[str, object]:
+    """Day-level context: changes at local midnight."""
     now = now or datetime.now()
-
     day_of_year = now.timetuple().tm_yday
-    hour = now.hour
-
     return {
-        "local_time": now.isoformat(),
         "day_of_year": day_of_year,
         "season_state": _season_from_day_of_year(day_of_year),
-        "intent_window": _intent_window_from_hour(hour),
     }
+
+
+def enrich_intent_window(now: Optional[datetime] = None) -> Dict[str, object]:
+    """Hour-level context: changes on the hour."""
+    now = now or datetime.now()
+    return {"intent_window": _intent_window_from_hour(now.hour)}
+
+
+def enrich_time(now: Optional[datetime] = None) -> Dict[str, object]:
+    """
+    Add time-based metadata.
+    """
+    now = now or datetime.now()
+
+    context = {"local_time": now.isoformat()}
+    context.update(enrich_calendar(now))
+    context.update(enrich_intent_window(now))
+    return context
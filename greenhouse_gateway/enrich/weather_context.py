@@ -1,18 +1,305 @@
 # greenhouse_gateway/enrich/weather_context.py
 
-from typing import Dict
+"""
+External environmental context from a cached hourly forecast.
 
+A background thread fetches the forecast from the configured provider
+every weather_refresh_seconds and saves it to
+runtime/weather_forecast.json, so a restart starts with the last
+forecast instead of an empty cache. enrich_weather() never touches the
+network. It computes the hour slot directly from the timestamp and
+interpolates between the two neighbouring hours, so the lookup takes
+constant time.
 
-def enrich_weather() -> Dict[str, object]:
+If the cache is missing, too old, or does not cover the sample time,
+the weather fields are NULL and weather_stale is 1. With no provider
+configured, all weather fields, weather_stale included, stay NULL.
+
+Providers return the forecast as parallel hourly arrays keyed by
+samples column (see FORECAST_FIELDS) plus "time" (epoch seconds):
+
+    open_meteo  api.open-meteo.com, or any server speaking its API
+                (weather_url can point at a local stand-in)
+    file        a JSON file already in that shape (weather_file)
+
+Other providers can be added with register_provider().
+"""
+
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, NamedTuple, Optional
+
+import requests
+
+from .. import config
+from ..atomic_file import atomic_write_text
+from ..persist.latest_state import RUNTIME_DIR
+
+logger = logging.getLogger("greenhouse_gateway.weather")
+
+PROVIDER = config.get("weather_provider", "none")
+LATITUDE = config.get("weather_latitude")
+LONGITUDE = config.get("weather_longitude")
+WEATHER_URL = config.get("weather_url", "https://api.open-meteo.com/v1/forecast")
+WEATHER_FILE = config.get("weather_file", "")
+REFRESH_SECONDS = float(config.get("weather_refresh_seconds", 3600))
+RETRY_SECONDS = float(config.get("weather_retry_seconds", 300))
+MAX_AGE_SECONDS = float(config.get("weather_max_age_seconds", 6 * 3600))
+REQUEST_TIMEOUT = float(config.get("weather_request_timeout_seconds", 20))
+
+CACHE_PATH = RUNTIME_DIR / "weather_forecast.json"
+
+# Interpolated linearly between hours
+FORECAST_FIELDS = (
+    "outside_temp_f",
+    "outside_humidity_rh",
+    "cloud_coverage_pct",
+    "precip_probability_pct",
+)
+# Categorical: taken from the hour the sample falls in
+CODE_FIELD = "weather_code"
+
+
+class Forecast(NamedTuple):
+    source: str
+    fetched_at: float       # epoch seconds
+    start: float            # epoch seconds of the first hour
+    step: float             # seconds between entries
+    columns: Dict[str, list]
+
+
+_forecast: Optional[Forecast] = None  # replaced whole, never mutated
+_cache_loaded = False
+_thread = None
+_stop = threading.Event()
+
+_stats = {
+    "fetches": 0,
+    "failures": 0,
+    "last_error": None,
+}
+
+
+# ---------------------------------------------------------------------
+# Providers
+# ---------------------------------------------------------------------
+
+def _fetch_open_meteo() -> dict:
+    if LATITUDE is None or LONGITUDE is None:
+        raise ValueError("weather_latitude and weather_longitude must be set")
+    response = requests.get(
+        WEATHER_URL,
+        params={
+            "latitude": LATITUDE,
+            "longitude": LONGITUDE,
+            "hourly": "temperature_2m,relative_humidity_2m,cloud_cover,"
+                      "precipitation_probability,weather_code",
+            "temperature_unit": "fahrenheit",
+            "timeformat": "unixtime",
+            "past_days": 1,
+            "forecast_days": 2,
+        },
+        timeout=REQUEST_TIMEOUT,
+    )
+    response.raise_for_status()
+    hourly = response.json()["hourly"]
+    return {
+        "time": hourly["time"],
+        "outside_temp_f": hourly["temperature_2m"],
+        "outside_humidity_rh": hourly["relative_humidity_2m"],
+        "cloud_coverage_pct": hourly["cloud_cover"],
+        "precip_probability_pct": hourly["precipitation_probability"],
+        "weather_code": hourly["weather_code"],
+    }
+
+
+def _fetch_file() -> dict:
+    path = config.PROJECT_ROOT / WEATHER_FILE
+    return json.loads(path.read_text())
+
+
+_providers: Dict[str, Callable[[], dict]] = {
+    "open_meteo": _fetch_open_meteo,
+    "file": _fetch_file,
+}
+
+
+def register_provider(name: str, fetch: Callable[[], dict]) -> None:
+    """Add a provider: fetch() returns hourly arrays keyed like FORECAST_FIELDS plus "time"."""
+    _providers[name] = fetch
+
+
+def enabled() -> bool:
+    return PROVIDER in _providers
+
+
+# ---------------------------------------------------------------------
+# Forecast cache
+# ---------------------------------------------------------------------
+
+def _build(source: str, fetched_at: float, hourly: dict) -> Forecast:
+    """Validate provider output into a Forecast on a uniform time grid."""
+    times = [float(t) for t in hourly["time"]]
+    if len(times) < 2:
+        raise ValueError("forecast has fewer than two entries")
+    step = times[1] - times[0]
+    if step <= 0 or any(abs(b - a - step) > 1e-6 for a, b in zip(times, times[1:])):
+        raise ValueError("forecast times are not evenly spaced")
+
+    columns = {}
+    for name in FORECAST_FIELDS + (CODE_FIELD,):
+        values = list(hourly.get(name) or [None] * len(times))
+        if len(values) != len(times):
+            raise ValueError(f"forecast column {name} has {len(values)} entries, expected {len(times)}")
+        columns[name] = values
+    return Forecast(source, fetched_at, times[0], step, columns)
+
+
+def _load_cache() -> None:
+    global _forecast, _cache_loaded
+    _cache_loaded = True
+    try:
+        doc = json.loads(CACHE_PATH.read_text())
+        _forecast = _build(doc["source"], doc["fetched_at"], doc["hourly"])
+        logger.info("Loaded cached %s forecast from %s", _forecast.source, CACHE_PATH)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning("Ignoring unreadable weather cache %s: %s", CACHE_PATH, e)
+
+
+def refresh() -> bool:
+    """Fetch a new forecast and replace the cache. Returns False on failure."""
+    global _forecast
+    try:
+        hourly = _providers[PROVIDER]()
+        forecast = _build(PROVIDER, time.time(), hourly)
+    except Exception as e:
+        _stats["failures"] += 1
+        _stats["last_error"] = str(e)
+        logger.warning("Weather refresh from %s failed: %s", PROVIDER, e)
+        return False
+
+    _forecast = forecast
+    _stats["fetches"] += 1
+    _stats["last_error"] = None
+    try:
+        doc = {"source": forecast.source, "fetched_at": forecast.fetched_at, "hourly": dict(forecast.columns, time=hourly["time"])}
+        atomic_write_text(CACHE_PATH, json.dumps(doc))
+    except OSError as e:
+        logger.warning("Cannot save weather cache: %s", e)
+    logger.info("Weather forecast refreshed from %s (%d hours)", PROVIDER, len(forecast.columns[CODE_FIELD]))
+    return True
+
+
+def _refresh_loop() -> None:
+    # Refresh at once unless the cached forecast is still recent
+    forecast = _forecast
+    delay = 0.0
+    if forecast is not None:
+        delay = max(0.0, forecast.fetched_at + REFRESH_SECONDS - time.time())
+    while not _stop.wait(delay):
+        delay = REFRESH_SECONDS if refresh() else RETRY_SECONDS
+
+
+def start() -> bool:
+    """Load the cached forecast and start background refreshes."""
+    global _thread
+    if not enabled():
+        if PROVIDER != "none":
+            logger.warning("Unknown weather_provider %r, weather context disabled", PROVIDER)
+        return False
+    if not _cache_loaded:
+        _load_cache()
+    if _thread is None:
+        _stop.clear()
+        _thread = threading.Thread(target=_refresh_loop, name="weather-refresh", daemon=True)
+        _thread.start()
+    return True
+
+
+def stop() -> None:
+    global _thread
+    if _thread is not None:
+        _stop.set()
+        _thread.join(timeout=REQUEST_TIMEOUT + 1)
+        _thread = None
+
+
+def get_stats() -> dict:
+    stats = dict(_stats)
+    forecast = _forecast
+    stats["source"] = forecast.source if forecast else None
+    stats["age_s"] = round(time.time() - forecast.fetched_at) if forecast else None
+    return stats
+
+
+# ---------------------------------------------------------------------
+# Per-packet lookup
+# ---------------------------------------------------------------------
+
+def _interpolate(values: list, i: int, frac: float):
+    a = values[i]
+    b = values[i + 1] if frac and i + 1 < len(values) else a
+    if a is None or b is None:
+        return a if frac < 0.5 else b  # nearest hour when a neighbour is missing
+    return a + (b - a) * frac
+
+
+def lookup(epoch: float, now: Optional[float] = None) -> Optional[dict]:
     """
-    External environmental context.
-    Stubbed until weather API integration is added.
+    Weather at `epoch` from the cached forecast, or None if the cache
+    is missing, older than MAX_AGE_SECONDS, or does not cover `epoch`.
     """
-    return {
+    forecast = _forecast
+    if forecast is None:
+        return None
+    now = time.time() if now is None else now
+    if now - forecast.fetched_at > MAX_AGE_SECONDS:
+        return None
+    pos = (epoch - forecast.start) / forecast.step
+    if not 0.0 <= pos <= len(forecast.columns[CODE_FIELD]) - 1:
+        return None
+
+    i = int(pos)
+    frac = pos - i
+    result = {name: _interpolate(forecast.columns[name], i, frac) for name in FORECAST_FIELDS}
+    code = forecast.columns[CODE_FIELD][i]
+    result[CODE_FIELD] = None if code is None else str(code)
+    return result
+
+
+_NULL_WEATHER = dict.fromkeys(FORECAST_FIELDS + (CODE_FIELD,))
+
+
+def enrich_weather(now: Optional[datetime] = None) -> Dict[str, object]:
+    """
+    External environmental context for a sample taken at `now` (local
+    time, default the current time). Never blocks on the network.
+    """
+    result = {
         "weather_source": None,
-        "cloud_coverage_pct": None,
-        "precip_probability_pct": None,
+        "weather_stale": None,
         "forecast_confidence": None,
         "expected_light_trajectory": None,
         "expected_humidity_decay": None,
     }
+    result.update(_NULL_WEATHER)
+    if not enabled():
+        return result
+
+    if not _cache_loaded:
+        _load_cache()
+    epoch = now.timestamp() if now is not None else time.time()
+    weather = lookup(epoch)
+    if weather is None:
+        result["weather_stale"] = 1
+        return result
+
+    result.update(weather)
+    result["weather_source"] = PROVIDER
+    result["weather_stale"] = 0
+    return result
@@ -0,0 +1,179 @@
+# greenhouse_gateway/fields.py
+
+"""
+Single registry of sample fields.
+
+Every field a sample can carry is declared once here: where it comes
+from in the ESP32 packet, which samples column it is stored in, its
+type and unit, and whether it is sent to Google Sheets. The packet
+normalizer, the samples INSERT statement and the Sheets row mapping are
+all generated from this table, so they cannot drift apart.
+"""
+
+from datetime import datetime
+from typing import Iterable, NamedTuple, Optional, Tuple
+
+from . import config
+
+# Device id for packets that do not say which node sent them
+DEFAULT_DEVICE_ID = config.get("default_device_id", "esp32")
+
+
+class Field(NamedTuple):
+    name: str                 # key in normalized/enriched packets
+    column: str               # samples column
+    type: type                # Python type of the value
+    unit: Optional[str] = None
+    source: Optional[str] = None  # ESP32 packet key; None = filled by enrichment
+    sheets: bool = False      # included in Google Sheets sample rows
+    valid_range: Optional[Tuple[float, float]] = None  # physical/sensor limits
+
+
+# Order matches the samples table in schema.sql.
+# valid_range follows the sensor datasheets (SHT4x -40..125 C, TSL2591
+# 88k lux / 16-bit channels, APDS9960 16-bit color) and 8-bit PWM.
+FIELDS = (
+    # Identity: (device_id, timestamp_utc) is the primary key
+    Field("device_id", "device_id", str, source="device_id"),
+
+    # Timestamp
+    Field("jetson_timestamp", "timestamp_utc", str, "ISO-8601 UTC", source="jetson_timestamp"),
+
+    # Time context
+    Field("local_time", "local_time", str, "ISO-8601 local", sheets=True),
+    Field("day_of_year", "day_of_year", int),
+    Field("season_state", "season_state", str),
+    Field("intent_window", "intent_window", str, sheets=True),
+
+    # Inside environment (SHT4 + TSL2591)
+    Field("inside_temp_f", "inside_temp_f", float, "degF", source="inside_temp_f", sheets=True, valid_range=(-40.0, 257.0)),
+    Field("inside_humidity_rh", "inside_humidity_rh", float, "%RH", source="inside_humidity_rh", sheets=True, valid_range=(0.0, 100.0)),
+    Field("inside_dew_point_f", "inside_dew_point_f", float, "degF", source="inside_dew_point_f", valid_range=(-100.0, 257.0)),
+    Field("inside_vpd_kpa", "inside_vpd_kpa", float, "kPa", source="inside_vpd_kpa", valid_range=(0.0, 50.0)),
+    Field("inside_brightness_lux", "inside_brightness_lux", float, "lux", source="inside_brightness_lux", sheets=True, valid_range=(0.0, 88000.0)),
+
+    # TSL2591 raw (ML input)
+    Field("tsl_full_spectrum", "tsl_full_spectrum", int, "counts", source="tsl_full_spectrum", valid_range=(0, 65535)),
+    Field("tsl_infrared", "tsl_infrared", int, "counts", source="tsl_infrared", valid_range=(0, 65535)),
+
+    # Outside (APDS9960 + weather)
+    Field("outside_temp_f", "outside_temp_f", float, "degF"),
+    Field("outside_humidity_rh", "outside_humidity_rh", float, "%RH"),
+    Field("outside_brightness_raw", "outside_brightness_raw", float, "counts", source="outside_brightness_raw", sheets=True, valid_range=(0, 65535)),
+    Field("outside_color_r", "outside_color_r", int, "counts", source="outside_color_r", valid_range=(0, 65535)),
+    Field("outside_color_g", "outside_color_g", int, "counts", source="outside_color_g", valid_range=(0, 65535)),
+    Field("outside_color_b", "outside_color_b", int, "counts", source="outside_color_b", valid_range=(0, 65535)),
+    Field("cloud_coverage_pct", "cloud_coverage_pct", float, "%", sheets=True),
+    Field("precip_probability_pct", "precip_probability_pct", float, "%"),
+    Field("weather_code", "weather_code", str),
+
+    # Derived
+    Field("expected_light_trajectory", "expected_light_trajectory", str),
+    Field("expected_humidity_decay", "expected_humidity_decay", str),
+    Field("forecast_confidence", "forecast_confidence", float),
+
+    # Actuators
+    Field("circulation_fan_pwm", "circulation_fan_pwm", int, "PWM 0-255", source="circulation_fan_pwm", sheets=True, valid_range=(0, 255)),
+    Field("exhaust_fan_pwm", "exhaust_fan_pwm", int, "PWM 0-255", source="exhaust_fan_pwm", sheets=True, valid_range=(0, 255)),
+    Field("grow_light_pwm", "grow_light_pwm", int, "PWM 0-255", source="grow_light_pwm", sheets=True, valid_range=(0, 255)),
+
+    # Sensor connectivity
+    Field("disconnected_sensors", "disconnected_sensors", str, source="disconnected_sensors"),
+
+    # System health
+    Field("esp32_runtime_ms", "esp32_runtime_ms", int, "ms", source="esp32_runtime_ms", valid_range=(0, 4294967295)),
+    Field("firmware_version", "firmware_version", str, source="firmware_version"),
+    Field("wifi_rssi", "wifi_rssi", int, "dBm", source="wifi_rssi", valid_range=(-127, 0)),
+    Field("mqtt_reconnects", "mqtt_reconnects", int, "count", source="mqtt_reconnects", valid_range=(0, 4294967295)),
+
+    # Control context
+    Field("control_mode", "control_mode", str, sheets=True),
+    Field("control_reason", "control_reason", str, sheets=True),
+
+    # Dedup: content hash of the raw packet, unique per device
+    Field("packet_key", "packet_key", str, source="packet_key"),
+
+    # Weather context freshness: 1 = forecast cache stale, weather fields NULL
+    Field("weather_stale", "weather_stale", int),
+)
+
+FIELDS_BY_NAME = {f.name: f for f in FIELDS}
+
+SENSOR_FIELDS = tuple(f for f in FIELDS if f.source is not None)
+SHEETS_FIELDS = tuple(f.name for f in FIELDS if f.sheets)
+
+
+def unknown_fields(names: Iterable[str]) -> list:
+    """Names that are not in the registry (catches drifted config)."""
+    return [name for name in names if name not in FIELDS_BY_NAME]
+
+
+# ---------------------------------------------------------------------
+# Code generation
+# ---------------------------------------------------------------------
+# Each generated function is a single dict/tuple display with the packet
+# lookup bound once, so per-packet cost is one pass with no branches.
+
+def _compile(name: str, source: str, namespace: dict):
+    exec(compile(source, f"<fields:{name}>", "exec"), namespace)
+    return namespace[name]
+
+
+def _build_normalizer():
+    items = []
+    for f in SENSOR_FIELDS:
+        if f.name == "jetson_timestamp":
+            items.append(f"    {f.name!r}: get({f.source!r}) or _utcnow(),")
+        elif f.name == "device_id":
+            items.append(f"    {f.name!r}: get({f.source!r}) or _default_device,")
+        else:
+            items.append(f"    {f.name!r}: get({f.source!r}),")
+    source = (
+        "def normalize_packet(packet):\n"
+        "    get = packet.get\n"
+        "    return {\n" + "\n".join("    " + item for item in items) + "\n    }\n"
+    )
+    namespace = {
+        "_utcnow": lambda: datetime.utcnow().isoformat(timespec="microseconds"),
+        "_default_device": DEFAULT_DEVICE_ID,
+    }
+    return _compile("normalize_packet", source, namespace)
+
+
+def _build_row_builder():
+    items = "\n".join(f"        get({f.name!r})," for f in FIELDS)
+    source = (
+        "def sample_row(packet):\n"
+        "    get = packet.get\n"
+        "    return (\n" + items + "\n    )\n"
+    )
+    return _compile("sample_row", source, {})
+
+
+def _build_sheets_mapper():
+    items = "\n".join(f"        {name!r}: get({name!r})," for name in SHEETS_FIELDS)
+    source = (
+        "def sheets_sample(packet):\n"
+        "    get = packet.get\n"
+        "    return {\n"
+        "        'type': 'sample',\n" + items + "\n    }\n"
+    )
+    return _compile("sheets_sample", source, {})
+
+
+# Raw ESP32 packet -> normalized dict (all sensor fields, missing = None)
+normalize_packet = _build_normalizer()
+
+# Enriched packet -> samples row tuple, in SAMPLES_COLUMNS order
+sample_row = _build_row_builder()
+
+# Averaged packet -> Google Sheets sample payload
+sheets_sample = _build_sheets_mapper()
+
+SAMPLES_COLUMNS = tuple(f.column for f in FIELDS)
+
+# Replayed or redelivered packets hit the primary key or the packet_key
+# index and are skipped instead of failing the batch
+INSERT_SAMPLE_SQL = "INSERT INTO samples ({}) VALUES ({}) ON CONFLICT DO NOTHING".format(
+    ", ".join(SAMPLES_COLUMNS), ", ".join("?" * len(SAMPLES_COLUMNS))
+)
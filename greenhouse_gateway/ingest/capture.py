@@ -0,0 +1,194 @@
+# greenhouse_gateway/ingest/capture.py
+
+"""
+Raw MQTT capture for offline replay.
+
+When capture_enabled is set, on_message hands every sensor payload
+(malformed ones included) to record(), which only timestamps it and
+puts it on a queue. A background thread writes one JSON line per
+message to captures/mqtt-<UTC time, to the microsecond>.jsonl.gz:
+
+    {"t": 1760683335.12, "topic": "greenhouse/bench1/sensors", "payload": "{...}"}
+
+Files rotate after capture_rotate_mb of uncompressed data and only the
+newest capture_keep_files are kept. The gzip stream is sync-flushed
+whenever the queue goes idle, so a crash loses at most the last
+second of data. Read captures back with iter_capture() or
+`python -m greenhouse_gateway.replay --capture ...`.
+"""
+
+import gzip
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Iterator, Tuple
+
+from .. import config
+
+logger = logging.getLogger("greenhouse_gateway.capture")
+
+CAPTURE_ENABLED = bool(config.get("capture_enabled", False))
+CAPTURE_DIR = config.PROJECT_ROOT / config.get("capture_dir", "captures")
+ROTATE_BYTES = int(float(config.get("capture_rotate_mb", 64)) * 2**20)
+KEEP_FILES = int(config.get("capture_keep_files", 48))
+COMPRESS_LEVEL = int(config.get("capture_compress_level", 6))
+QUEUE_SIZE = int(config.get("capture_queue_size", 10000))
+
+FILE_GLOB = "mqtt-*.jsonl.gz"
+
+_queue: "queue.Queue" = queue.Queue(maxsize=QUEUE_SIZE)
+_thread = None
+_running = False
+_STOP = object()
+
+_stats = {
+    "recorded": 0,
+    "dropped": 0,  # queue full: the writer fell behind
+    "files": 0,
+}
+
+
+def record(topic: str, payload: bytes) -> None:
+    """Queue one raw message. Never blocks the MQTT thread."""
+    if not _running:
+        return
+    try:
+        _queue.put_nowait((time.time(), topic, payload))
+    except queue.Full:
+        _stats["dropped"] += 1
+
+
+def get_stats() -> dict:
+    stats = dict(_stats)
+    stats["queue_depth"] = _queue.qsize()
+    return stats
+
+
+def start() -> bool:
+    """Start the capture writer if capture_enabled is set."""
+    global _thread, _running
+    if not CAPTURE_ENABLED or _running:
+        return _running
+    CAPTURE_DIR.mkdir(parents=True, exist_ok=True)
+    _running = True
+    _thread = threading.Thread(target=_writer_loop, name="mqtt-capture", daemon=True)
+    _thread.start()
+    logger.info("Capturing raw MQTT payloads to %s", CAPTURE_DIR)
+    return True
+
+
+def stop(timeout: float = 10.0) -> None:
+    """Write out everything queued and close the current file."""
+    global _thread, _running
+    if _thread is None:
+        return
+    _running = False
+    _queue.put(_STOP)
+    _thread.join(timeout)
+    _thread = None
+
+
+# ---------------------------------------------------------------------
+# Writer thread
+# ---------------------------------------------------------------------
+
+def _open_file():
+    path = CAPTURE_DIR / f"mqtt-{datetime.utcnow():%Y%m%dT%H%M%S%f}.jsonl.gz"
+    _stats["files"] += 1
+    _prune()
+    logger.info("Opened capture file %s", path.name)
+    return gzip.open(path, "wb", compresslevel=COMPRESS_LEVEL)
+
+
+def _prune() -> None:
+    # Names sort by creation time; keep room for the file being opened
+    files = sorted(CAPTURE_DIR.glob(FILE_GLOB))
+    for path in files[:max(0, len(files) - KEEP_FILES + 1)]:
+        try:
+            path.unlink()
+        except OSError as e:
+            logger.warning("Cannot remove old capture %s: %s", path, e)
+
+
+def _encode(item) -> bytes:
+    received_at, topic, payload = item
+    # surrogateescape keeps non-UTF-8 payloads byte-exact through JSON
+    text = payload.decode("utf-8", "surrogateescape")
+    return (json.dumps({"t": received_at, "topic": topic, "payload": text}) + "\n").encode()
+
+
+def _writer_loop() -> None:
+    out = None
+    written = 0
+    try:
+        while True:
+            try:
+                item = _queue.get(timeout=1.0)
+            except queue.Empty:
+                if out is not None:
+                    out.flush()  # Z_SYNC_FLUSH: readable up to here after a crash
+                continue
+            if item is _STOP:
+                break
+
+            lines = [_encode(item)]
+            # Drain whatever else is waiting into the same write
+            while len(lines) < 1000:
+                try:
+                    item = _queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    _queue.put(_STOP)
+                    break
+                lines.append(_encode(item))
+
+            if out is None or written >= ROTATE_BYTES:
+                if out is not None:
+                    out.close()
+                out = _open_file()
+                written = 0
+            data = b"".join(lines)
+            out.write(data)
+            written += len(data)
+            _stats["recorded"] += len(lines)
+    except Exception as e:
+        logger.exception("MQTT capture stopped: %s", e)
+    finally:
+        if out is not None:
+            out.close()
+
+
+# ---------------------------------------------------------------------
+# Reading
+# ---------------------------------------------------------------------
+
+def capture_files(paths: Iterable) -> list:
+    """Expand directories to their capture files, oldest first."""
+    files = []
+    for path in map(Path, paths):
+        files.extend(sorted(path.glob(FILE_GLOB)) if path.is_dir() else [path])
+    return files
+
+
+def iter_capture(paths: Iterable) -> Iterator[Tuple[float, str, bytes]]:
+    """
+    (received_at, topic, payload) for every message in the given files
+    or directories. A file cut short by a crash is read up to its last
+    complete line.
+    """
+    for path in capture_files(paths):
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rb") as f:
+            try:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    doc = json.loads(line)
+                    yield doc["t"], doc["topic"], doc["payload"].encode("utf-8", "surrogateescape")
+            except EOFError:
+                logger.warning("Capture %s is truncated, stopped at the last complete line", path)
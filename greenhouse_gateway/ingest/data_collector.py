@@ -1,26 +1,26 @@
 # greenhouse_gateway/data_collector.py
 
-import json
 import logging
+import time
 from datetime import datetime
-from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
+from .. import fields
+from .. import metrics
+from . import dedup
 from ..persist import storage
+from ..persist import daily_summary
+from ..persist import latest_state
+from ..persist import history_ring
 from ..publish import google_sheets
+from ..control import command_dispatcher
 
-# Enrichment modules
-from ..enrich.time_context import enrich_time
-from ..enrich.weather_context import enrich_weather
-from ..enrich.season_context import enrich_season
+# Enrichment providers (time, season, weather, plugins)
+from ..enrich import pipeline as enrich_pipeline
 
 logger = logging.getLogger("greenhouse_gateway.data_collector")
 
-BASE_DIR = Path(__file__).resolve().parents[1]
-RUNTIME_DIR = BASE_DIR / "runtime"
-RUNTIME_DIR.mkdir(parents=True, exist_ok=True)
-
-LATEST_PATH = RUNTIME_DIR / "latest_packet.json"
+LATEST_PATH = latest_state.SNAPSHOT_PATH
 
 
 # ---------------------------------------------------------------------
@@ -30,98 +30,38 @@ LATEST_PATH = RUNTIME_DIR / "latest_packet.json"
 def normalize_packet(packet: Dict[str, Any]) -> Dict[str, Any]:
     """
     Normalize raw ESP32 packet into DB-ready schema.
-    Explicit ownership mapping. NULL-safe.
+    Generated from the field registry (greenhouse_gateway/fields.py). NULL-safe.
     """
-
-    normalized: Dict[str, Any] = {}
-
-    # ------------------------------------------------------------------
-    # TIMESTAMP
-    # ------------------------------------------------------------------
-    normalized["jetson_timestamp"] = packet.get(
-        "jetson_timestamp",
-        datetime.utcnow().isoformat()
-    )
-
-    # ------------------------------------------------------------------
-    # INSIDE ENVIRONMENT (SHT4 + TSL2591)
-    # ------------------------------------------------------------------
-    if "inside_temp_f" in packet:
-        normalized["inside_temp_f"] = packet.get("inside_temp_f")
-
-    if "inside_humidity_rh" in packet:
-        normalized["inside_humidity_rh"] = packet.get("inside_humidity_rh")
-
-    if "inside_dew_point_f" in packet:
-        normalized["inside_dew_point_f"] = packet.get("inside_dew_point_f")
-
-    if "inside_vpd_kpa" in packet:
-        normalized["inside_vpd_kpa"] = packet.get("inside_vpd_kpa")
-
-    if "inside_brightness_lux" in packet:
-        normalized["inside_brightness_lux"] = packet.get("inside_brightness_lux")
-
-    # ------------------------------------------------------------------
-    # TSL2591 RAW (ML input)
-    # ------------------------------------------------------------------
-    normalized["tsl_full_spectrum"] = packet.get("tsl_full_spectrum")
-    normalized["tsl_infrared"] = packet.get("tsl_infrared")
-
-    # ------------------------------------------------------------------
-    # OUTSIDE OPTICAL (APDS9960 ONLY)
-    # ------------------------------------------------------------------
-    if "outside_brightness_raw" in packet:
-        normalized["outside_brightness_raw"] = packet.get("outside_brightness_raw")
-
-    if "outside_color_r" in packet:
-        normalized["outside_color_r"] = packet.get("outside_color_r")
-
-    if "outside_color_g" in packet:
-        normalized["outside_color_g"] = packet.get("outside_color_g")
-
-    if "outside_color_b" in packet:
-        normalized["outside_color_b"] = packet.get("outside_color_b")
-
-    # ------------------------------------------------------------------
-    # SYSTEM / ACTUATORS
-    # ------------------------------------------------------------------
-    normalized["circulation_fan_pwm"] = packet.get("circulation_fan_pwm")
-    normalized["exhaust_fan_pwm"] = packet.get("exhaust_fan_pwm")
-    normalized["grow_light_pwm"] = packet.get("grow_light_pwm")
-
-    normalized["esp32_runtime_ms"] = packet.get("esp32_runtime_ms")
-    normalized["firmware_version"] = packet.get("firmware_version")
-    normalized["wifi_rssi"] = packet.get("wifi_rssi")
-    normalized["mqtt_reconnects"] = packet.get("mqtt_reconnects")
-
-    normalized["disconnected_sensors"] = packet.get("disconnected_sensors")
-
-    return normalized
+    return fields.normalize_packet(packet)
 
 
 # ---------------------------------------------------------------------
 # Enrichment
 # ---------------------------------------------------------------------
 
-def enrich_packet(packet: Dict[str, Any]) -> Dict[str, Any]:
+def enrich_packet(packet: Dict[str, Any], now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Add context fields. `now` is the local time the sample was taken
+    (default: the current time); replays pass the historical time.
+    """
+    now = now or datetime.now()
     enriched = dict(packet)
+    enriched["local_time"] = now.isoformat()
 
+    # Cached per provider until its values can change (hour, midnight...)
     try:
-        enriched.update(enrich_time())
-    except Exception as e:
-        logger.exception("Time enrichment failed: %s", e)
-
-    try:
-        enriched.update(enrich_weather())
+        enriched.update(enrich_pipeline.context(now))
     except Exception as e:
-        logger.exception("Weather enrichment failed: %s", e)
-
-    try:
-        enriched.update(enrich_season())
-    except Exception as e:
-        logger.exception("Season enrichment failed: %s", e)
-
-    # Control context
+        logger.exception("Enrichment failed: %s", e)
+
+    # Control context: whoever last wrote commands.json, unless the
+    # packet already carries its own (replayed history)
+    if "control_mode" not in enriched:
+        try:
+            for key, value in command_dispatcher.get_control_context(enriched.get("device_id")).items():
+                enriched.setdefault(key, value)
+        except Exception as e:
+            logger.exception("Control context enrichment failed: %s", e)
     enriched.setdefault("control_mode", None)
     enriched.setdefault("control_reason", None)
 
@@ -138,10 +78,11 @@ def enrich_packet(packet: Dict[str, Any]) -> Dict[str, Any]:
 # ---------------------------------------------------------------------
 
 def save_latest_packet(packet: Dict[str, Any]) -> None:
+    """Publish to the in-memory latest state; the file snapshot is rate limited."""
     try:
-        LATEST_PATH.write_text(json.dumps(packet, indent=2))
+        latest_state.update(packet)
     except Exception as e:
-        logger.exception("Error writing latest_packet.json: %s", e)
+        logger.exception("Error updating latest state: %s", e)
 
 
 # ---------------------------------------------------------------------
@@ -149,22 +90,43 @@ def save_latest_packet(packet: Dict[str, Any]) -> None:
 # ---------------------------------------------------------------------
 
 def process_packet(packet: Dict[str, Any]) -> None:
-    logger.info("Processing new sensor packet")
+    logger.debug("Processing new sensor packet")
+    t = time.perf_counter()
 
     normalized = normalize_packet(packet)
+    normalized["jetson_timestamp"] = dedup.unique_timestamp(
+        normalized["device_id"], normalized["jetson_timestamp"]
+    )
+    t = metrics.since("normalize", t)
+
     enriched = enrich_packet(normalized)
+    t = metrics.since("enrich", t)
 
     try:
         storage.insert_sensor_reading(enriched)
-        logger.info("Sensor packet persisted successfully")
+        logger.debug("Sensor packet queued for persistence")
     except Exception as e:
         logger.exception("Error inserting sensor reading into DB: %s", e)
+    t = metrics.since("db_insert", t)
 
     save_latest_packet(enriched)
 
+    try:
+        history_ring.append(enriched)
+    except Exception as e:
+        logger.exception("Error appending to history ring: %s", e)
+    t = metrics.since("snapshot", t)
+
+    try:
+        daily_summary.add_packet(enriched)
+    except Exception as e:
+        logger.exception("Error updating daily summary: %s", e)
+    t = metrics.since("daily_summary", t)
+
     try:
         google_sheets.add_packet(enriched)
     except Exception as e:
         logger.exception("Error buffering packet for Google Sheets: %s", e)
+    metrics.since("sheets_buffer", t)
 
-    logger.info("Finished processing packet")
+    logger.debug("Finished processing packet")
@@ -0,0 +1,100 @@
+# greenhouse_gateway/ingest/dedup.py
+
+"""
+Idempotent ingest: duplicate detection and timestamp collision handling.
+
+Every packet gets a content key (a short hash of its canonical JSON,
+which includes the device id and the ESP32's runtime counter). A small
+in-memory LRU of recent keys rejects MQTT redeliveries and replayed
+packets without a database round trip; the same key is stored in
+samples.packet_key under a unique index, and the batch writer inserts
+with ON CONFLICT DO NOTHING, so anything the LRU misses is still
+dropped by SQLite instead of raising.
+
+A content hash is used rather than a per-device sequence number: the
+ESP32 firmware does not send one, and a counter that restarts on reboot
+would make fresh packets look like duplicates.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict
+
+from .. import config
+
+CACHE_SIZE = int(config.get("dedup_cache_size", 4096))
+CACHE_TTL = float(config.get("dedup_ttl_seconds", 600))
+
+_lock = threading.Lock()
+_recent: "OrderedDict[str, float]" = OrderedDict()  # key -> monotonic time seen
+_last_timestamp: Dict[str, str] = {}  # device_id -> last assigned timestamp_utc
+_stats = {
+    "hits": 0,
+    "misses": 0,
+    "timestamp_bumps": 0,
+}
+
+
+def packet_key(packet: dict) -> str:
+    """Stable content key for a raw packet (ignores any key already set)."""
+    body = {k: v for k, v in packet.items() if k != "packet_key"}
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(canonical.encode(), digest_size=12).hexdigest()
+
+
+def check_packet(packet: dict) -> bool:
+    """
+    Stamp packet["packet_key"] and return True if the packet is new,
+    False if the same packet was seen within the last CACHE_TTL seconds.
+    """
+    key = packet.get("packet_key") or packet_key(packet)
+    packet["packet_key"] = key
+    now = time.monotonic()
+
+    with _lock:
+        # Expire from the old end; insertion order is arrival order
+        while _recent:
+            oldest_key, seen = next(iter(_recent.items()))
+            if now - seen <= CACHE_TTL and len(_recent) <= CACHE_SIZE:
+                break
+            _recent.popitem(last=False)
+
+        if key in _recent:
+            _stats["hits"] += 1
+            return False
+
+        _recent[key] = now
+        _stats["misses"] += 1
+        return True
+
+
+def unique_timestamp(device_id: str, timestamp: str) -> str:
+    """
+    Return `timestamp`, moved forward by microseconds if it equals the
+    previous timestamp assigned to this device, so two packets received
+    in the same microsecond do not collide on the primary key.
+    """
+    with _lock:
+        last = _last_timestamp.get(device_id)
+        if last is not None and timestamp <= last:
+            try:
+                bumped = datetime.fromisoformat(last) + timedelta(microseconds=1)
+                if bumped - datetime.fromisoformat(timestamp) < timedelta(milliseconds=1):
+                    timestamp = bumped.isoformat(timespec="microseconds")
+                    _stats["timestamp_bumps"] += 1
+            except ValueError:
+                pass
+        if last is None or timestamp > last:
+            _last_timestamp[device_id] = timestamp
+    return timestamp
+
+
+def get_stats() -> dict:
+    with _lock:
+        stats = dict(_stats)
+        stats["cache_size"] = len(_recent)
+    return stats
@@ -0,0 +1,103 @@
+# greenhouse_gateway/ingest/device_queues.py
+
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+
+class DeviceQueues:
+    """
+    One bounded FIFO per device with round-robin draining.
+
+    Devices with pending packets sit in a ready ring; drain() takes one
+    packet from each ready device in turn, so a node publishing much
+    faster than the others cannot starve them. When a device's queue is
+    full the backpressure policy applies to that device only:
+
+      "block"       - wait up to block_timeout for space, then drop
+      "drop_oldest" - evict that device's oldest packet
+      "drop_newest" - drop the incoming packet
+    """
+
+    def __init__(self, maxsize: int, policy: str = "drop_oldest", block_timeout: float = 5.0):
+        self.maxsize = maxsize
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self._queues: Dict[str, deque] = {}
+        self._ready: deque = deque()  # device ids with pending packets
+        self._size = 0
+        self._cond = threading.Condition()
+        self.dropped: Dict[str, int] = {}
+
+    def put(self, device_id: str, item) -> bool:
+        """Queue an item for a device. Returns False if something was dropped."""
+        with self._cond:
+            q = self._queues.get(device_id)
+            if q is None:
+                q = self._queues[device_id] = deque()
+
+            if len(q) >= self.maxsize:
+                if self.policy == "drop_newest":
+                    self._count_drop(device_id)
+                    return False
+                if self.policy != "block":
+                    # drop_oldest: the queue stays non-empty, so the device
+                    # keeps its place in the ready ring
+                    q.popleft()
+                    q.append(item)
+                    self._count_drop(device_id)
+                    return False
+
+                deadline = time.monotonic() + self.block_timeout
+                while len(q) >= self.maxsize:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._count_drop(device_id)
+                        return False
+                    self._cond.wait(remaining)
+
+            if not q:
+                self._ready.append(device_id)
+            q.append(item)
+            self._size += 1
+            self._cond.notify_all()
+            return True
+
+    def _count_drop(self, device_id: str) -> None:
+        self.dropped[device_id] = self.dropped.get(device_id, 0) + 1
+
+    def drain(self, timeout: float, max_items: int) -> List:
+        """
+        Wait up to `timeout` seconds for the first item, then take up to
+        `max_items` items round-robin across devices.
+        """
+        with self._cond:
+            if not self._size:
+                self._cond.wait_for(lambda: self._size > 0, max(timeout, 0))
+                if not self._size:
+                    return []
+
+            items = []
+            ready = self._ready
+            while ready and len(items) < max_items:
+                device_id = ready.popleft()
+                q = self._queues[device_id]
+                items.append(q.popleft())
+                if q:
+                    ready.append(device_id)
+            self._size -= len(items)
+            # Wake producers blocked on a full queue
+            self._cond.notify_all()
+            return items
+
+    def depth(self, device_id: Optional[str] = None) -> int:
+        with self._cond:
+            if device_id is None:
+                return self._size
+            q = self._queues.get(device_id)
+            return len(q) if q else 0
+
+    def depths(self) -> Dict[str, int]:
+        with self._cond:
+            return {device_id: len(q) for device_id, q in self._queues.items()}
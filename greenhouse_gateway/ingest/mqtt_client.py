@@ -2,7 +2,6 @@
 
 import json
 import logging
-import queue
 import time
 from pathlib import Path
 
@@ -10,6 +9,12 @@ import paho.mqtt.client as mqtt
 from dotenv import load_dotenv
 import os
 
+from .. import config
+from .. import fields
+from .. import metrics
+from . import capture
+from .device_queues import DeviceQueues
+
 logger = logging.getLogger("greenhouse_gateway.mqtt")
 
 # Paths
@@ -29,34 +34,89 @@ SENSOR_TOPIC = os.getenv("MQTT_SENSOR_TOPIC", "greenhouse/sensors")
 COMMAND_TOPIC = os.getenv("MQTT_COMMAND_TOPIC", "greenhouse/commands")
 STATUS_TOPIC = os.getenv("MQTT_STATUS_TOPIC", "greenhouse/jetson/status")
 
+# Multi-node topics: the "+" level is the device id (greenhouse/bench1/sensors)
+DEVICE_SENSOR_TOPIC = os.getenv("MQTT_DEVICE_SENSOR_TOPIC", "greenhouse/+/sensors")
+DEVICE_COMMAND_TOPIC = os.getenv("MQTT_DEVICE_COMMAND_TOPIC", "greenhouse/{device_id}/commands")
+
+# Device id for packets on the legacy single-node SENSOR_TOPIC
+DEFAULT_DEVICE_ID = fields.DEFAULT_DEVICE_ID
+
+# Backpressure: what on_message does when a device's queue is full
+#   "block"       - wait up to SENSOR_QUEUE_BLOCK_TIMEOUT for space, then drop
+#   "drop_oldest" - evict the device's oldest queued packet to make room
+#   "drop_newest" - drop the incoming packet
+BACKPRESSURE_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+# Queue size is per device
+SENSOR_QUEUE_SIZE = int(config.get("sensor_queue_size", 100))
+SENSOR_QUEUE_POLICY = config.get("sensor_queue_policy", "drop_oldest")
+SENSOR_QUEUE_BLOCK_TIMEOUT = float(config.get("sensor_queue_block_timeout_seconds", 5))
+
+if SENSOR_QUEUE_POLICY not in BACKPRESSURE_POLICIES:
+    logger.warning(
+        "Unknown sensor_queue_policy %r, using drop_oldest", SENSOR_QUEUE_POLICY
+    )
+    SENSOR_QUEUE_POLICY = "drop_oldest"
+
 # Internal state
 _client = None
-_sensor_queue: "queue.Queue[dict]" = queue.Queue(maxsize=100)
+_sensor_queues = DeviceQueues(
+    SENSOR_QUEUE_SIZE, SENSOR_QUEUE_POLICY, SENSOR_QUEUE_BLOCK_TIMEOUT
+)
+
+_DEVICE_LEVEL = DEVICE_SENSOR_TOPIC.split("/").index("+")
+_DEVICE_TOPIC_LEVELS = len(DEVICE_SENSOR_TOPIC.split("/"))
 
 
 def on_connect(client, userdata, flags, reason_code, properties=None):
     if reason_code == 0:
         logger.info("Connected to MQTT broker at %s:%s", MQTT_BROKER, MQTT_PORT)
-        client.subscribe(SENSOR_TOPIC)
-        logger.info("Subscribed to sensor topic: %s", SENSOR_TOPIC)
+        client.subscribe([(SENSOR_TOPIC, 0), (DEVICE_SENSOR_TOPIC, 0)])
+        logger.info("Subscribed to sensor topics: %s, %s", SENSOR_TOPIC, DEVICE_SENSOR_TOPIC)
     else:
         logger.error("Failed to connect to MQTT broker: %s", reason_code)
 
 
+def device_id_for_topic(topic: str):
+    """Device id for a sensor topic, or None if it is not a sensor topic."""
+    if topic == SENSOR_TOPIC:
+        return DEFAULT_DEVICE_ID
+    if mqtt.topic_matches_sub(DEVICE_SENSOR_TOPIC, topic):
+        levels = topic.split("/")
+        if len(levels) == _DEVICE_TOPIC_LEVELS:
+            return levels[_DEVICE_LEVEL]
+    return None
+
+
 def on_message(client, userdata, msg):
+    start = time.perf_counter()
+    capture.record(msg.topic, msg.payload)
     try:
         payload = msg.payload.decode("utf-8")
         data = json.loads(payload)
         logger.debug("Received MQTT message on %s: %s", msg.topic, data)
 
-        if msg.topic == SENSOR_TOPIC:
-            try:
-                _sensor_queue.put_nowait(data)
-            except queue.Full:
-                logger.warning("Sensor queue full, dropping packet")
+        device_id = device_id_for_topic(msg.topic)
+        if device_id is not None and isinstance(data, dict):
+            data["device_id"] = device_id
+            metrics.inc("packets_received")
+            _enqueue_sensor_packet(device_id, data)
 
     except Exception as e:
+        metrics.inc("packets_malformed")
         logger.exception("Error handling MQTT message: %s", e)
+    metrics.since("mqtt_receive", start)
+
+
+def _enqueue_sensor_packet(device_id: str, data: dict) -> None:
+    """Queue a sensor packet, applying the configured backpressure policy."""
+    # Queued with its arrival time so the drain can measure queue wait
+    if not _sensor_queues.put(device_id, (time.perf_counter(), data)):
+        metrics.inc("packets_dropped")
+        logger.warning(
+            "Sensor queue for %s full (%s), dropped a packet",
+            device_id, SENSOR_QUEUE_POLICY,
+        )
 
 
 def init_mqtt():
@@ -91,22 +151,55 @@ def init_mqtt():
 
 def get_next_sensor_packet():
     """Non blocking: returns next packet dict or None if none waiting."""
-    try:
-        return _sensor_queue.get_nowait()
-    except queue.Empty:
-        return None
+    packets = _unwrap(_sensor_queues.drain(0, 1))
+    return packets[0] if packets else None
+
+
+def wait_for_sensor_packets(timeout: float, max_items: int) -> list:
+    """
+    Block up to `timeout` seconds for the first packet, then drain
+    whatever else is already queued, up to `max_items` packets in total,
+    taking one packet per device in turn.
+    Returns an empty list if nothing arrived before the timeout.
+    """
+    return _unwrap(_sensor_queues.drain(timeout, max_items))
+
+
+def _unwrap(items: list) -> list:
+    """Strip the arrival stamps, recording how long each packet waited."""
+    now = time.perf_counter()
+    observe = metrics.observe
+    for queued_at, _ in items:
+        observe("queue_wait", now - queued_at)
+    return [data for _, data in items]
+
+
+def sensor_queue_dropped() -> dict:
+    return dict(_sensor_queues.dropped)
+
+
+def sensor_queue_depth() -> int:
+    return _sensor_queues.depth()
+
+
+def sensor_queue_depths() -> dict:
+    return _sensor_queues.depths()
 
 
-def publish_command(cmd: dict):
-    """Publish command dict to ESP32."""
+def publish_command(cmd: dict, device_id: str = None):
+    """
+    Publish command dict to ESP32. Without a device_id it goes to the
+    shared COMMAND_TOPIC that every node listens on.
+    """
     if _client is None:
         logger.error("MQTT client not initialized, cannot publish")
         return
 
+    topic = COMMAND_TOPIC if device_id is None else DEVICE_COMMAND_TOPIC.format(device_id=device_id)
     try:
         payload = json.dumps(cmd)
-        logger.info("Publishing command to %s: %s", COMMAND_TOPIC, payload)
-        _client.publish(COMMAND_TOPIC, payload, qos=1)
+        logger.info("Publishing command to %s: %s", topic, payload)
+        _client.publish(topic, payload, qos=1)
     except Exception as e:
         logger.exception("Error publishing command: %s", e)
 
@@ -0,0 +1,165 @@
+# greenhouse_gateway/ingest/validation.py
+
+"""
+Schema validation stage between MQTT receive and process_packet.
+
+Per-field checks are compiled once from the field registry into small
+closures, so validating a packet is one pass over the sensor fields
+with no per-packet setup. Bad values are nulled (or the whole packet
+rejected, depending on validation_policy), recorded in the
+quarantined_packets table and counted per field and reason.
+"""
+
+import json
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Optional
+
+from .. import config
+from .. import fields
+from ..persist import storage
+
+logger = logging.getLogger("greenhouse_gateway.validation")
+
+# "nullify": drop only the bad fields and keep the packet
+# "reject":  quarantine the whole packet and skip it
+VALIDATION_POLICY = config.get("validation_policy", "nullify")
+if VALIDATION_POLICY not in ("nullify", "reject"):
+    logger.warning("Unknown validation_policy %r, using nullify", VALIDATION_POLICY)
+    VALIDATION_POLICY = "nullify"
+
+# Reject reasons
+TYPE = "type"
+NAN = "nan"
+INFINITE = "infinite"
+OUT_OF_RANGE = "out_of_range"
+NOT_A_DICT = "not_a_dict"
+
+_lock = threading.Lock()
+_stats = {
+    "checked": 0,
+    "rejected_packets": 0,
+    "nullified_fields": 0,
+}
+_rejects: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+
+# ---------------------------------------------------------------------
+# Compiled validators
+# ---------------------------------------------------------------------
+# Each validator returns None for a good value or a reason string.
+
+def _number_validator(lo: float, hi: float, integral: bool) -> Callable[[Any], Optional[str]]:
+    isfinite = math.isfinite
+
+    def check(value):
+        cls = value.__class__
+        if cls is int:
+            return None if lo <= value <= hi else OUT_OF_RANGE
+        if cls is float:
+            if value != value:
+                return NAN
+            if not isfinite(value):
+                return INFINITE
+            if integral and not value.is_integer():
+                return TYPE
+            return None if lo <= value <= hi else OUT_OF_RANGE
+        return TYPE  # str, bool, list, ...
+
+    return check
+
+
+def _string_validator(value) -> Optional[str]:
+    return None if value.__class__ is str else TYPE
+
+
+def _build_validators() -> tuple:
+    validators = []
+    for f in fields.SENSOR_FIELDS:
+        if f.name in ("jetson_timestamp", "device_id", "packet_key"):
+            continue
+        if f.type is str:
+            check = _string_validator
+        else:
+            lo, hi = f.valid_range or (-math.inf, math.inf)
+            check = _number_validator(lo, hi, integral=f.type is int)
+        validators.append((f.source, check))
+    return tuple(validators)
+
+
+_VALIDATORS = _build_validators()
+
+
+# ---------------------------------------------------------------------
+# Validation stage
+# ---------------------------------------------------------------------
+
+def validate_packet(packet: Any) -> Optional[Dict[str, Any]]:
+    """
+    Check a raw ESP32 packet. Returns the packet (with bad fields set to
+    None under the nullify policy) or None if it must be skipped.
+    """
+    if packet.__class__ is not dict:
+        _record(packet, {"packet": NOT_A_DICT}, "rejected")
+        return None
+
+    errors = None
+    get = packet.get
+    for key, check in _VALIDATORS:
+        value = get(key)
+        if value is None:
+            continue
+        reason = check(value)
+        if reason is not None:
+            if errors is None:
+                errors = {}
+            errors[key] = reason
+
+    if errors is None:
+        with _lock:
+            _stats["checked"] += 1
+        return packet
+
+    if VALIDATION_POLICY == "reject":
+        _record(packet, errors, "rejected")
+        return None
+
+    _record(packet, errors, "nullified")
+    cleaned = dict(packet)
+    for key in errors:
+        cleaned[key] = None
+    return cleaned
+
+
+def _record(packet: Any, errors: Dict[str, str], action: str) -> None:
+    with _lock:
+        _stats["checked"] += 1
+        if action == "rejected":
+            _stats["rejected_packets"] += 1
+        else:
+            _stats["nullified_fields"] += len(errors)
+        for key, reason in errors.items():
+            _rejects[key][reason] += 1
+
+    logger.warning("Invalid sensor packet (%s): %s", action, errors)
+
+    try:
+        storage.insert_quarantined_packet(
+            time.time(),
+            action,
+            json.dumps(errors),
+            json.dumps(packet, default=str),
+        )
+    except Exception as e:
+        logger.exception("Error quarantining invalid packet: %s", e)
+
+
+def get_stats() -> dict:
+    """Validation counters, including rejects per field and reason."""
+    with _lock:
+        stats = dict(_stats)
+        stats["rejects"] = {key: dict(reasons) for key, reasons in _rejects.items()}
+    return stats
@@ -0,0 +1,280 @@
+# greenhouse_gateway/ingest/watchdog.py
+
+"""
+Sensor connectivity watchdog.
+
+Two kinds of deadline are tracked:
+
+  * per device: last packet seen; silent for sensor_timeout_seconds
+    -> "offline", next packet -> "online"
+  * per (device, sensor field) in watchdog_stuck_fields: last time the
+    value changed; missing or unchanged for sensor_stuck_seconds
+    -> "stuck", next different value -> "recovered". Field deadlines
+    are dropped while their device is offline and restart when it is
+    back online.
+
+Deadlines live in a hashed timer wheel with one slot per
+sensor_connectivity_check_seconds. A packet only writes the new
+deadline into a dict. The wheel entry is not touched. When a slot comes
+due, each entry in it is either fired (deadline passed) or moved to the
+slot of its current deadline. A tick therefore costs O(entries due in
+that slot), not a scan of every device and field. A sensor reporting
+every second is moved at most once per timeout.
+
+Events go to the sensor_events table, into the heartbeat (recent
+events plus what is currently stale), and to listeners registered with
+add_listener(). With watchdog_safe_mode on, an offline device or a
+stuck field in watchdog_safe_fields sends watchdog_safe_commands to
+that device. Once it recovers, its commands.json commands are resent.
+The default device listens only on the shared command topic, which
+reaches every node, so it is put in safe mode only while no other
+device is online.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .. import config
+from .. import fields
+from ..control import command_dispatcher
+from ..persist import storage
+
+logger = logging.getLogger("greenhouse_gateway.watchdog")
+
+DEVICE_TIMEOUT = float(config.get("sensor_timeout_seconds", 30))
+CHECK_SECONDS = max(0.1, float(config.get("sensor_connectivity_check_seconds", 5)))
+STUCK_TIMEOUT = float(config.get("sensor_stuck_seconds", 1800))
+STUCK_FIELDS = tuple(config.get("watchdog_stuck_fields", [
+    "inside_temp_f", "inside_humidity_rh", "inside_dew_point_f", "inside_vpd_kpa",
+]))
+SAFE_MODE = bool(config.get("watchdog_safe_mode", False))
+SAFE_COMMANDS = dict(config.get("watchdog_safe_commands", command_dispatcher.DEFAULT_COMMANDS))
+SAFE_FIELDS = tuple(config.get("watchdog_safe_fields", ["inside_vpd_kpa"]))
+RECENT_EVENTS = 20
+
+WHEEL_SLOTS = 512
+
+# Packet key for each tracked field
+_SOURCES = tuple(
+    (name, fields.FIELDS_BY_NAME[name].source)
+    for name in STUCK_FIELDS
+    if name in fields.FIELDS_BY_NAME and fields.FIELDS_BY_NAME[name].source
+)
+
+Key = Tuple[str, Optional[str]]  # (device_id, sensor field or None for the device)
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel with lazy rescheduling. set() is O(1) and never
+    touches the wheel if the key is already scheduled. advance() visits
+    only the slots that came due.
+    """
+
+    def __init__(self, tick: float, slots: int = WHEEL_SLOTS, now: float = 0.0):
+        self.tick = tick
+        self.slots: List[set] = [set() for _ in range(slots)]
+        self.deadlines: Dict[Key, float] = {}
+        self._scheduled: Dict[Key, int] = {}  # key -> tick index of its wheel entry
+        self._current = int(now // tick)      # next tick index to process
+
+    def _place(self, key: Key, deadline: float) -> None:
+        index = max(int(deadline // self.tick), self._current)
+        self.slots[index % len(self.slots)].add(key)
+        self._scheduled[key] = index
+
+    def set(self, key: Key, deadline: float) -> None:
+        self.deadlines[key] = deadline
+        if key not in self._scheduled:
+            self._place(key, deadline)
+
+    def advance(self, now: float) -> List[Key]:
+        """Keys whose deadline is <= now; they are no longer scheduled."""
+        expired = []
+        last = int(now // self.tick)
+        # After a long pause every slot is due once; no need to go round twice
+        first = max(self._current, last - len(self.slots) + 1)
+        self._current = last + 1
+        for index in range(first, last + 1):
+            slot = self.slots[index % len(self.slots)]
+            # Entries for a later revolution stay where they are
+            for key in [key for key in slot if self._scheduled[key] <= index]:
+                slot.discard(key)
+                del self._scheduled[key]
+                deadline = self.deadlines[key]
+                if deadline <= now:
+                    del self.deadlines[key]
+                    expired.append(key)
+                else:
+                    self._place(key, deadline)  # refreshed since it was placed
+        return expired
+
+    def __len__(self) -> int:
+        return len(self.deadlines)
+
+
+_MISSING = object()
+
+_lock = threading.Lock()
+_wheel = TimerWheel(CHECK_SECONDS, now=time.monotonic())
+_last_values: Dict[Key, object] = {}
+_stale: Dict[Key, float] = {}           # key -> epoch when it went stale
+_recent = deque(maxlen=RECENT_EVENTS)
+_listeners: List[Callable[[dict], None]] = []
+_publish = None
+_safe_devices = set()                   # devices currently held at SAFE_COMMANDS
+_stats = {
+    "events": 0,
+    "safe_commands": 0,
+    "ticks": 0,
+    "expired": 0,
+}
+
+
+def add_listener(func: Callable[[dict], None]) -> None:
+    """Call func(event) for every event (device_id, sensor, event, detail, occurred_at)."""
+    _listeners.append(func)
+
+
+def start(publish_func) -> None:
+    """Enable safe-default commands through publish_func (if watchdog_safe_mode)."""
+    global _publish
+    _publish = publish_func
+
+
+# ---------------------------------------------------------------------
+# Events
+# ---------------------------------------------------------------------
+
+def _emit(device_id: str, sensor: Optional[str], event: str, detail: str) -> None:
+    record = {
+        "occurred_at": time.time(),
+        "device_id": device_id,
+        "sensor": sensor,
+        "event": event,
+        "detail": detail,
+    }
+    _stats["events"] += 1
+    _recent.append(record)
+    log = logger.info if event in ("online", "recovered") else logger.warning
+    log("Sensor %s %s%s: %s", event, device_id, f"/{sensor}" if sensor else "", detail)
+    try:
+        storage.insert_sensor_event(record["occurred_at"], device_id, sensor, event, detail)
+    except Exception as e:
+        logger.exception("Error recording sensor event: %s", e)
+    for listener in _listeners:
+        try:
+            listener(record)
+        except Exception as e:
+            logger.exception("Error in sensor event listener: %s", e)
+    if SAFE_MODE and _publish is not None and (sensor is None or sensor in SAFE_FIELDS):
+        _apply_safe_mode(device_id, event)
+
+
+def _others_online(device_id: str) -> bool:
+    with _lock:
+        return any(sensor is None and d != device_id for d, sensor in _wheel.deadlines)
+
+
+def _apply_safe_mode(device_id: str, event: str) -> None:
+    target = None if device_id == fields.DEFAULT_DEVICE_ID else device_id
+    if event in ("offline", "stuck"):
+        if device_id in _safe_devices:
+            return
+        if target is None and _others_online(device_id):
+            logger.warning(
+                "Not sending safe defaults for %s: the shared topic would reach the online devices too",
+                device_id,
+            )
+            return
+        _safe_devices.add(device_id)
+        _stats["safe_commands"] += 1
+        logger.warning("Sending safe defaults to %s: %s", device_id, SAFE_COMMANDS)
+        _publish(dict(SAFE_COMMANDS), target)
+    elif device_id in _safe_devices and not any(
+        d == device_id and (f is None or f in SAFE_FIELDS) for d, f in list(_stale)
+    ):
+        # Fully recovered: put its commands.json commands back
+        _safe_devices.discard(device_id)
+        command_dispatcher.resend(_publish, target)
+
+
+# ---------------------------------------------------------------------
+# Packet / tick entry points
+# ---------------------------------------------------------------------
+
+def observe(packet: dict, now: Optional[float] = None) -> None:
+    """Record a validated packet: refresh the device and changed-field deadlines."""
+    now = time.monotonic() if now is None else now
+    device_id = packet.get("device_id") or fields.DEFAULT_DEVICE_ID
+    events = []
+    with _lock:
+        key = (device_id, None)
+        _wheel.set(key, now + DEVICE_TIMEOUT)
+        if key in _stale:
+            down = time.time() - _stale.pop(key)
+            events.append((device_id, None, "online", f"packet after {down:.0f} s offline"))
+            # Field deadlines were dropped while offline: start them afresh
+            for name, _ in _SOURCES:
+                if (device_id, name) not in _stale:
+                    _wheel.set((device_id, name), now + STUCK_TIMEOUT)
+
+        for name, source in _SOURCES:
+            value = packet.get(source)
+            key = (device_id, name)
+            if value is None:
+                if key not in _wheel.deadlines and key not in _stale:
+                    _wheel.set(key, now + STUCK_TIMEOUT)  # first sighting of a missing field
+                continue
+            if _last_values.get(key, _MISSING) == value:
+                continue  # a stuck value stays stuck until it changes
+            _last_values[key] = value
+            _wheel.set(key, now + STUCK_TIMEOUT)
+            if key in _stale:
+                down = time.time() - _stale.pop(key)
+                events.append((device_id, name, "recovered", f"changed to {value} after {down:.0f} s"))
+
+    for event in events:
+        _emit(*event)
+
+
+def tick(now: Optional[float] = None) -> None:
+    """Fire every deadline that has passed. Run every CHECK_SECONDS."""
+    now = time.monotonic() if now is None else now
+    events = []
+    with _lock:
+        _stats["ticks"] += 1
+        expired = _wheel.advance(now)
+        offline = {device_id for device_id, sensor in expired if sensor is None}
+        for key in expired:
+            device_id, sensor = key
+            if sensor is not None and (device_id in offline or (device_id, None) in _stale):
+                continue  # an offline device's fields are not stuck; reset when it returns
+            _stats["expired"] += 1
+            _stale[key] = time.time()
+            if sensor is None:
+                events.append((device_id, None, "offline", f"no packet for {DEVICE_TIMEOUT:.0f} s"))
+            elif _last_values.get(key, _MISSING) is _MISSING:
+                events.append((device_id, sensor, "stuck", f"missing for {STUCK_TIMEOUT:.0f} s"))
+            else:
+                events.append((
+                    device_id, sensor, "stuck",
+                    f"no new value for {STUCK_TIMEOUT:.0f} s (last {_last_values[key]})",
+                ))
+    for event in events:
+        _emit(*event)
+
+
+def get_status() -> dict:
+    """Heartbeat view: what is stale now and the latest events."""
+    with _lock:
+        stale: Dict[str, list] = {}
+        for device_id, sensor in _stale:
+            stale.setdefault(device_id, []).append(sensor or "device")
+        status = dict(_stats, tracked=len(_wheel))
+    status["stale"] = stale
+    status["recent_events"] = list(_recent)
+    return status
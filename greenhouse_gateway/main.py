@@ -5,10 +5,24 @@ import logging
 from datetime import datetime
 from pathlib import Path
 
+from . import config
+from . import metrics
 from .ingest import mqtt_client
 from .ingest import data_collector
+from .ingest import validation
+from .ingest import dedup
+from .ingest import capture
+from .ingest import watchdog
 from .persist import storage
+from .persist import daily_summary
+from .persist import latest_state
+from .persist import rollups
+from .persist import history_ring
 from .control import command_dispatcher
+from .publish import google_sheets
+from .publish import read_api
+from .enrich import weather_context
+from .enrich import pipeline as enrich_pipeline
 
 BASE_DIR = Path(__file__).resolve().parents[1]
 LOGS_DIR = BASE_DIR / "logs"
@@ -27,53 +41,177 @@ logging.basicConfig(
 
 logger = logging.getLogger("greenhouse_gateway.main")
 
+# Max packets processed per drain before timers get a chance to run
+DRAIN_BATCH_SIZE = max(1, int(config.get("ingest_drain_batch_size", 50)))
+HEARTBEAT_INTERVAL = float(config.get("heartbeat_interval_seconds", 10))
+COMMAND_CHECK_INTERVAL = float(config.get("command_check_interval_seconds", 1))
+
+# Who drives the fans: "file" (commands.json edited by hand/other tools),
+# "baseline" (greenhouse_intelligence baseline fan schedule) or "vpd"
+# (in-process VPD controller, see control/vpd_controller.py)
+CONTROL_MODE = config.get("control_mode", "file")
+BASELINE_CHECK_INTERVAL = float(config.get("baseline_check_interval_seconds", 5))
+
+_controller = None  # VpdController in "vpd" mode
+
+
+class PeriodicJob:
+    """A callable run every `interval` seconds on the monotonic clock."""
+
+    def __init__(self, name, interval, func):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.next_run = time.monotonic()
+
+    def run_if_due(self, now: float) -> None:
+        if now < self.next_run:
+            return
+        try:
+            self.func()
+        except Exception as e:
+            logger.exception("Error in %s job: %s", self.name, e)
+        # Schedule from the previous deadline so the cadence does not drift,
+        # but never try to catch up on runs missed while the loop was busy.
+        self.next_run = max(self.next_run + self.interval, now)
+
+
+def _dispatch_commands():
+    command_dispatcher.check_and_send_commands(mqtt_client.publish_command)
+
+
+def _send_heartbeat():
+    cmds = command_dispatcher.get_current_commands()
+    mqtt_client.publish_status({
+        "status": "alive",
+        "timestamp": datetime.utcnow().isoformat(),
+        "current_commands": cmds,
+        "sheets": google_sheets.get_outbox_stats(),
+        "validation": validation.get_stats(),
+        "sensor_queues": mqtt_client.sensor_queue_depths(),
+        "dedup": dict(dedup.get_stats(), db_conflicts=storage.get_write_stats()["conflicts"]),
+        "metrics": metrics.summary(),
+        "capture": capture.get_stats() if capture.CAPTURE_ENABLED else None,
+        "weather": weather_context.get_stats() if weather_context.enabled() else None,
+        "enrichment": enrich_pipeline.get_stats(),
+        "controller": _controller.get_status() if _controller is not None else None,
+        "sensors": watchdog.get_status(),
+        "api": read_api.get_stats(),
+    })
+
+
+def _process_packets(packets):
+    for packet in packets:
+        start = time.perf_counter()
+        try:
+            if isinstance(packet, dict) and not dedup.check_packet(packet):
+                metrics.since("dedup", start)
+                metrics.inc("packets_duplicate")
+                logger.debug("Dropping duplicate packet %s", packet.get("packet_key"))
+                continue
+            t = metrics.since("dedup", start)
+            packet = validation.validate_packet(packet)
+            metrics.since("validate", t)
+            if packet is None:
+                metrics.inc("packets_rejected")
+                continue
+            t = time.perf_counter()
+            watchdog.observe(packet)
+            metrics.since("watchdog", t)
+            data_collector.process_packet(packet)
+            if _controller is not None:
+                t = time.perf_counter()
+                _controller.on_packet(packet)
+                metrics.since("control", t)
+            metrics.since("process", start)
+            metrics.inc("packets_processed")
+        except Exception as e:
+            metrics.inc("packets_failed")
+            logger.exception("Error processing packet: %s", e)
+
+
+def _register_gauges():
+    metrics.register_gauge("sensor_queue_depth", mqtt_client.sensor_queue_depths)
+    metrics.register_gauge("sensor_queue_dropped", mqtt_client.sensor_queue_dropped)
+    metrics.register_gauge("db_writer_queue_depth", lambda: storage.get_write_stats()["queue_depth"])
+    metrics.register_gauge("sheets_outbox_depth", lambda: google_sheets.get_outbox_stats()["depth"])
+
 
 def main():
+    global _controller
     logger.info("Starting Greenhouse Gateway")
 
+    # Start recording before MQTT so the first payloads are captured too
+    capture.start()
+
+    # Forecast refreshes run in the background; enrichment reads the cache
+    weather_context.start()
+
     # Initialize MQTT (this starts the background loop)
     mqtt_client.init_mqtt()
 
-    last_heartbeat = 0
+    _register_gauges()
+    metrics.start_server()
+    read_api.start_server()
+
+    # Push commands.json edits immediately where inotify is available;
+    # the command sync job below remains as a cheap stat-based fallback
+    command_dispatcher.start_watcher(mqtt_client.publish_command)
+
+    watchdog.start(mqtt_client.publish_command)
+    rollups.start_retention()
+
+    jobs = [
+        PeriodicJob("command sync", COMMAND_CHECK_INTERVAL, _dispatch_commands),
+        PeriodicJob("sensor watchdog", watchdog.CHECK_SECONDS, watchdog.tick),
+        PeriodicJob("heartbeat", HEARTBEAT_INTERVAL, _send_heartbeat),
+        PeriodicJob("daily summary rollover", 60, daily_summary.check_rollover),
+        PeriodicJob("latest snapshot", latest_state.SNAPSHOT_INTERVAL, latest_state.flush_snapshot),
+    ]
+
+    if CONTROL_MODE == "baseline":
+        from greenhouse_intelligence.baseline.scheduler import BaselineScheduler
+        scheduler = BaselineScheduler()
+        scheduler.load_or_start()
+        jobs.append(PeriodicJob("baseline schedule", BASELINE_CHECK_INTERVAL, scheduler.tick))
+    elif CONTROL_MODE == "vpd":
+        from .control.vpd_controller import VpdController
+        _controller = VpdController(mqtt_client.publish_command)
+        # Packets drive the loop; this only notices the commands.json
+        # switch while no packets arrive
+        jobs.append(PeriodicJob("vpd controller switch", COMMAND_CHECK_INTERVAL, _controller.check_switch))
+        watchdog.add_listener(_controller.on_sensor_event)
+    elif CONTROL_MODE != "file":
+        logger.warning("Unknown control_mode %r, leaving commands.json alone", CONTROL_MODE)
 
     try:
         while True:
-            now = time.time()
-
-            # 1. See if any new sensor packets have arrived
-            packet = mqtt_client.get_next_sensor_packet()
-            if packet is not None:
-                try:
-                    data_collector.process_packet(packet)
-                except Exception as e:
-                    logger.exception("Error processing packet: %s", e)
-
-            # 2. Check if commands.json changed and send commands if needed
-            try:
-                command_dispatcher.check_and_send_commands(mqtt_client.publish_command)
-            except Exception as e:
-                logger.exception("Error dispatching commands: %s", e)
-
-            # 3. Send Jetson heartbeat every 10 seconds
-            if now - last_heartbeat >= 10:
-                try:
-                    cmds = command_dispatcher.get_current_commands()
-                    mqtt_client.publish_status({
-                        "status": "alive",
-                        "timestamp": datetime.utcnow().isoformat(),
-                        "current_commands": cmds
-                    })
-                    last_heartbeat = now
-                except Exception as e:
-                    logger.exception("Error sending heartbeat: %s", e)
-
-            time.sleep(1)
+            # 1. Run any timer jobs that are due (command sync, heartbeat)
+            now = time.monotonic()
+            for job in jobs:
+                job.run_if_due(now)
+
+            # 2. Sleep on the sensor queue until a packet arrives or the
+            #    next job is due, then drain everything that is waiting
+            timeout = min(job.next_run for job in jobs) - time.monotonic()
+            packets = mqtt_client.wait_for_sensor_packets(timeout, DRAIN_BATCH_SIZE)
+            _process_packets(packets)
 
     except KeyboardInterrupt:
         logger.info("Gateway interrupted by user, shutting down")
 
     finally:
+        command_dispatcher.stop_watcher()
         mqtt_client.shutdown()
+        capture.stop()
+        weather_context.stop()
+        enrich_pipeline.shutdown()
+        google_sheets.shutdown()
+        rollups.stop_retention()
+        latest_state.flush_snapshot(force=True)
+        history_ring.close()
+        metrics.stop_server()
+        read_api.stop_server()
         storage.close_connection()
         logger.info("Gateway stopped")
 
@@ -0,0 +1,238 @@
+# greenhouse_gateway/metrics.py
+
+"""
+Ingest pipeline instrumentation.
+
+Each stage records its duration (time.perf_counter, a monotonic clock)
+into a fixed-bucket histogram: an observation is one bisect and a few
+integer adds, so it is cheap enough for every packet. Counters and
+gauges cover throughput, drops and queue depths.
+
+The numbers are exposed two ways:
+
+  * summary(): compact per-stage counts/mean/p95 for the MQTT heartbeat
+  * a Prometheus text-format endpoint on 127.0.0.1:<metrics_port>/metrics
+"""
+
+import bisect
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+
+from . import config
+
+logger = logging.getLogger("greenhouse_gateway.metrics")
+
+METRICS_HOST = config.get("metrics_host", "127.0.0.1")
+METRICS_PORT = int(config.get("metrics_port", 9108))  # 0 = no endpoint
+
+# Upper bounds in seconds: 10 us .. 10 s, roughly 1-2.5-5 per decade
+BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# Pipeline stages, in packet order
+STAGES = (
+    "mqtt_receive",   # MQTT callback: decode + enqueue
+    "queue_wait",     # enqueue -> drained by the main loop
+    "dedup",
+    "validate",
+    "watchdog",       # connectivity deadlines
+    "normalize",
+    "enrich",
+    "db_insert",      # hand-off to the batched writer
+    "snapshot",       # latest state + history ring
+    "daily_summary",
+    "sheets_buffer",
+    "control",        # in-process controller decision + publish
+    "process",        # whole packet, dedup through controller
+)
+
+
+class Histogram:
+    """Cumulative fixed-bucket histogram (Prometheus semantics)."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last = +Inf
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.count, self.sum
+
+    def quantile(self, q: float, counts=None, count=None) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile."""
+        if counts is None:
+            counts, count, _ = self.snapshot()
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+_histograms: Dict[str, Histogram] = {stage: Histogram() for stage in STAGES}
+_counters: Dict[str, int] = {}
+_counter_lock = threading.Lock()
+_gauges: Dict[str, Callable[[], object]] = {}
+
+
+def add_stage(stage: str) -> None:
+    """Register an extra timed stage (e.g. one per enrichment provider)."""
+    _histograms.setdefault(stage, Histogram())
+
+
+def observe(stage: str, seconds: float) -> None:
+    _histograms[stage].observe(seconds)
+
+
+def since(stage: str, start: float) -> float:
+    """Record perf_counter() - start for a stage; returns the new now."""
+    now = time.perf_counter()
+    _histograms[stage].observe(now - start)
+    return now
+
+
+def inc(name: str, amount: int = 1) -> None:
+    with _counter_lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def register_gauge(name: str, func: Callable[[], object]) -> None:
+    """
+    Report func() at scrape/summary time. It may return a number or a
+    {label value: number} dict (exported with a "device" label).
+    """
+    _gauges[name] = func
+
+
+def _read_gauges() -> dict:
+    values = {}
+    for name, func in _gauges.items():
+        try:
+            values[name] = func()
+        except Exception as e:
+            logger.debug("Gauge %s failed: %s", name, e)
+    return values
+
+
+# ---------------------------------------------------------------------
+# Heartbeat summary
+# ---------------------------------------------------------------------
+
+def summary() -> dict:
+    stages = {}
+    for stage, hist in _histograms.items():
+        counts, count, total = hist.snapshot()
+        if not count:
+            continue
+        p95 = hist.quantile(0.95, counts, count)
+        stages[stage] = {
+            "count": count,
+            "mean_ms": round(total / count * 1e3, 3),
+            "p95_ms": None if p95 == float("inf") else round(p95 * 1e3, 3),
+        }
+    with _counter_lock:
+        counters = dict(_counters)
+    return {"stages": stages, "counters": counters, "gauges": _read_gauges()}
+
+
+# ---------------------------------------------------------------------
+# Prometheus endpoint
+# ---------------------------------------------------------------------
+
+def _label_value(value) -> str:
+    """Escape a label value for the text exposition format."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus() -> str:
+    lines = [
+        "# HELP greenhouse_stage_seconds Time spent per ingest pipeline stage",
+        "# TYPE greenhouse_stage_seconds histogram",
+    ]
+    for stage, hist in _histograms.items():
+        counts, count, total = hist.snapshot()
+        cumulative = 0
+        for bound, n in zip(hist.buckets, counts):
+            cumulative += n
+            lines.append(f'greenhouse_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        lines.append(f'greenhouse_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+        lines.append(f'greenhouse_stage_seconds_sum{{stage="{stage}"}} {total}')
+        lines.append(f'greenhouse_stage_seconds_count{{stage="{stage}"}} {count}')
+
+    with _counter_lock:
+        counters = dict(_counters)
+    for name, value in sorted(counters.items()):
+        lines.append(f"# TYPE greenhouse_{name}_total counter")
+        lines.append(f"greenhouse_{name}_total {value}")
+
+    for name, value in sorted(_read_gauges().items()):
+        lines.append(f"# TYPE greenhouse_{name} gauge")
+        if isinstance(value, dict):
+            for label, v in sorted(value.items(), key=lambda item: str(item[0])):
+                lines.append(f'greenhouse_{name}{{device="{_label_value(label)}"}} {v}')
+        elif value is not None:
+            lines.append(f"greenhouse_{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("metrics %s", format % args)
+
+
+_server = None
+
+
+def start_server() -> bool:
+    """Serve /metrics on a daemon thread. Returns False if disabled or the port is taken."""
+    global _server
+    if _server is not None or not METRICS_PORT:
+        return _server is not None
+    try:
+        _server = ThreadingHTTPServer((METRICS_HOST, METRICS_PORT), _MetricsHandler)
+    except OSError as e:
+        logger.warning("Metrics endpoint disabled, cannot bind %s:%s: %s", METRICS_HOST, METRICS_PORT, e)
+        return False
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info("Serving metrics at http://%s:%s/metrics", METRICS_HOST, METRICS_PORT)
+    return True
+
+
+def stop_server() -> None:
+    global _server
+    if _server is not None:
+        _server.shutdown()
+        _server.server_close()
+        _server = None
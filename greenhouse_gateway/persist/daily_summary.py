@@ -0,0 +1,367 @@
+# greenhouse_gateway/persist/daily_summary.py
+
+"""
+Daily summary engine.
+
+Maintains running per-day statistics as packets are processed and
+integrates actuator PWM-on time into runtime minutes. When the local
+day rolls over, the finished day is written to daily_summary and handed
+to the Google Sheets uploader.
+
+The same numbers can be rebuilt for any range of days with one
+aggregate SQL pass over samples:
+
+    python -m greenhouse_gateway.persist.daily_summary --start 2025-12-01 --end 2025-12-31
+"""
+
+import argparse
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from .. import config
+from . import storage
+
+logger = logging.getLogger("greenhouse_gateway.daily_summary")
+
+# Gaps longer than this (gateway or ESP32 offline) do not count as runtime
+MAX_GAP_SECONDS = float(config.get("summary_max_gap_seconds", 60))
+
+# Actuator PWM column -> daily_summary runtime column
+RUNTIME_FIELDS = {
+    "grow_light_pwm": "total_light_minutes",
+    "exhaust_fan_pwm": "total_exhaust_minutes",
+    "circulation_fan_pwm": "total_circulation_minutes",
+}
+
+
+# ---------------------------------------------------------------------
+# Backfill SQL
+# ---------------------------------------------------------------------
+# One pass over samples: LAG() gives each row the previous sample's time
+# and PWM state from the same device, so the interval since that sample
+# is credited to an actuator if it was on during that interval. Runtime
+# is summed over devices. The window spans day boundaries on purpose,
+# matching the incremental accumulator. season_state is then looked up
+# per day through the timestamp index.
+
+_AGGREGATE_SQL = """
+WITH ordered AS (
+    SELECT
+        substr(local_time, 1, 10) AS day,
+        timestamp_utc,
+        inside_temp_f,
+        inside_humidity_rh,
+        (julianday(timestamp_utc) - julianday(LAG(timestamp_utc) OVER w)) * 86400.0 AS dt,
+        LAG(grow_light_pwm) OVER w AS prev_light,
+        LAG(exhaust_fan_pwm) OVER w AS prev_exhaust,
+        LAG(circulation_fan_pwm) OVER w AS prev_circulation
+    FROM samples
+    WHERE timestamp_utc >= :scan_start AND timestamp_utc < :scan_end
+    WINDOW w AS (PARTITION BY device_id ORDER BY timestamp_utc)
+),
+days AS (
+    SELECT
+        day,
+        COUNT(*) AS sample_count,
+        SUM(inside_temp_f) AS temp_sum,
+        COUNT(inside_temp_f) AS temp_count,
+        MIN(inside_temp_f) AS min_temp_f,
+        MAX(inside_temp_f) AS max_temp_f,
+        SUM(inside_humidity_rh) AS humidity_sum,
+        COUNT(inside_humidity_rh) AS humidity_count,
+        MIN(inside_humidity_rh) AS min_humidity_rh,
+        MAX(inside_humidity_rh) AS max_humidity_rh,
+        SUM(CASE WHEN dt > 0 AND dt <= :max_gap AND prev_light > 0 THEN dt ELSE 0 END) AS light_seconds,
+        SUM(CASE WHEN dt > 0 AND dt <= :max_gap AND prev_exhaust > 0 THEN dt ELSE 0 END) AS exhaust_seconds,
+        SUM(CASE WHEN dt > 0 AND dt <= :max_gap AND prev_circulation > 0 THEN dt ELSE 0 END) AS circulation_seconds,
+        MIN(timestamp_utc) AS first_timestamp_utc,
+        MAX(timestamp_utc) AS last_timestamp_utc
+    FROM ordered
+    WHERE day >= :start AND day <= :end
+    GROUP BY day
+)
+SELECT
+    days.*,
+    -- Latest non-NULL value of the day, like the incremental accumulator
+    (
+        SELECT season_state FROM samples
+        WHERE timestamp_utc BETWEEN days.first_timestamp_utc AND days.last_timestamp_utc
+          AND substr(local_time, 1, 10) = days.day
+          AND season_state IS NOT NULL
+        ORDER BY timestamp_utc DESC
+        LIMIT 1
+    ) AS season_state
+FROM days
+ORDER BY day
+"""
+
+
+# ---------------------------------------------------------------------
+# Accumulator
+# ---------------------------------------------------------------------
+
+class DayAccumulator:
+    """Running statistics for one local day."""
+
+    def __init__(self, day: str):
+        self.day = day
+        self.season_state = None
+        self.sample_count = 0
+        self.temp_sum = 0.0
+        self.temp_count = 0
+        self.min_temp_f = None
+        self.max_temp_f = None
+        self.humidity_sum = 0.0
+        self.humidity_count = 0
+        self.min_humidity_rh = None
+        self.max_humidity_rh = None
+        self.runtime_seconds = {field: 0.0 for field in RUNTIME_FIELDS}
+
+    @classmethod
+    def from_aggregate(cls, row) -> "DayAccumulator":
+        acc = cls(row["day"])
+        acc.season_state = row["season_state"]
+        acc.sample_count = row["sample_count"]
+        acc.temp_sum = row["temp_sum"] or 0.0
+        acc.temp_count = row["temp_count"]
+        acc.min_temp_f = row["min_temp_f"]
+        acc.max_temp_f = row["max_temp_f"]
+        acc.humidity_sum = row["humidity_sum"] or 0.0
+        acc.humidity_count = row["humidity_count"]
+        acc.min_humidity_rh = row["min_humidity_rh"]
+        acc.max_humidity_rh = row["max_humidity_rh"]
+        acc.runtime_seconds = {
+            "grow_light_pwm": row["light_seconds"] or 0.0,
+            "exhaust_fan_pwm": row["exhaust_seconds"] or 0.0,
+            "circulation_fan_pwm": row["circulation_seconds"] or 0.0,
+        }
+        return acc
+
+    def add(self, packet: dict, dt: Optional[float], previous_pwm: dict) -> None:
+        self.sample_count += 1
+        if packet.get("season_state") is not None:
+            self.season_state = packet["season_state"]
+
+        temp = packet.get("inside_temp_f")
+        if isinstance(temp, (int, float)):
+            self.temp_sum += temp
+            self.temp_count += 1
+            self.min_temp_f = temp if self.min_temp_f is None else min(self.min_temp_f, temp)
+            self.max_temp_f = temp if self.max_temp_f is None else max(self.max_temp_f, temp)
+
+        rh = packet.get("inside_humidity_rh")
+        if isinstance(rh, (int, float)):
+            self.humidity_sum += rh
+            self.humidity_count += 1
+            self.min_humidity_rh = rh if self.min_humidity_rh is None else min(self.min_humidity_rh, rh)
+            self.max_humidity_rh = rh if self.max_humidity_rh is None else max(self.max_humidity_rh, rh)
+
+        # Credit the interval since the previous sample to whatever was on
+        if dt is not None and 0 < dt <= MAX_GAP_SECONDS:
+            for field in RUNTIME_FIELDS:
+                pwm = previous_pwm.get(field)
+                if pwm is not None and pwm > 0:
+                    self.runtime_seconds[field] += dt
+
+    def to_row(self) -> dict:
+        row = {
+            "date": self.day,
+            "season_state": self.season_state,
+            "avg_temp_f": self.temp_sum / self.temp_count if self.temp_count else None,
+            "min_temp_f": self.min_temp_f,
+            "max_temp_f": self.max_temp_f,
+            "avg_humidity_rh": self.humidity_sum / self.humidity_count if self.humidity_count else None,
+            "min_humidity_rh": self.min_humidity_rh,
+            "max_humidity_rh": self.max_humidity_rh,
+        }
+        for field, column in RUNTIME_FIELDS.items():
+            row[column] = int(round(self.runtime_seconds[field] / 60.0))
+        return row
+
+
+# ---------------------------------------------------------------------
+# Incremental engine (called from the ingest pipeline)
+# ---------------------------------------------------------------------
+
+_current: Optional[DayAccumulator] = None
+_last_ts: Dict[str, float] = {}  # device_id -> epoch of its previous sample
+_last_pwm: Dict[str, dict] = {}  # device_id -> PWM state of that sample
+_resumed_upto: Dict[str, float] = {}  # device_id -> newest sample already in the resumed totals
+_initialized = False
+
+
+def _packet_epoch(packet: dict) -> Optional[float]:
+    ts = packet.get("jetson_timestamp")
+    if not ts:
+        return None
+    try:
+        return datetime.fromisoformat(ts).replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        return None
+
+
+def _init() -> None:
+    """
+    Resume after a restart: rebuild today's accumulator from samples and
+    write yesterday's summary if the gateway was down at midnight.
+    """
+    global _initialized, _current
+    _initialized = True
+
+    today = date.today()
+    yesterday = (today - timedelta(days=1)).isoformat()
+    try:
+        # Land queued rows first (including the packet that triggered
+        # this), so the totals below are exactly what add_packet skips
+        storage.flush()
+        conn = storage.get_connection()
+        have_yesterday = conn.execute(
+            "SELECT 1 FROM daily_summary WHERE date = ?", (yesterday,)
+        ).fetchone()
+        if not have_yesterday:
+            for row in backfill(yesterday, yesterday):
+                _publish(row)
+
+        rows = compute_range(today.isoformat(), today.isoformat())
+        if rows:
+            _current = DayAccumulator.from_aggregate(rows[0])
+            latest = conn.execute(
+                "SELECT device_id, MAX(timestamp_utc) AS timestamp_utc, "
+                "grow_light_pwm, exhaust_fan_pwm, circulation_fan_pwm "
+                "FROM samples WHERE timestamp_utc >= ? GROUP BY device_id",
+                (yesterday,),
+            ).fetchall()
+            for last in latest:
+                device_id = last["device_id"]
+                _last_ts[device_id] = _packet_epoch({"jetson_timestamp": last["timestamp_utc"]})
+                _resumed_upto[device_id] = _last_ts[device_id]
+                _last_pwm[device_id] = {field: last[field] for field in RUNTIME_FIELDS}
+            logger.info(
+                "Resumed daily summary for %s from %d stored samples",
+                _current.day, _current.sample_count,
+            )
+    except Exception as e:
+        logger.exception("Error resuming daily summary state: %s", e)
+
+
+def add_packet(packet: dict) -> None:
+    """Update the running summary with one enriched packet."""
+    global _current
+
+    if not _initialized:
+        _init()
+
+    day = (packet.get("local_time") or "")[:10]
+    if not day:
+        return
+
+    if _current is None:
+        _current = DayAccumulator(day)
+    elif day != _current.day:
+        _finish_day()
+        _current = DayAccumulator(day)
+
+    device_id = packet.get("device_id")
+    ts = _packet_epoch(packet)
+    resumed = _resumed_upto.get(device_id)
+    if resumed is not None and ts is not None:
+        if ts <= resumed:
+            return  # already counted from the database on resume
+        del _resumed_upto[device_id]
+    last_ts = _last_ts.get(device_id)
+    dt = ts - last_ts if ts is not None and last_ts is not None else None
+    _current.add(packet, dt, _last_pwm.get(device_id, {}))
+
+    if ts is not None:
+        _last_ts[device_id] = ts
+        _last_pwm[device_id] = {field: packet.get(field) for field in RUNTIME_FIELDS}
+
+
+def check_rollover() -> None:
+    """Finish the current day at local midnight even if no packets arrive."""
+    global _current
+    if _current is not None and date.today().isoformat() > _current.day:
+        _finish_day()
+        _current = None
+
+
+def _finish_day() -> None:
+    row = _current.to_row()
+    logger.info("Finishing daily summary for %s (%d samples)", row["date"], _current.sample_count)
+    try:
+        storage.upsert_daily_summary(row)
+    except Exception as e:
+        logger.exception("Error writing daily summary for %s: %s", row["date"], e)
+    _publish(row)
+
+
+def _publish(row: dict) -> None:
+    # Imported lazily: the Sheets publisher depends on persist, not vice versa
+    from ..publish import google_sheets
+
+    payload = dict(row)
+    payload["type"] = "summary"
+    try:
+        google_sheets.upload_daily_summary(payload)
+    except Exception as e:
+        logger.exception("Error uploading daily summary for %s: %s", row["date"], e)
+
+
+# ---------------------------------------------------------------------
+# Backfill
+# ---------------------------------------------------------------------
+
+def compute_range(start: str, end: str, conn=None) -> list:
+    """
+    Aggregate rows for local days start..end (inclusive, YYYY-MM-DD)
+    with a single SQL pass. The scan is widened by a day on each side
+    so the UTC timestamp index can be used whatever the local offset.
+    """
+    conn = conn or storage.get_connection()
+    scan_start = (date.fromisoformat(start) - timedelta(days=1)).isoformat()
+    scan_end = (date.fromisoformat(end) + timedelta(days=2)).isoformat()
+    return conn.execute(
+        _AGGREGATE_SQL,
+        {
+            "start": start,
+            "end": end,
+            "scan_start": scan_start,
+            "scan_end": scan_end,
+            "max_gap": MAX_GAP_SECONDS,
+        },
+    ).fetchall()
+
+
+def backfill(start: str, end: str, conn=None) -> list:
+    """
+    Rebuild daily_summary rows for start..end. Idempotent: existing rows
+    are overwritten (notes are kept). Returns the summary rows written.
+    """
+    rows = [
+        DayAccumulator.from_aggregate(row).to_row()
+        for row in compute_range(start, end, conn)
+    ]
+    for row in rows:
+        storage.upsert_daily_summary(row)
+    logger.info("Backfilled %d daily summaries for %s..%s", len(rows), start, end)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild daily_summary from samples")
+    parser.add_argument("--start", required=True, help="first local day (YYYY-MM-DD)")
+    parser.add_argument("--end", help="last local day (default: --start)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+
+    try:
+        for row in backfill(args.start, args.end or args.start):
+            print(row)
+    finally:
+        storage.close_connection()
+
+
+if __name__ == "__main__":
+    main()
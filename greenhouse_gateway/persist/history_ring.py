@@ -0,0 +1,230 @@
+# greenhouse_gateway/persist/history_ring.py
+
+"""
+Memory-mapped ring buffer of recent samples, one file per device:
+
+    greenhouse_gateway/runtime/history_<device_id>.ring
+
+Layout (little-endian):
+
+    0     header   magic, version, capacity, column count, cursor
+    64    names    column names, newline separated (up to 4032 bytes)
+    4096  data     one float64 column of `capacity` slots per field
+
+`cursor` is the total number of samples ever written; sample k lives
+in slot k % capacity. The gateway appends with the stdlib only.
+Other processes open the file read-only with RingReader and get NumPy
+views of the columns, with no parsing and no database locks.
+
+The writer fills a slot before it advances the cursor. A reader that
+copies a window can check that the cursor did not wrap over it while
+copying (RingReader.latest does this). Missing values are NaN.
+"""
+
+import logging
+import mmap
+import os
+import struct
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional
+
+from .. import config
+from .latest_state import RUNTIME_DIR
+
+logger = logging.getLogger("greenhouse_gateway.history_ring")
+
+# 12 h at the ESP32's 5 s publish interval
+CAPACITY = max(1, int(config.get("history_ring_capacity", 8640)))
+
+COLUMNS = (
+    "timestamp",  # epoch seconds (UTC)
+    "inside_temp_f",
+    "inside_humidity_rh",
+    "inside_dew_point_f",
+    "inside_vpd_kpa",
+    "inside_brightness_lux",
+    "outside_brightness_raw",
+    "circulation_fan_pwm",
+    "exhaust_fan_pwm",
+    "grow_light_pwm",
+)
+
+MAGIC = b"GHRING1\0"
+VERSION = 1
+_HEADER = struct.Struct("<8sIIIxxxxQ")  # magic, version, capacity, ncols, cursor
+_CURSOR_OFFSET = 24
+_NAMES_OFFSET = 64
+DATA_OFFSET = 4096
+
+_NAN = float("nan")
+
+
+def ring_path(device_id: str) -> Path:
+    return RUNTIME_DIR / f"history_{device_id}.ring"
+
+
+def _epoch(timestamp) -> float:
+    try:
+        return datetime.fromisoformat(timestamp).replace(tzinfo=timezone.utc).timestamp()
+    except (TypeError, ValueError):
+        return _NAN
+
+
+# ---------------------------------------------------------------------
+# Writer (gateway)
+# ---------------------------------------------------------------------
+
+class RingWriter:
+    """Appends rows to one ring file. Not thread-safe; see append()."""
+
+    def __init__(self, path: Path, capacity: int = CAPACITY, columns=COLUMNS):
+        self.path = Path(path)
+        self.capacity = capacity
+        self.columns = tuple(columns)
+        size = DATA_OFFSET + 8 * capacity * len(self.columns)
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if not self._compatible(fd):
+                # New file, or one written with another capacity/column set
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+                self._mm = mmap.mmap(fd, size)
+                names = "\n".join(self.columns).encode()
+                if len(names) > DATA_OFFSET - _NAMES_OFFSET:
+                    raise ValueError("Too many ring buffer columns")
+                self._mm[_NAMES_OFFSET:_NAMES_OFFSET + len(names)] = names
+                _HEADER.pack_into(self._mm, 0, MAGIC, VERSION, capacity, len(self.columns), 0)
+            else:
+                self._mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        self._data = memoryview(self._mm)[DATA_OFFSET:].cast("d")
+        self.cursor = _HEADER.unpack_from(self._mm, 0)[4]
+
+    def _compatible(self, fd: int) -> bool:
+        header = os.pread(fd, DATA_OFFSET, 0)
+        if len(header) < DATA_OFFSET:
+            return False
+        magic, version, capacity, ncols, _ = _HEADER.unpack_from(header, 0)
+        names = header[_NAMES_OFFSET:].rstrip(b"\0").decode(errors="replace").split("\n")
+        return (
+            magic == MAGIC and version == VERSION and capacity == self.capacity
+            and ncols == len(self.columns) and tuple(names) == self.columns
+            and os.fstat(fd).st_size == DATA_OFFSET + 8 * self.capacity * ncols
+        )
+
+    def append(self, packet: dict) -> None:
+        slot = self.cursor % self.capacity
+        data = self._data
+        cap = self.capacity
+        get = packet.get
+        data[slot] = _epoch(get("jetson_timestamp"))
+        for i, name in enumerate(self.columns[1:], 1):
+            value = get(name)
+            data[i * cap + slot] = _NAN if value is None else float(value)
+        # Publish the row only after every column is written
+        self.cursor += 1
+        struct.pack_into("<Q", self._mm, _CURSOR_OFFSET, self.cursor)
+
+    def close(self) -> None:
+        self._data.release()
+        self._mm.close()
+
+
+_writers: Dict[str, RingWriter] = {}
+_lock = threading.Lock()
+
+
+def append(packet: dict) -> None:
+    """Append an enriched packet to its device's ring."""
+    device_id = packet.get("device_id")
+    with _lock:
+        writer = _writers.get(device_id)
+        if writer is None:
+            writer = _writers[device_id] = RingWriter(ring_path(device_id))
+            logger.info("History ring for %s at %s (%d slots)", device_id, writer.path, writer.capacity)
+        writer.append(packet)
+
+
+def close() -> None:
+    with _lock:
+        for writer in _writers.values():
+            writer.close()
+        _writers.clear()
+
+
+# ---------------------------------------------------------------------
+# Reader (other processes)
+# ---------------------------------------------------------------------
+
+class RingReader:
+    """
+    Read-only NumPy access to a ring file:
+
+        ring = RingReader(ring_path("esp32"))
+        recent = ring.window(3600)              # last hour, oldest first
+        recent["inside_vpd_kpa"].mean()
+    """
+
+    def __init__(self, path: Path):
+        import numpy as np
+
+        self._np = np
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, capacity, ncols, _ = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a history ring file")
+        names = self._mm[_NAMES_OFFSET:DATA_OFFSET].rstrip(b"\0").decode().split("\n")
+        self.capacity = capacity
+        self.columns = tuple(names[:ncols])
+        # (ncols, capacity) read-only view of the whole data area
+        self._data = np.frombuffer(
+            self._mm, dtype="<f8", count=ncols * capacity, offset=DATA_OFFSET
+        ).reshape(ncols, capacity)
+
+    @property
+    def cursor(self) -> int:
+        return struct.unpack_from("<Q", self._mm, _CURSOR_OFFSET)[0]
+
+    def column(self, name: str):
+        """Live view of one column in slot order (not time order)."""
+        return self._data[self.columns.index(name)]
+
+    def latest(self, n: Optional[int] = None) -> Dict[str, "object"]:
+        """
+        The newest `n` samples (all valid ones by default), oldest
+        first, as {column: array}. Rows the writer overwrote while they
+        were being copied are dropped.
+        """
+        np = self._np
+        end = self.cursor
+        count = min(end, self.capacity) if n is None else min(n, end, self.capacity)
+        slots = np.arange(end - count, end) % self.capacity
+        block = self._data[:, slots]  # fancy indexing copies
+        # Sample k shares its slot with k + capacity; anything the writer
+        # may have started on since `end` was read is unreliable
+        overwritten = max(0, self.cursor + 1 - self.capacity - (end - count))
+        if overwritten:
+            block = block[:, overwritten:]
+        return dict(zip(self.columns, block))
+
+    def window(self, seconds: float, now: Optional[float] = None) -> Dict[str, "object"]:
+        """Samples from the last `seconds` (relative to `now`, default newest sample)."""
+        rows = self.latest()
+        ts = rows["timestamp"]
+        if not len(ts):
+            return rows
+        end = self._np.nanmax(ts) if now is None else now
+        # A mask rather than searchsorted: replayed packets can arrive
+        # out of order
+        keep = ts >= end - seconds
+        return {name: values[keep] for name, values in rows.items()}
+
+    def close(self) -> None:
+        self._data = None
+        self._mm.close()
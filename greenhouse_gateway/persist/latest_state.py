@@ -0,0 +1,85 @@
+# greenhouse_gateway/persist/latest_state.py
+
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .. import config
+from ..atomic_file import atomic_write_text
+
+logger = logging.getLogger("greenhouse_gateway.latest_state")
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+RUNTIME_DIR = BASE_DIR / "runtime"
+RUNTIME_DIR.mkdir(parents=True, exist_ok=True)
+
+SNAPSHOT_PATH = RUNTIME_DIR / "latest_packet.json"
+
+# At most one snapshot write per interval; updates in between coalesce
+SNAPSHOT_INTERVAL = float(config.get("latest_snapshot_interval_seconds", 5))
+
+_lock = threading.Lock()
+_latest: Optional[Dict[str, Any]] = None
+_latest_by_device: Dict[str, Dict[str, Any]] = {}
+_updated_at: Optional[float] = None  # epoch seconds of the last update
+_dirty = False
+_last_write = 0.0  # monotonic
+
+
+def update(packet: Dict[str, Any]) -> None:
+    """
+    Record the newest enriched packet. The dict is kept by reference, so
+    callers must not mutate it afterwards. The on-disk snapshot is
+    written now if the interval has passed, otherwise on a later flush.
+    """
+    global _latest, _updated_at, _dirty
+    with _lock:
+        _latest = packet
+        _latest_by_device[packet.get("device_id")] = packet
+        _updated_at = time.time()
+        _dirty = True
+    flush_snapshot()
+
+
+def get_latest(device_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Newest packet from memory (a shallow copy), overall or for one
+    device, or None if nothing has arrived yet.
+    """
+    with _lock:
+        packet = _latest if device_id is None else _latest_by_device.get(device_id)
+        return dict(packet) if packet is not None else None
+
+
+def get_latest_by_device() -> Dict[str, Dict[str, Any]]:
+    with _lock:
+        return {device_id: dict(packet) for device_id, packet in _latest_by_device.items()}
+
+
+def get_age_seconds() -> Optional[float]:
+    with _lock:
+        return time.time() - _updated_at if _updated_at is not None else None
+
+
+def flush_snapshot(force: bool = False) -> None:
+    """Write latest_packet.json if it is stale and the interval allows."""
+    global _dirty, _last_write
+    with _lock:
+        if not _dirty:
+            return
+        now = time.monotonic()
+        if not force and now - _last_write < SNAPSHOT_INTERVAL:
+            return
+        packet = _latest
+        _dirty = False
+        _last_write = now
+
+    try:
+        atomic_write_text(
+            SNAPSHOT_PATH, json.dumps(packet, separators=(",", ":"), default=str)
+        )
+    except Exception as e:
+        logger.exception("Error writing latest_packet.json: %s", e)
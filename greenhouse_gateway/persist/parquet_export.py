@@ -0,0 +1,240 @@
+# greenhouse_gateway/persist/parquet_export.py
+
+"""
+Columnar export of `samples` for ML training.
+
+Writes one Parquet file per UTC day under
+
+    exports/samples/date=YYYY-MM-DD/part-0.parquet
+
+(hive-style partitions, so pyarrow.dataset / pandas.read_parquet can
+filter on date without opening other days). The Arrow schema is built
+from the live samples table (PRAGMA table_info, i.e. schema.sql), so
+new columns show up in the export without code changes.
+
+Exports are incremental: a fingerprint per day (row count and rowid
+range) is kept in exports/samples/_export_state.json and only days
+whose fingerprint changed are rewritten. Raw retention never shrinks an
+export: a partition is not rewritten once its day reaches the retention
+cutoff, or when samples holds fewer rows for the day than the file.
+
+Rows are streamed with fetchmany() and written one record batch at a
+time, so memory use depends on EXPORT_CHUNK_ROWS, not on the size of
+greenhouse.db.
+
+Usage:
+    python -m greenhouse_gateway.persist.parquet_export [--full] [--day YYYY-MM-DD]
+"""
+
+import argparse
+import json
+import logging
+import os
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only needed for exports
+    pa = None
+    pq = None
+
+from .. import config
+from ..atomic_file import atomic_write_text
+from . import rollups
+from . import storage
+
+logger = logging.getLogger("greenhouse_gateway.parquet_export")
+
+EXPORT_DIR = config.PROJECT_ROOT / config.get("export_dir", "exports") / "samples"
+STATE_PATH = EXPORT_DIR / "_export_state.json"
+EXPORT_CHUNK_ROWS = max(1, int(config.get("export_chunk_rows", 10000)))
+EXPORT_COMPRESSION = config.get("export_compression", "zstd")
+
+# Per-day fingerprint; changes whenever rows are added, replaced or pruned
+_DAY_FINGERPRINT_SQL = """
+    SELECT substr(timestamp_utc, 1, 10) AS day,
+           count(*) AS rows,
+           min(rowid) AS min_rowid,
+           max(rowid) AS max_rowid
+    FROM samples
+    GROUP BY day
+    ORDER BY day
+"""
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise RuntimeError("pyarrow is required for Parquet export (pip install pyarrow)")
+
+
+def arrow_schema(conn=None) -> "pa.Schema":
+    """Arrow schema for the samples table, from its declared column types."""
+    _require_pyarrow()
+    conn = conn or storage.get_connection()
+    type_map = {"INTEGER": pa.int64(), "REAL": pa.float64(), "TEXT": pa.string()}
+    arrow_fields = []
+    for _, name, decl_type, notnull, _, _ in conn.execute("PRAGMA table_info(samples)"):
+        arrow_type = type_map.get(decl_type.upper(), pa.string())
+        arrow_fields.append(pa.field(name, arrow_type, nullable=not notnull))
+    return pa.schema(arrow_fields)
+
+
+# ---------------------------------------------------------------------
+# Incremental state
+# ---------------------------------------------------------------------
+
+def _load_state() -> Dict[str, list]:
+    try:
+        return json.loads(STATE_PATH.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(state: Dict[str, list]) -> None:
+    atomic_write_text(STATE_PATH, json.dumps(state, indent=2, sort_keys=True))
+
+
+def _partition_path(day: str) -> Path:
+    return EXPORT_DIR / f"date={day}" / "part-0.parquet"
+
+
+def _exported_rows(day: str, state: Dict[str, list]) -> int:
+    """Rows in the day's existing partition (from state, else the file footer)."""
+    if day in state:
+        return state[day][0]
+    return pq.ParquetFile(_partition_path(day)).metadata.num_rows
+
+
+# ---------------------------------------------------------------------
+# Export
+# ---------------------------------------------------------------------
+
+def export_day(day: str, schema: "pa.Schema", conn) -> int:
+    """
+    Stream one UTC day of samples into its partition file. The file is
+    written to a temp name and renamed, so readers never see a partial
+    day. Returns the number of rows written.
+    """
+    next_day = (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+    path = _partition_path(day)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+
+    names = schema.names
+    cur = conn.execute(
+        f"SELECT {', '.join(names)} FROM samples "
+        f"WHERE timestamp_utc >= ? AND timestamp_utc < ? "
+        f"ORDER BY timestamp_utc, device_id",
+        (day, next_day),
+    )
+    rows_written = 0
+    try:
+        with pq.ParquetWriter(tmp_path, schema, compression=EXPORT_COMPRESSION) as writer:
+            while True:
+                rows = cur.fetchmany(EXPORT_CHUNK_ROWS)
+                if not rows:
+                    break
+                columns = [
+                    pa.array([row[i] for row in rows], type=field.type)
+                    for i, field in enumerate(schema)
+                ]
+                writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=schema))
+                rows_written += len(rows)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return rows_written
+
+
+def export(days: Optional[Iterable[str]] = None, full: bool = False, conn=None) -> Dict[str, int]:
+    """
+    Export changed days (or only `days`, or every day with full=True).
+    Returns {day: rows written} for the partitions that were rewritten.
+    """
+    _require_pyarrow()
+    conn = conn or storage.get_connection()
+    schema = arrow_schema(conn)
+    state = {} if full else _load_state()
+    wanted = set(days) if days is not None else None
+
+    # Days before this have been (or are being) pruned from samples
+    cutoff = None
+    if rollups.RAW_RETENTION_DAYS > 0:
+        cutoff = (datetime.utcnow() - timedelta(days=rollups.RAW_RETENTION_DAYS)).date().isoformat()
+
+    written = {}
+    for day, rows, min_rowid, max_rowid in conn.execute(_DAY_FINGERPRINT_SQL).fetchall():
+        if wanted is not None and day not in wanted:
+            continue
+        fingerprint = [rows, min_rowid, max_rowid]
+        path = _partition_path(day)
+        if state.get(day) == fingerprint and path.exists():
+            continue
+        # Never let retention shrink an export: the partition may be the
+        # only full copy of a day once raw samples are pruned
+        if path.exists():
+            if cutoff is not None and day <= cutoff:
+                continue
+            exported = _exported_rows(day, state)
+            if rows < exported:
+                logger.warning(
+                    "Keeping %s export (%d rows): samples now has only %d", day, exported, rows
+                )
+                continue
+        written[day] = export_day(day, schema, conn)
+        state[day] = fingerprint
+        # Save after each day so an interrupted export resumes cleanly
+        _save_state(state)
+        logger.info("Exported %d samples for %s", written[day], day)
+
+    return written
+
+
+# ---------------------------------------------------------------------
+# Loading
+# ---------------------------------------------------------------------
+
+def load_table(start: Optional[str] = None, end: Optional[str] = None, columns=None) -> "pa.Table":
+    """
+    Read exported days start..end (inclusive, YYYY-MM-DD) as one Arrow
+    table. Numeric columns without nulls convert to NumPy with
+    table.column(name).to_numpy() without copying; table.to_pandas()
+    gives a DataFrame.
+    """
+    _require_pyarrow()
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(EXPORT_DIR, format="parquet", partitioning="hive")
+    condition = None
+    if start is not None:
+        condition = ds.field("date") >= start
+    if end is not None:
+        upper = ds.field("date") <= end
+        condition = upper if condition is None else condition & upper
+    return dataset.to_table(columns=columns, filter=condition)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export samples to day-partitioned Parquet")
+    parser.add_argument("--full", action="store_true", help="rewrite every day, ignoring saved state")
+    parser.add_argument("--day", action="append", help="export only this UTC day (YYYY-MM-DD); repeatable")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+
+    try:
+        written = export(days=args.day, full=args.full)
+        print(f"Exported {sum(written.values())} rows in {len(written)} day(s) to {EXPORT_DIR}")
+    finally:
+        storage.close_connection()
+
+
+if __name__ == "__main__":
+    main()
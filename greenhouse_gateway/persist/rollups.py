@@ -0,0 +1,399 @@
+# greenhouse_gateway/persist/rollups.py
+
+"""
+Downsampled copies of `samples` and raw-row retention.
+
+samples_1m and samples_1h hold one row per (device_id, bucket_start)
+with running sum/count/min/max per metric and, for actuators, the
+number of samples with the output on (duty cycle = on / count). They
+are kept up to date by the storage writer thread: after each batch it
+folds every samples row past a rowid watermark into both tables, in
+the same transaction as the insert, so rollups never lag the raw data.
+
+Raw rows older than RAW_RETENTION_DAYS are pruned (optionally copied
+to db/greenhouse_archive.db first) in small chunks, each its own short
+transaction, so pruning never holds the write lock long enough to
+stall the writer. Only rows already folded into the rollups are
+pruned. start_retention() runs this every retention_interval_seconds
+on a background thread with its own connection, so a run never blocks
+the ingest loop.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+
+from .. import config
+from .. import fields
+
+logger = logging.getLogger("greenhouse_gateway.rollups")
+
+# ------------------------------------------------------------------
+# SETTINGS
+# ------------------------------------------------------------------
+
+RAW_RETENTION_DAYS = float(config.get("raw_retention_days", 90))  # 0 = keep forever
+RAW_ARCHIVE = bool(config.get("raw_archive", True))
+RETENTION_CHUNK_ROWS = max(1, int(config.get("retention_chunk_rows", 2000)))
+RETENTION_MAX_SECONDS = float(config.get("retention_max_seconds_per_run", 2.0))
+RETENTION_INTERVAL = float(config.get("retention_interval_seconds", 3600))
+
+ARCHIVE_PATH = config.PROJECT_ROOT / "db" / "greenhouse_archive.db"
+
+# Rows folded per transaction when catching up on an existing database
+CATCH_UP_CHUNK_ROWS = 50000
+
+# Averaged metrics: <name>_sum, _count, _min, _max
+METRIC_FIELDS = (
+    "inside_temp_f",
+    "inside_humidity_rh",
+    "inside_dew_point_f",
+    "inside_vpd_kpa",
+    "inside_brightness_lux",
+    "outside_temp_f",
+    "outside_humidity_rh",
+    "outside_brightness_raw",
+)
+
+# Actuators: the same four columns plus <name>_on (samples with PWM > 0)
+DUTY_FIELDS = (
+    "circulation_fan_pwm",
+    "exhaust_fan_pwm",
+    "grow_light_pwm",
+)
+
+_unknown = fields.unknown_fields(METRIC_FIELDS + DUTY_FIELDS)
+if _unknown:
+    raise ValueError(f"Rollup fields not in the field registry: {_unknown}")
+
+# Resolution in seconds -> table, finest first. bucket_start is the
+# timestamp_utc prefix (prefix_len chars) padded back to a full ISO time.
+RESOLUTIONS = (
+    (60, "samples_1m", 16, ":00"),
+    (3600, "samples_1h", 13, ":00:00"),
+)
+
+_WATERMARK = "samples"
+
+
+# ------------------------------------------------------------------
+# SQL GENERATION
+# ------------------------------------------------------------------
+
+def _columns(name: str, duty: bool) -> list:
+    cols = [f"{name}_sum", f"{name}_count", f"{name}_min", f"{name}_max"]
+    if duty:
+        cols.append(f"{name}_on")
+    return cols
+
+
+def _all_columns() -> list:
+    cols = []
+    for name in METRIC_FIELDS:
+        cols += _columns(name, False)
+    for name in DUTY_FIELDS:
+        cols += _columns(name, True)
+    return cols
+
+
+def _create_table_sql(table: str) -> str:
+    cols = []
+    for name in METRIC_FIELDS + DUTY_FIELDS:
+        cols += [f"{name}_sum REAL", f"{name}_count INTEGER", f"{name}_min REAL", f"{name}_max REAL"]
+        if name in DUTY_FIELDS:
+            cols.append(f"{name}_on INTEGER")
+    body = ",\n    ".join(cols)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {table} (\n"
+        f"    device_id TEXT NOT NULL,\n"
+        f"    bucket_start TEXT NOT NULL,\n"
+        f"    samples INTEGER NOT NULL,\n"
+        f"    {body},\n"
+        f"    PRIMARY KEY (device_id, bucket_start)\n"
+        f");\n"
+        f"CREATE INDEX IF NOT EXISTS idx_{table}_bucket ON {table}(bucket_start);\n"
+    )
+
+
+def _upsert_sql(table: str, bucket_expr: str) -> str:
+    select = []
+    for name in METRIC_FIELDS + DUTY_FIELDS:
+        select += [f"total({name})", f"count({name})", f"min({name})", f"max({name})"]
+        if name in DUTY_FIELDS:
+            select.append(f"total({name} > 0)")
+
+    updates = ["samples = samples + excluded.samples"]
+    for col in _all_columns():
+        if col.endswith("_min"):
+            # min()/max() with a NULL argument return NULL, so fall back
+            # to whichever side has a value
+            updates.append(f"{col} = min(coalesce({col}, excluded.{col}), coalesce(excluded.{col}, {col}))")
+        elif col.endswith("_max"):
+            updates.append(f"{col} = max(coalesce({col}, excluded.{col}), coalesce(excluded.{col}, {col}))")
+        else:
+            updates.append(f"{col} = {col} + excluded.{col}")
+
+    return (
+        f"INSERT INTO {table} (device_id, bucket_start, samples, {', '.join(_all_columns())})\n"
+        f"SELECT device_id, {bucket_expr}, count(*), {', '.join(select)}\n"
+        f"FROM samples WHERE rowid > ? AND rowid <= ?\n"
+        f"GROUP BY 1, 2\n"
+        f"ON CONFLICT(device_id, bucket_start) DO UPDATE SET\n    " + ",\n    ".join(updates)
+    )
+
+
+SCHEMA_SQL = (
+    "CREATE TABLE IF NOT EXISTS rollup_state (\n"
+    "    name TEXT PRIMARY KEY NOT NULL,\n"
+    "    last_rowid INTEGER NOT NULL\n"
+    ");\n"
+    + "".join(_create_table_sql(table) for _, table, _, _ in RESOLUTIONS)
+)
+
+_UPSERT_SQL = [
+    _upsert_sql(table, f"substr(timestamp_utc, 1, {prefix_len}) || '{pad}'")
+    for _, table, prefix_len, pad in RESOLUTIONS
+]
+
+
+# ------------------------------------------------------------------
+# INCREMENTAL MAINTENANCE (writer thread)
+# ------------------------------------------------------------------
+
+def init_schema(conn) -> None:
+    conn.executescript(SCHEMA_SQL)
+
+
+def _watermark(conn) -> int:
+    row = conn.execute("SELECT last_rowid FROM rollup_state WHERE name = ?", (_WATERMARK,)).fetchone()
+    return row[0] if row else 0
+
+
+def _fold(conn, lo: int, hi: int) -> None:
+    for sql in _UPSERT_SQL:
+        conn.execute(sql, (lo, hi))
+    conn.execute(
+        "INSERT INTO rollup_state (name, last_rowid) VALUES (?, ?) "
+        "ON CONFLICT(name) DO UPDATE SET last_rowid = excluded.last_rowid",
+        (_WATERMARK, hi),
+    )
+
+
+def update(conn) -> None:
+    """
+    Fold samples rows added since the last call into the rollup tables.
+    Must run inside the caller's transaction.
+    """
+    lo = _watermark(conn)
+    hi = conn.execute("SELECT max(rowid) FROM samples").fetchone()[0] or 0
+    if hi > lo:
+        _fold(conn, lo, hi)
+
+
+def catch_up(conn) -> int:
+    """
+    Fold rows written before rollups existed (or while the writer was
+    down) in bounded transactions. Returns the number of rowids covered.
+    """
+    start = lo = _watermark(conn)
+    hi = conn.execute("SELECT max(rowid) FROM samples").fetchone()[0] or 0
+    while lo < hi:
+        step = min(hi, lo + CATCH_UP_CHUNK_ROWS)
+        with conn:
+            _fold(conn, lo, step)
+        lo = step
+    if hi > start:
+        logger.info("Rolled up samples rowid %d..%d", start + 1, hi)
+    return hi - start
+
+
+# ------------------------------------------------------------------
+# RETENTION
+# ------------------------------------------------------------------
+
+def _default_conn():
+    from . import storage
+    return storage.get_connection()
+
+
+def _attach_archive(conn) -> None:
+    if any(row[1] == "archive" for row in conn.execute("PRAGMA database_list")):
+        return
+    conn.execute("ATTACH DATABASE ? AS archive", (str(ARCHIVE_PATH),))
+    conn.execute("CREATE TABLE IF NOT EXISTS archive.samples AS SELECT * FROM main.samples WHERE 0")
+    # Columns added to samples after the archive was created
+    archived = {row[1] for row in conn.execute("PRAGMA archive.table_info(samples)")}
+    for _, name, decl_type, _, _, _ in conn.execute("PRAGMA main.table_info(samples)"):
+        if name not in archived:
+            logger.info("Adding %s column to archive samples", name)
+            conn.execute(f"ALTER TABLE archive.samples ADD COLUMN {name} {decl_type}")
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS archive.idx_archive_samples_key "
+        "ON samples(device_id, timestamp_utc)"
+    )
+
+
+def prune_raw(conn=None, now: Optional[datetime] = None) -> int:
+    """
+    Delete (and archive, if enabled) raw samples older than
+    RAW_RETENTION_DAYS, one chunk per transaction, for at most
+    RETENTION_MAX_SECONDS. Returns the number of rows removed; the next
+    run continues where this one stopped.
+    """
+    if RAW_RETENTION_DAYS <= 0:
+        return 0
+    conn = conn or _default_conn()
+    cutoff = ((now or datetime.utcnow()) - timedelta(days=RAW_RETENTION_DAYS)).isoformat()
+
+    if RAW_ARCHIVE:
+        _attach_archive(conn)
+        columns = ", ".join(row[1] for row in conn.execute("PRAGMA main.table_info(samples)"))
+
+    # Only rows already in the rollups, and never the newest row: keeping
+    # max(rowid) stops SQLite from reusing rowids below the watermark
+    chunk_sql = """
+        SELECT rowid FROM samples
+        WHERE timestamp_utc < ?
+          AND rowid <= (SELECT last_rowid FROM rollup_state WHERE name = ?)
+          AND rowid < (SELECT max(rowid) FROM samples)
+        LIMIT ?
+    """
+    removed = 0
+    deadline = time.monotonic() + RETENTION_MAX_SECONDS
+    while time.monotonic() < deadline:
+        with conn:
+            rowids = [row[0] for row in conn.execute(chunk_sql, (cutoff, _WATERMARK, RETENTION_CHUNK_ROWS))]
+            if not rowids:
+                break
+            marks = ", ".join("?" * len(rowids))
+            if RAW_ARCHIVE:
+                conn.execute(
+                    f"INSERT OR IGNORE INTO archive.samples ({columns}) "
+                    f"SELECT {columns} FROM main.samples WHERE rowid IN ({marks})",
+                    rowids,
+                )
+            conn.execute(f"DELETE FROM main.samples WHERE rowid IN ({marks})", rowids)
+        removed += len(rowids)
+
+    if removed:
+        logger.info("Pruned %d raw samples older than %s", removed, cutoff)
+    return removed
+
+
+_retention_thread = None
+_retention_stop = threading.Event()
+
+
+def _retention_loop() -> None:
+    from . import storage
+    conn = storage.open_connection()
+    try:
+        # The first run waits a full interval, not the busy startup
+        while not _retention_stop.wait(RETENTION_INTERVAL):
+            try:
+                prune_raw(conn)
+            except Exception as e:
+                logger.exception("Error pruning raw samples: %s", e)
+    finally:
+        conn.close()
+
+
+def start_retention() -> bool:
+    """Start pruning raw samples every RETENTION_INTERVAL seconds."""
+    global _retention_thread
+    if RAW_RETENTION_DAYS <= 0:
+        return False
+    if _retention_thread is None:
+        _retention_stop.clear()
+        _retention_thread = threading.Thread(target=_retention_loop, name="raw-retention", daemon=True)
+        _retention_thread.start()
+    return True
+
+
+def stop_retention() -> None:
+    global _retention_thread
+    if _retention_thread is not None:
+        _retention_stop.set()
+        _retention_thread.join(timeout=RETENTION_MAX_SECONDS + 5)
+        _retention_thread = None
+
+
+# ------------------------------------------------------------------
+# QUERIES
+# ------------------------------------------------------------------
+
+def table_for_resolution(resolution_seconds: float) -> str:
+    """Coarsest table whose buckets are no wider than the resolution."""
+    table = "samples"
+    for seconds, name, _, _ in RESOLUTIONS:
+        if resolution_seconds >= seconds:
+            table = name
+    return table
+
+
+def _bucket_floor(table: str, timestamp: str) -> str:
+    """Start of the `table` bucket containing an ISO timestamp."""
+    for _, name, prefix_len, pad in RESOLUTIONS:
+        if name == table and len(timestamp) >= prefix_len:
+            return timestamp[:prefix_len] + pad
+    return timestamp
+
+
+def query_series(
+    device_id: str,
+    start: str,
+    end: str,
+    resolution_seconds: float,
+    names: Optional[Iterable[str]] = None,
+    conn=None,
+) -> List[dict]:
+    """
+    Time series for one device between two ISO UTC timestamps
+    [start, end), one row per `resolution_seconds` bucket.
+
+    Reads from the coarsest rollup that is at least as fine as the
+    requested resolution, re-bucketing it when the resolution is not
+    an exact table width. Each row has "time" (bucket start), "samples",
+    and per field the average plus <name>_min/<name>_max; actuators
+    also get <name>_duty (fraction of samples with the output on).
+    """
+    names = tuple(names) if names is not None else METRIC_FIELDS + DUTY_FIELDS
+    unknown = [n for n in names if n not in METRIC_FIELDS + DUTY_FIELDS]
+    if unknown:
+        raise ValueError(f"Fields not rolled up: {unknown}")
+
+    resolution = max(1, int(resolution_seconds))
+    table = table_for_resolution(resolution)
+    conn = conn or _default_conn()
+
+    if table == "samples":
+        time_col = "timestamp_utc"
+        select = ["count(*) AS samples"]
+        for n in names:
+            select += [f"avg({n}) AS {n}", f"min({n}) AS {n}_min", f"max({n}) AS {n}_max"]
+            if n in DUTY_FIELDS:
+                select.append(f"avg({n} > 0) AS {n}_duty")
+    else:
+        time_col = "bucket_start"
+        start = _bucket_floor(table, start)  # include the partial first bucket
+        select = ["sum(samples) AS samples"]
+        for n in names:
+            select += [
+                f"sum({n}_sum) / nullif(sum({n}_count), 0) AS {n}",
+                f"min({n}_min) AS {n}_min",
+                f"max({n}_max) AS {n}_max",
+            ]
+            if n in DUTY_FIELDS:
+                select.append(f"1.0 * sum({n}_on) / nullif(sum({n}_count), 0) AS {n}_duty")
+
+    sql = (
+        f"SELECT min({time_col}) AS time, {', '.join(select)} "
+        f"FROM {table} "
+        f"WHERE device_id = ? AND {time_col} >= ? AND {time_col} < ? "
+        f"GROUP BY CAST(strftime('%s', {time_col}) AS INTEGER) / ? "
+        f"ORDER BY time"
+    )
+    rows = conn.execute(sql, (device_id, start, end, resolution)).fetchall()
+    return [dict(row) for row in rows]
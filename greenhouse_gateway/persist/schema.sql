@@ -9,13 +9,14 @@
 -- ============================================================================
 -- TABLE: samples
 -- ============================================================================
--- Core time-series table: one row per sensor sample
--- All fields except timestamp_utc are nullable to handle sensor failures
--- gracefully without blocking data insertion
+-- Core time-series table: one row per sensor sample per device
+-- All fields except device_id and timestamp_utc are nullable to handle
+-- sensor failures gracefully without blocking data insertion
 
 CREATE TABLE IF NOT EXISTS samples (
-    -- Primary key: UTC timestamp
-    timestamp_utc TEXT PRIMARY KEY NOT NULL,
+    -- Primary key: (device_id, UTC timestamp)
+    device_id TEXT NOT NULL DEFAULT 'esp32',   -- ESP32 node / zone id from the MQTT topic
+    timestamp_utc TEXT NOT NULL,
 
     -- Time context
     local_time TEXT,
@@ -84,16 +85,40 @@ CREATE TABLE IF NOT EXISTS samples (
     -- CONTROL CONTEXT
     -- ========================================================================
     control_mode TEXT,
-    control_reason TEXT
+    control_reason TEXT,
+
+    -- ========================================================================
+    -- DEDUP
+    -- ========================================================================
+    packet_key TEXT,                    -- content hash of the raw packet
+
+    -- ========================================================================
+    -- WEATHER CONTEXT FRESHNESS
+    -- ========================================================================
+    weather_stale INTEGER,              -- 1 = forecast cache stale (weather NULL), NULL = no provider
+
+    PRIMARY KEY (device_id, timestamp_utc)
 );
 
--- Index for time-range queries
+-- Rejects replayed/redelivered packets (NULL keys never conflict)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_samples_packet_key ON samples(device_id, packet_key);
+
+-- Index for time-range queries across all devices
 CREATE INDEX IF NOT EXISTS idx_samples_timestamp ON samples(timestamp_utc);
 
 -- Index for day-of-year analysis
 CREATE INDEX IF NOT EXISTS idx_samples_day_of_year ON samples(day_of_year);
 
 
+-- ============================================================================
+-- TABLES: samples_1m, samples_1h, rollup_state
+-- ============================================================================
+-- 1-minute and 1-hour downsampled copies of samples (sum/count/min/max
+-- per metric, actuator on-counts for duty cycle). Their columns follow
+-- the metric list in persist/rollups.py, which creates them after this
+-- script runs and keeps them updated from the storage writer.
+
+
 -- ============================================================================
 -- TABLE: daily_summary
 -- ============================================================================
@@ -128,3 +153,71 @@ CREATE TABLE IF NOT EXISTS daily_summary (
 
 -- Index for season analysis
 CREATE INDEX IF NOT EXISTS idx_daily_summary_season ON daily_summary(season_state);
+
+
+-- ============================================================================
+-- TABLE: sheets_outbox
+-- ============================================================================
+-- Persistent queue of Google Sheets payloads waiting to be uploaded.
+-- Rows are deleted once the endpoint accepts them; failed uploads stay
+-- here and are retried with exponential backoff, so nothing is lost
+-- while the network or Apps Script endpoint is down.
+
+CREATE TABLE IF NOT EXISTS sheets_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,               -- epoch seconds when queued
+    payload TEXT NOT NULL,                  -- JSON body to POST
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,          -- epoch seconds
+    last_error TEXT
+);
+
+-- Index for picking the next due uploads
+CREATE INDEX IF NOT EXISTS idx_sheets_outbox_due ON sheets_outbox(next_attempt_at);
+
+-- Payloads the endpoint kept rejecting (sheets_max_attempts), moved out
+-- of the outbox so they no longer hold up newer rows. Kept for
+-- inspection; re-queue by copying them back into sheets_outbox.
+CREATE TABLE IF NOT EXISTS sheets_failed (
+    id INTEGER PRIMARY KEY,                 -- former sheets_outbox id
+    created_at REAL NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    failed_at REAL NOT NULL,                -- epoch seconds
+    last_error TEXT
+);
+
+
+-- ============================================================================
+-- TABLE: quarantined_packets
+-- ============================================================================
+-- Raw packets that failed validation (wrong types, NaN, out of physical
+-- range). Kept for debugging sensors and firmware; not used for ML.
+
+CREATE TABLE IF NOT EXISTS quarantined_packets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    received_at REAL NOT NULL,              -- epoch seconds
+    action TEXT NOT NULL,                   -- "rejected" or "nullified"
+    errors TEXT NOT NULL,                   -- JSON {field: reason}
+    payload TEXT NOT NULL                   -- raw packet JSON
+);
+
+CREATE INDEX IF NOT EXISTS idx_quarantined_packets_received ON quarantined_packets(received_at);
+
+
+-- ============================================================================
+-- TABLE: sensor_events
+-- ============================================================================
+-- Connectivity watchdog transitions: a node going silent or coming back,
+-- a sensor field stuck on one value (or missing) and recovering.
+
+CREATE TABLE IF NOT EXISTS sensor_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    occurred_at REAL NOT NULL,              -- epoch seconds
+    device_id TEXT NOT NULL,
+    sensor TEXT,                            -- samples column; NULL = whole device
+    event TEXT NOT NULL,                    -- "offline", "online", "stuck", "recovered"
+    detail TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_sensor_events_occurred ON sensor_events(occurred_at);
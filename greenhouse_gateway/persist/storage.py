@@ -1,9 +1,17 @@
 # greenhouse_gateway/persist/storage.py
 
 import logging
+import queue
 import sqlite3
+import threading
+import time
+from collections import defaultdict
 from pathlib import Path
 
+from .. import config
+from .. import fields
+from . import rollups
+
 logger = logging.getLogger("greenhouse_gateway.storage")
 
 # ------------------------------------------------------------------
@@ -17,133 +25,409 @@ SCHEMA_PATH = PROJECT_ROOT / "greenhouse_gateway" / "persist" / "schema.sql"
 
 DB_DIR.mkdir(parents=True, exist_ok=True)
 
+# ------------------------------------------------------------------
+# WRITER TUNING
+# ------------------------------------------------------------------
+# Rows are group-committed: a batch is flushed when it reaches
+# BATCH_MAX_ROWS or when its oldest row is BATCH_MAX_DELAY_MS old.
+
+BATCH_MAX_ROWS = max(1, int(config.get("db_batch_max_rows", 100)))
+BATCH_MAX_DELAY_MS = float(config.get("db_batch_max_delay_ms", 500))
+WRITER_QUEUE_SIZE = int(config.get("db_writer_queue_size", 10000))
+SYNCHRONOUS = config.get("db_synchronous", "NORMAL")
+# Longest a producer waits for room in a full writer queue before the
+# rows are dropped with an error (the writer is alive but stalled)
+ENQUEUE_TIMEOUT = float(config.get("db_enqueue_timeout_seconds", 30))
+# How often blocked producers/flushes check that the writer is still alive
+_LIVENESS_CHECK_SECONDS = 1.0
+
 _conn = None
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+# Writer thread state
+_write_queue: "queue.Queue" = queue.Queue(maxsize=WRITER_QUEUE_SIZE)
+_writer_thread = None
+_writer_lock = threading.Lock()
+_STOP = object()
+
+# Writer counters (updated on the writer thread only)
+_write_stats = {
+    "rows_written": 0,
+    "conflicts": 0,  # rows skipped by ON CONFLICT DO NOTHING
+    "batches": 0,
+    "restarts": 0,
+}
+
+
+def _open_connection(check_same_thread: bool = True):
+    conn = sqlite3.connect(DB_PATH, timeout=30, check_same_thread=check_same_thread)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={SYNCHRONOUS}")
+    return conn
+
+
+def open_connection(check_same_thread: bool = True):
+    """
+    Open a new connection to the gateway database for use by another
+    thread (SQLite connections must not be shared across threads
+    unless the caller serializes access itself).
+    """
+    conn = _open_connection(check_same_thread)
+    with _schema_lock:
+        if not _schema_ready:
+            _init_db(conn)
+    return conn
+
+
+def get_connection():
+    """Shared connection for reads and occasional writes on the main thread."""
+    return _get_connection()
 
 
 def _get_connection():
     global _conn
     if _conn is None:
         logger.info("Opening SQLite database at %s", DB_PATH)
-        _conn = sqlite3.connect(DB_PATH)
-        _conn.row_factory = sqlite3.Row
-        _init_db()
+        _conn = _open_connection()
+        with _schema_lock:
+            if not _schema_ready:
+                _init_db(_conn)
     return _conn
 
 
-def _init_db():
+def _init_db(conn):
+    global _schema_ready
     logger.info("Initializing database schema")
     with SCHEMA_PATH.open("r") as f:
         schema_sql = f.read()
-    conn = _conn
+    _migrate_before_schema(conn)
     conn.executescript(schema_sql)
+    rollups.init_schema(conn)
+    _migrate_after_schema(conn)
     conn.commit()
+    _schema_ready = True
+
+
+# ------------------------------------------------------------------
+# MIGRATIONS
+# ------------------------------------------------------------------
+# samples used to be keyed by timestamp_utc alone. Databases from before
+# multi-device support are rebuilt with device_id in the primary key:
+# the old table is renamed aside, schema.sql creates the new one, and the
+# rows are copied over with the default device id. The copy is safe to
+# re-run if the gateway stops halfway.
+
+_LEGACY_SAMPLES = "samples_legacy"
+
+
+def _table_columns(conn, table: str) -> list:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _migrate_before_schema(conn) -> None:
+    columns = _table_columns(conn, "samples")
+    if columns and "device_id" not in columns:
+        logger.info("Migrating samples table to (device_id, timestamp_utc) primary key")
+        conn.executescript(f"""
+            DROP INDEX IF EXISTS idx_samples_timestamp;
+            DROP INDEX IF EXISTS idx_samples_day_of_year;
+            ALTER TABLE samples RENAME TO {_LEGACY_SAMPLES};
+        """)
+    elif columns:
+        for column, decl in (("packet_key", "TEXT"), ("weather_stale", "INTEGER")):
+            if column not in columns:
+                logger.info("Adding %s column to samples", column)
+                conn.execute(f"ALTER TABLE samples ADD COLUMN {column} {decl}")
+
+
+def _migrate_after_schema(conn) -> None:
+    legacy_columns = _table_columns(conn, _LEGACY_SAMPLES)
+    if not legacy_columns:
+        return
+    column_list = ", ".join(legacy_columns)
+    with conn:
+        cur = conn.execute(
+            f"INSERT OR IGNORE INTO samples (device_id, {column_list}) "
+            f"SELECT ?, {column_list} FROM {_LEGACY_SAMPLES}",
+            (fields.DEFAULT_DEVICE_ID,),
+        )
+        conn.execute(f"DROP TABLE {_LEGACY_SAMPLES}")
+    logger.info("Migrated %d samples to device %s", cur.rowcount, fields.DEFAULT_DEVICE_ID)
+
+
+# ------------------------------------------------------------------
+# STATEMENTS
+# ------------------------------------------------------------------
+
+# Generated from the field registry (greenhouse_gateway/fields.py)
+INSERT_SAMPLE_SQL = fields.INSERT_SAMPLE_SQL
+
+INSERT_QUARANTINE_SQL = """
+    INSERT INTO quarantined_packets (received_at, action, errors, payload)
+    VALUES (?, ?, ?, ?)
+"""
+
+INSERT_SENSOR_EVENT_SQL = """
+    INSERT INTO sensor_events (occurred_at, device_id, sensor, event, detail)
+    VALUES (?, ?, ?, ?, ?)
+"""
 
+# Table key -> INSERT statement used by the writer thread
+_INSERT_SQL = {
+    "samples": INSERT_SAMPLE_SQL,
+    "quarantined_packets": INSERT_QUARANTINE_SQL,
+    "sensor_events": INSERT_SENSOR_EVENT_SQL,
+}
+
+
+_sample_row = fields.sample_row
+
+
+# ------------------------------------------------------------------
+# PUBLIC WRITE API
+# ------------------------------------------------------------------
 
 def insert_sensor_reading(packet: dict):
+    """Queue one enriched packet for the batched writer."""
+    _enqueue("samples", [_sample_row(packet)])
+
+
+def insert_sensor_readings(batch) -> int:
+    """
+    Queue many enriched packets at once (backfills, replays).
+    Returns the number of rows queued.
+    """
+    rows = [_sample_row(packet) for packet in batch]
+    if rows:
+        _enqueue("samples", rows)
+    return len(rows)
+
+
+def insert_quarantined_packet(received_at: float, action: str, errors: str, payload: str):
+    """Queue a packet that failed validation for the quarantine table."""
+    _enqueue("quarantined_packets", [(received_at, action, errors, payload)])
+
+
+def insert_sensor_event(occurred_at: float, device_id: str, sensor, event: str, detail: str):
+    """Queue a connectivity watchdog event for the sensor_events table."""
+    _enqueue("sensor_events", [(occurred_at, device_id, sensor, event, detail)])
+
+
+def get_write_stats() -> dict:
+    stats = dict(_write_stats)
+    stats["queue_depth"] = _write_queue.qsize()
+    return stats
+
+
+def flush(timeout: float = None) -> bool:
+    """
+    Block until every row queued before this call is committed.
+    Returns False if the writer did not finish within `timeout`.
+    """
+    if _writer_thread is None:
+        return True
+    done = threading.Event()
+    if not _put(done, timeout):
+        return False
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while not done.wait(_LIVENESS_CHECK_SECONDS):
+        _ensure_writer()  # a dead writer is restarted and picks up the marker
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+    return True
+
+
+def _put(item, timeout: float = None) -> bool:
+    """
+    Queue an item for the writer, waiting while the queue is full but
+    restarting the writer if it died meanwhile. False after `timeout`.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        _ensure_writer()
+        try:
+            _write_queue.put(item, timeout=_LIVENESS_CHECK_SECONDS)
+            return True
+        except queue.Full:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+
+def _enqueue(table: str, rows: list) -> None:
+    # Blocks when the queue is full so a stalled disk slows ingest
+    # down instead of silently losing rows, up to ENQUEUE_TIMEOUT.
+    if not _put((table, rows), ENQUEUE_TIMEOUT):
+        raise RuntimeError(
+            f"SQLite writer queue full for {ENQUEUE_TIMEOUT:.0f}s, dropped {len(rows)} {table} row(s)"
+        )
+
+
+def upsert_daily_summary(summary: dict) -> None:
+    """Insert or replace one daily_summary row, keeping any human notes."""
     conn = _get_connection()
-    cur = conn.cursor()
-
-    cur.execute(
-        """
-        INSERT INTO samples (
-            timestamp_utc,
-            local_time,
-            day_of_year,
-            season_state,
-            intent_window,
-
-            inside_temp_f,
-            inside_humidity_rh,
-            inside_dew_point_f,
-            inside_vpd_kpa,
-            inside_brightness_lux,
-
-            tsl_full_spectrum,
-            tsl_infrared,
-
-            outside_temp_f,
-            outside_humidity_rh,
-            outside_brightness_raw,
-            outside_color_r,
-            outside_color_g,
-            outside_color_b,
-
-            cloud_coverage_pct,
-            precip_probability_pct,
-            weather_code,
-
-            expected_light_trajectory,
-            expected_humidity_decay,
-            forecast_confidence,
-
-            circulation_fan_pwm,
-            exhaust_fan_pwm,
-            grow_light_pwm,
-
-            disconnected_sensors,
-
-            esp32_runtime_ms,
-            firmware_version,
-            wifi_rssi,
-            mqtt_reconnects,
-
-            control_mode,
-            control_reason
+    with conn:
+        conn.execute(
+            """
+            INSERT INTO daily_summary (
+                date, season_state,
+                avg_temp_f, min_temp_f, max_temp_f,
+                avg_humidity_rh, min_humidity_rh, max_humidity_rh,
+                total_light_minutes, total_exhaust_minutes, total_circulation_minutes
+            )
+            VALUES (
+                :date, :season_state,
+                :avg_temp_f, :min_temp_f, :max_temp_f,
+                :avg_humidity_rh, :min_humidity_rh, :max_humidity_rh,
+                :total_light_minutes, :total_exhaust_minutes, :total_circulation_minutes
+            )
+            ON CONFLICT(date) DO UPDATE SET
+                season_state = excluded.season_state,
+                avg_temp_f = excluded.avg_temp_f,
+                min_temp_f = excluded.min_temp_f,
+                max_temp_f = excluded.max_temp_f,
+                avg_humidity_rh = excluded.avg_humidity_rh,
+                min_humidity_rh = excluded.min_humidity_rh,
+                max_humidity_rh = excluded.max_humidity_rh,
+                total_light_minutes = excluded.total_light_minutes,
+                total_exhaust_minutes = excluded.total_exhaust_minutes,
+                total_circulation_minutes = excluded.total_circulation_minutes
+            """,
+            summary,
         )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            packet.get("jetson_timestamp"),
-            packet.get("local_time"),
-            packet.get("day_of_year"),
-            packet.get("season_state"),
-            packet.get("intent_window"),
-
-            packet.get("inside_temp_f"),
-            packet.get("inside_humidity_rh"),
-            packet.get("inside_dew_point_f"),
-            packet.get("inside_vpd_kpa"),
-            packet.get("inside_brightness_lux"),
-
-            packet.get("tsl_full_spectrum"),
-            packet.get("tsl_infrared"),
-
-            packet.get("outside_temp_f"),
-            packet.get("outside_humidity_rh"),
-            packet.get("outside_brightness_raw"),
-            packet.get("outside_color_r"),
-            packet.get("outside_color_g"),
-            packet.get("outside_color_b"),
-
-            packet.get("cloud_coverage_pct"),
-            packet.get("precip_probability_pct"),
-            packet.get("weather_code"),
-
-            packet.get("expected_light_trajectory"),
-            packet.get("expected_humidity_decay"),
-            packet.get("forecast_confidence"),
-
-            packet.get("circulation_fan_pwm"),
-            packet.get("exhaust_fan_pwm"),
-            packet.get("grow_light_pwm"),
-
-            packet.get("disconnected_sensors"),
-
-            packet.get("esp32_runtime_ms"),
-            packet.get("firmware_version"),
-            packet.get("wifi_rssi"),
-            packet.get("mqtt_reconnects"),
-
-            packet.get("control_mode"),
-            packet.get("control_reason"),
-        ),
-    )
 
-    conn.commit()
+
+# ------------------------------------------------------------------
+# WRITER THREAD
+# ------------------------------------------------------------------
+
+def _ensure_writer():
+    global _writer_thread
+    if _writer_thread is not None and _writer_thread.is_alive():
+        return
+    with _writer_lock:
+        if _writer_thread is not None and not _writer_thread.is_alive():
+            logger.error("SQLite writer thread is not running, restarting it")
+            _write_stats["restarts"] += 1
+            _writer_thread = None
+        if _writer_thread is None:
+            _get_connection()  # make sure the schema exists first
+            _writer_thread = threading.Thread(
+                target=_writer_loop, name="sqlite-writer", daemon=True
+            )
+            _writer_thread.start()
+
+
+def _writer_loop():
+    conn = open_connection()
+    pending = defaultdict(list)
+    pending_rows = 0
+    deadline = 0.0
+
+    try:
+        rollups.catch_up(conn)
+        while True:
+            if pending_rows:
+                timeout = max(0.0, deadline - time.monotonic())
+            else:
+                timeout = None
+
+            try:
+                item = _write_queue.get(timeout=timeout)
+            except queue.Empty:
+                _flush_pending(conn, pending)
+                pending_rows = 0
+                continue
+
+            if item is _STOP:
+                _durable_flush(conn, pending)
+                return
+
+            if isinstance(item, threading.Event):
+                _flush_pending(conn, pending)
+                pending_rows = 0
+                item.set()
+                continue
+
+            table, rows = item
+            if not pending_rows:
+                deadline = time.monotonic() + BATCH_MAX_DELAY_MS / 1000.0
+            pending[table].extend(rows)
+            pending_rows += len(rows)
+
+            if pending_rows >= BATCH_MAX_ROWS:
+                _flush_pending(conn, pending)
+                pending_rows = 0
+    except Exception as e:
+        logger.exception("SQLite writer thread crashed: %s", e)
+    finally:
+        conn.close()
+
+
+def _flush_pending(conn, pending) -> None:
+    """Write every pending row in one transaction, then clear `pending`."""
+    if not pending:
+        return
+    try:
+        written = 0
+        attempted = 0
+        with conn:
+            for table, rows in pending.items():
+                written += conn.executemany(_INSERT_SQL[table], rows).rowcount
+                attempted += len(rows)
+            if "samples" in pending:
+                rollups.update(conn)
+        _write_stats["rows_written"] += written
+        _write_stats["conflicts"] += attempted - written
+        _write_stats["batches"] += 1
+    except sqlite3.IntegrityError:
+        # One bad row rolls back the whole batch; salvage the rest
+        _insert_rows_individually(conn, pending)
+    except Exception as e:
+        count = sum(len(rows) for rows in pending.values())
+        logger.exception("Error writing batch of %d rows: %s", count, e)
+    pending.clear()
+
+
+def _insert_rows_individually(conn, pending) -> None:
+    for table, rows in pending.items():
+        for row in rows:
+            try:
+                with conn:
+                    conn.execute(_INSERT_SQL[table], row)
+            except Exception as e:
+                logger.error("Error inserting row into %s: %s", table, e)
+    if "samples" in pending:
+        try:
+            with conn:
+                rollups.update(conn)
+        except Exception as e:
+            logger.error("Error updating rollups: %s", e)
+
+
+def _durable_flush(conn, pending) -> None:
+    """
+    Shutdown flush: commit the last batch with full fsync, then fold
+    the WAL back into the main database file.
+    """
+    try:
+        conn.execute("PRAGMA synchronous=FULL")
+        _flush_pending(conn, pending)
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    except Exception as e:
+        logger.exception("Error flushing database on shutdown: %s", e)
 
 
 def close_connection():
-    global _conn
+    global _conn, _writer_thread
+    if _writer_thread is not None:
+        logger.info("Flushing pending SQLite writes")
+        if _put(_STOP, ENQUEUE_TIMEOUT):
+            _writer_thread.join()
+        else:
+            logger.error("SQLite writer did not accept the stop request, unwritten rows are lost")
+        _writer_thread = None
     if _conn is not None:
         logger.info("Closing SQLite database connection")
         _conn.close()
@@ -2,21 +2,26 @@
 
 import json
 import logging
+import threading
 import time
 from datetime import datetime, date
 from pathlib import Path
-from statistics import mode, StatisticsError
 from typing import Optional
 
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 import os
 
+from .. import config
+from .. import fields
+from ..persist import storage
+from .window_aggregator import WindowAggregator, WindowSet
+
 logger = logging.getLogger("greenhouse_gateway.google_sheets")
 
 BASE_DIR = Path(__file__).resolve().parents[1]
 ENV_PATH = BASE_DIR / "config" / ".env"
-CONFIG_PATH = BASE_DIR / "config" / "config.json"
 
 if ENV_PATH.exists():
     load_dotenv(ENV_PATH)
@@ -24,26 +29,69 @@ if ENV_PATH.exists():
 GOOGLE_SHEETS_ENDPOINT = os.getenv("GOOGLE_SHEETS_ENDPOINT", "")
 
 # Load config
-_config = {}
-if CONFIG_PATH.exists():
-    try:
-        _config = json.loads(CONFIG_PATH.read_text())
-    except Exception as e:
-        logger.exception("Error loading config.json: %s", e)
+_config = config.get_config()
 
 UPLOAD_INTERVAL = _config.get("sheets_upload_interval_seconds", 300)
 AVERAGING_FIELDS = _config.get("averaging_fields", [])
 
 MODE_FIELDS = _config.get("mode_fields", [])
 
-# Buffer state
-_buffer = []
+for _name in fields.unknown_fields(AVERAGING_FIELDS + MODE_FIELDS):
+    logger.warning("Config field %r is not a known sample field", _name)
+
+# Pass-through fields (latest value) - for Google Sheets
+PASSTHROUGH_FIELDS = [
+    "local_time",              # Timestamp for sheets
+    "outside_brightness_raw",  # Weather data
+    "cloud_coverage_pct",
+    "intent_window",           # Time context
+    "control_mode",            # Control context
+    "control_reason"
+]
+
+REQUEST_TIMEOUT = float(_config.get("sheets_request_timeout_seconds", 30))
+RETRY_BASE_SECONDS = float(_config.get("sheets_retry_base_seconds", 5))
+RETRY_MAX_SECONDS = float(_config.get("sheets_retry_max_seconds", 600))
+OUTBOX_BATCH_SIZE = int(_config.get("sheets_outbox_batch_size", 50))
+# Rejections (not outages) before a payload moves to sheets_failed
+MAX_ATTEMPTS = max(1, int(_config.get("sheets_max_attempts", 8)))
+
+# Send outbox rows as one "batch" request (requires the matching
+# google_sheets_app.js deployment); false falls back to one POST per row.
+BATCH_UPLOAD = bool(_config.get("sheets_batch_upload", True))
+BATCH_PROTOCOL_VERSION = 1
+
+# Window state: the Sheets upload window plus any registered extra windows
+_sheets_window = WindowAggregator(
+    UPLOAD_INTERVAL, AVERAGING_FIELDS, MODE_FIELDS, PASSTHROUGH_FIELDS
+)
+_windows = WindowSet()
 _last_upload = 0.0
 _first_packet_sent = False
 
 # Summary state
 _last_summary_date: Optional[str] = None
 
+# Outbox / upload worker state
+_outbox_conn = None
+_outbox_lock = threading.Lock()
+_worker_thread = None
+_wake = threading.Event()
+_stop = threading.Event()
+_session = None
+_outage_until = 0.0  # epoch seconds; enqueues do not wake the worker before this
+
+_stats = {
+    "depth": 0,
+    "uploaded": 0,
+    "failed": 0,
+    "dead_lettered": 0,
+    "last_latency_ms": None,
+    "avg_latency_ms": None,
+    "last_success_at": None,
+    "last_error": None,
+}
+
 
 # ============================================================
 # RAW SAMPLE HANDLING
@@ -51,10 +99,10 @@ _last_summary_date: Optional[str] = None
 
 def add_packet(packet: dict) -> None:
     """
-    Buffer incoming sample packets and upload averaged data
-    to Google Sheets at a fixed interval.
+    Feed incoming sample packets into the streaming window aggregators
+    and upload averaged data to Google Sheets at a fixed interval.
     """
-    global _last_upload, _buffer, _first_packet_sent
+    global _last_upload, _first_packet_sent
 
     now = time.time()
 
@@ -68,63 +116,43 @@ def add_packet(packet: dict) -> None:
         _send_to_sheets(result)
         _first_packet_sent = True
         _last_upload = now
+        _sheets_window.started_at = now
         return
 
-    _buffer.append(packet)
+    _windows.add(packet, now)
 
-    if now - _last_upload < UPLOAD_INTERVAL:
-        return
 
-    averaged = _compute_average(_buffer)
-    _buffer = []
-    _last_upload = now
+def register_window(name: str, window_seconds: float, on_flush) -> None:
+    """
+    Subscribe to an extra aggregation window (e.g. 60 or 3600 seconds)
+    over the same packet stream. on_flush(name, stats) is called with
+    the window's statistics each time it closes.
+    """
+    _windows.add_window(
+        name,
+        WindowAggregator(window_seconds, AVERAGING_FIELDS, MODE_FIELDS, PASSTHROUGH_FIELDS),
+        on_flush,
+    )
 
-    if averaged:
-        averaged["type"] = "sample"
-        _send_to_sheets(averaged)
+
+def _upload_average(name: str, averaged: dict) -> None:
+    global _last_upload
+    _last_upload = time.time()
+    averaged["type"] = "sample"
+    _send_to_sheets(averaged)
+
+
+_windows.add_window("sheets", _sheets_window, _upload_average)
 
 
 def _compute_average(packets: list[dict]) -> dict:
-    if not packets:
-        return {}
-
-    result: dict = {}
-
-    # Average numeric fields
-    for field in AVERAGING_FIELDS:
-        values = [
-            p.get(field) for p in packets
-            if isinstance(p.get(field), (int, float))
-        ]
-        if values:
-            result[field] = sum(values) / len(values)
-
-    # Mode fields (PWM, intent, etc)
-    for field in MODE_FIELDS:
-        values = [p.get(field) for p in packets if field in p]
-        if values:
-            try:
-                result[field] = mode(values)
-            except StatisticsError:
-                result[field] = values[-1]
-
-    # Pass-through fields (latest value) - for Google Sheets
-    passthrough_fields = [
-        "local_time",              # Timestamp for sheets
-        "outside_brightness_raw",  # Weather data
-        "cloud_coverage_pct",
-        "intent_window",           # Time context
-        "control_mode",            # Control context
-        "control_reason"
-    ]
-    for field in passthrough_fields:
-        values = [p.get(field) for p in packets if field in p]
-        if values:
-            result[field] = values[-1]  # Latest value
-
-    result["timestamp"] = datetime.utcnow().isoformat()
-    result["sample_count"] = len(packets)
-    return result
+    """Aggregate a list of packets in one pass (same output as a window flush)."""
+    aggregator = WindowAggregator(
+        UPLOAD_INTERVAL, AVERAGING_FIELDS, MODE_FIELDS, PASSTHROUGH_FIELDS
+    )
+    for packet in packets:
+        aggregator.add(packet)
+    return aggregator.result()
 
 
 # ============================================================
@@ -162,51 +190,293 @@ def upload_daily_summary(summary_payload: dict) -> None:
 
 def _send_to_sheets(packet: dict) -> None:
     """
-    POST a packet (sample or summary) to the Google Sheets endpoint.
-    Renames fields for sample packets to match Google Sheets script expectations.
+    Queue a packet (sample or summary) for upload to Google Sheets.
+    Sample packets are mapped to the Sheets columns from the field registry.
+    The POST itself happens on the background upload worker.
     """
     if not GOOGLE_SHEETS_ENDPOINT:
         logger.warning("GOOGLE_SHEETS_ENDPOINT not set, skipping upload")
         return
 
-    # Rename fields for sample packets to match Google Sheets script
+    # Sample packets carry only the fields the Google Sheets script expects
     payload = dict(packet)
     if packet.get("type") == "sample":
-        # Create renamed payload with only the fields Google Sheets expects
-        payload = {
-            "type": "sample",
-            "local_time": packet.get("local_time"),
-            "inside_temp_f": packet.get("temperature_f"),
-            "inside_humidity_rh": packet.get("humidity_rh"),
-            "inside_brightness_lux": packet.get("lux"),
-            "outside_brightness_raw": packet.get("outside_brightness_raw"),
-            "cloud_coverage_pct": packet.get("cloud_coverage_pct"),
-            "circulation_fan_pwm": packet.get("circulator_fan_pwm"),
-            "exhaust_fan_pwm": packet.get("exhaust_fan_pwm"),
-            "grow_light_pwm": packet.get("light_pwm"),
-            "intent_window": packet.get("intent_window"),
-            "control_mode": packet.get("control_mode"),
-            "control_reason": packet.get("control_reason"),
-        }
+        payload = fields.sheets_sample(packet)
 
     try:
-        resp = requests.post(
-            GOOGLE_SHEETS_ENDPOINT,
-            json=payload,
-            timeout=30,
-        )
+        _enqueue_upload(payload)
+    except Exception as e:
+        logger.exception("Error queueing Google Sheets upload: %s", e)
+
 
-        if resp.status_code != 200:
-            logger.warning(
-                "Sheets upload returned %s: %s",
-                resp.status_code,
-                resp.text[:200],
+def _enqueue_upload(payload: dict) -> None:
+    """Persist a payload to the outbox and wake the upload worker."""
+    _ensure_worker()
+    now = time.time()
+    with _outbox_lock:
+        with _outbox_conn:
+            _outbox_conn.execute(
+                "INSERT INTO sheets_outbox (created_at, payload, next_attempt_at) "
+                "VALUES (?, ?, ?)",
+                (now, json.dumps(payload, default=str), now),
             )
+        _stats["depth"] += 1
+    _wake.set()
+
+
+def get_outbox_stats() -> dict:
+    """
+    Upload health for the heartbeat: outbox depth, age of the oldest
+    pending payload, and recent upload latency.
+    """
+    with _outbox_lock:
+        stats = dict(_stats)
+        oldest = None
+        if _outbox_conn is not None:
+            oldest = _outbox_conn.execute(
+                "SELECT MIN(created_at) FROM sheets_outbox"
+            ).fetchone()[0]
+    stats["oldest_age_s"] = round(time.time() - oldest, 1) if oldest else None
+    return stats
+
+
+def _ensure_worker() -> None:
+    global _outbox_conn, _worker_thread, _session
+    if _worker_thread is not None:
+        return
+    with _outbox_lock:
+        if _worker_thread is not None:
+            return
+        # Shared between the caller and the worker, serialized by _outbox_lock
+        _outbox_conn = storage.open_connection(check_same_thread=False)
+        _stats["depth"] = _outbox_conn.execute(
+            "SELECT COUNT(*) FROM sheets_outbox"
+        ).fetchone()[0]
+        if _stats["depth"]:
+            logger.info("Resuming %d pending Google Sheets uploads", _stats["depth"])
+
+        _session = requests.Session()
+        _session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+
+        _stop.clear()
+        _worker_thread = threading.Thread(
+            target=_upload_loop, name="sheets-uploader", daemon=True
+        )
+        _worker_thread.start()
+
+
+def _upload_loop() -> None:
+    while not _stop.is_set():
+        try:
+            delay = _drain_outbox()
+        except Exception as e:
+            logger.exception("Google Sheets upload worker error: %s", e)
+            delay = RETRY_BASE_SECONDS
+        _wake.wait(delay)
+        _wake.clear()
+        # Payloads queued during an outage wait out its backoff too
+        while not _stop.is_set() and time.time() < _outage_until:
+            _wake.wait(_outage_until - time.time())
+            _wake.clear()
+
+
+def _drain_outbox() -> float:
+    """
+    Upload due payloads oldest-first until the outbox is empty or the
+    endpoint is unreachable. Returns how long to sleep before the next
+    attempt.
+    """
+    global _outage_until
+    while not _stop.is_set():
+        now = time.time()
+        with _outbox_lock:
+            rows = _outbox_conn.execute(
+                "SELECT id, payload, attempts FROM sheets_outbox "
+                "WHERE next_attempt_at <= ? ORDER BY id LIMIT ?",
+                (now, OUTBOX_BATCH_SIZE if BATCH_UPLOAD else 1),
+            ).fetchall()
+
+        if not rows:
+            break
+
+        failure = _upload_rows(rows)
+        if failure is not None:
+            # Endpoint or network is down: back off and keep order
+            unsent, error = failure
+            backoff = _mark_failed(unsent, error)
+            _outage_until = time.time() + backoff
+            return backoff
+
+    with _outbox_lock:
+        next_due = _outbox_conn.execute(
+            "SELECT MIN(next_attempt_at) FROM sheets_outbox"
+        ).fetchone()[0]
+    if next_due is None:
+        return RETRY_MAX_SECONDS
+    return max(0.0, next_due - time.time())
+
+
+def _upload_rows(rows) -> Optional[tuple]:
+    """
+    Upload outbox rows. A batch the endpoint rejects is split in half
+    until the bad payloads are isolated, so one of them cannot hold
+    back the rest. Returns (unsent rows, error) if the endpoint is
+    unreachable, else None.
+    """
+    payloads = [json.loads(row["payload"]) for row in rows]
+    error, rejected = _post(_build_batch(payloads) if BATCH_UPLOAD else payloads[0])
+    if error is None:
+        _mark_sent(rows)
+        logger.info("Uploaded %d row(s) to Google Sheets", len(rows))
+        return None
+    if not rejected:
+        return rows, error
+    if len(rows) > 1:
+        mid = len(rows) // 2
+        failure = _upload_rows(rows[:mid])
+        if failure is not None:
+            return failure[0] + rows[mid:], failure[1]
+        return _upload_rows(rows[mid:])
+    _mark_rejected(rows[0], error)
+    return None
+
+
+def _build_batch(payloads: list[dict]) -> dict:
+    """
+    Wrap outbox payloads in a versioned batch request, grouped by day so
+    the Apps Script sets up each day's sheets once per request.
+    """
+    days: dict = {}
+    for payload in payloads:
+        if payload.get("type") == "summary":
+            day = payload.get("date")
+            kind = "summaries"
         else:
-            logger.info(
-                "Successfully uploaded %s packet to Google Sheets",
-                packet.get("type", "unknown"),
+            day = (payload.get("local_time") or "")[:10] or date.today().isoformat()
+            kind = "samples"
+        group = days.get(day)
+        if group is None:
+            group = days[day] = {"date": day, "samples": [], "summaries": []}
+        group[kind].append(payload)
+
+    return {
+        "type": "batch",
+        "version": BATCH_PROTOCOL_VERSION,
+        "days": list(days.values()),
+    }
+
+
+def _mark_sent(rows) -> None:
+    with _outbox_lock:
+        with _outbox_conn:
+            _outbox_conn.executemany(
+                "DELETE FROM sheets_outbox WHERE id = ?",
+                [(row["id"],) for row in rows],
             )
+        _stats["depth"] -= len(rows)
+        _stats["uploaded"] += len(rows)
+
+
+def _mark_failed(rows, error: str) -> float:
+    """Schedule a retry for `rows` and return the backoff in seconds."""
+    attempts = rows[0]["attempts"] + 1
+    backoff = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    retry_at = time.time() + backoff
+    with _outbox_lock:
+        with _outbox_conn:
+            _outbox_conn.executemany(
+                "UPDATE sheets_outbox SET attempts = attempts + 1, "
+                "next_attempt_at = ?, last_error = ? WHERE id = ?",
+                [(retry_at, error[:500], row["id"]) for row in rows],
+            )
+        _stats["failed"] += 1
+        _stats["last_error"] = error[:200]
+    logger.warning(
+        "Sheets upload of %d row(s) failed (attempt %d), retrying in %.0fs: %s",
+        len(rows), attempts, backoff, error[:200],
+    )
+    return backoff
+
+
+def _mark_rejected(row, error: str) -> None:
+    """Retry a rejected payload later, or give up on it after MAX_ATTEMPTS."""
+    if row["attempts"] + 1 < MAX_ATTEMPTS:
+        _mark_failed([row], error)
+        return
+    with _outbox_lock:
+        with _outbox_conn:
+            _outbox_conn.execute(
+                "INSERT INTO sheets_failed (id, created_at, payload, attempts, failed_at, last_error) "
+                "SELECT id, created_at, payload, attempts + 1, ?, ? FROM sheets_outbox WHERE id = ?",
+                (time.time(), error[:500], row["id"]),
+            )
+            _outbox_conn.execute("DELETE FROM sheets_outbox WHERE id = ?", (row["id"],))
+        _stats["depth"] -= 1
+        _stats["dead_lettered"] += 1
+        _stats["last_error"] = error[:200]
+    logger.error(
+        "Sheets rejected outbox row %d %d times, moved to sheets_failed: %s",
+        row["id"], row["attempts"] + 1, error[:200],
+    )
 
+
+def _post(payload: dict) -> tuple:
+    """
+    POST one payload. Returns (None, False) on success, otherwise
+    (error description, rejected). rejected is True when the endpoint
+    refused the payload itself (an Apps Script "INVALID" or a 4xx). It is
+    False for outages: network errors, timeouts, 5xx, and Apps Script
+    "ERROR" replies (quota, lock timeouts, sheet setup). Those uploads
+    are retried with backoff indefinitely.
+    """
+    start = time.monotonic()
+    try:
+        resp = _session.post(
+            GOOGLE_SHEETS_ENDPOINT,
+            json=payload,
+            timeout=REQUEST_TIMEOUT,
+        )
     except Exception as e:
-        logger.exception("Error uploading to Google Sheets: %s", e)
+        return f"{type(e).__name__}: {e}", False
+
+    latency_ms = (time.monotonic() - start) * 1000.0
+
+    # Apps Script answers 200 either way: "INVALID" for a bad payload,
+    # "ERROR" when the script itself failed
+    if resp.status_code != 200 or resp.text.startswith(("ERROR", "INVALID")):
+        status = resp.status_code
+        if status == 200:
+            rejected = resp.text.startswith("INVALID")
+        else:
+            rejected = 400 <= status < 500 and status not in (408, 429)
+        return f"HTTP {resp.status_code}: {resp.text[:200]}", rejected
+
+    with _outbox_lock:
+        _stats["last_latency_ms"] = round(latency_ms, 1)
+        avg = _stats["avg_latency_ms"]
+        _stats["avg_latency_ms"] = round(
+            latency_ms if avg is None else 0.8 * avg + 0.2 * latency_ms, 1
+        )
+        _stats["last_success_at"] = datetime.utcnow().isoformat()
+
+    logger.debug(
+        "Sheets %s request accepted in %.0f ms",
+        payload.get("type", "unknown"), latency_ms,
+    )
+    return None, False
+
+
+def shutdown() -> None:
+    """Stop the upload worker. Pending payloads stay in the outbox."""
+    global _worker_thread, _outbox_conn
+    if _worker_thread is None:
+        return
+    logger.info("Stopping Google Sheets upload worker")
+    _stop.set()
+    _wake.set()
+    _worker_thread.join(timeout=REQUEST_TIMEOUT + 5)
+    _worker_thread = None
+    with _outbox_lock:
+        if _outbox_conn is not None:
+            _outbox_conn.close()
+            _outbox_conn = None
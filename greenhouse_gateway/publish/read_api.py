@@ -0,0 +1,434 @@
+# greenhouse_gateway/publish/read_api.py
+
+"""
+Local read-only HTTP API for dashboards and scripts.
+
+    GET /latest[?device=]                     newest packet(s), from memory
+    GET /samples?start=&end=[&device=][&fields=a,b][&limit=][&after=]
+                                              raw samples, keyset-paginated
+    GET /series?device=&start=&end=[&resolution=60][&fields=]
+                                              rollups (see rollups.query_series)
+    GET /daily[?start=][&end=]                daily_summary rows
+    GET /export?start=&end=[&device=][&fields=][&format=ndjson|csv]
+                                              streamed samples
+
+start/end are ISO UTC timestamps ([start, end)). /samples orders rows
+by (timestamp_utc, device_id). Each page returns "next", an opaque
+cursor to pass back as after=. The next page then continues from an
+index seek on timestamp_utc instead of an OFFSET scan.
+
+JSON responses carry an ETag (a hash of the body) and answer
+If-None-Match with 304. /samples and /series responses for closed
+ranges are also kept in an LRU cache and served without touching
+SQLite. A range is closed if its end is more than
+api_closed_grace_seconds in the past, so late packets in the writer
+queue have landed. daily_summary rows are not cached because their
+notes can be edited at any time.
+
+The server runs on its own daemon threads. Reads use a small pool of
+read-only connections (mode=ro, query_only). Under WAL, readers never
+block the batched writer, so a slow client holds up only its own
+thread. Exports stream fetchmany() chunks to the socket, and memory
+does not grow with the size of the range.
+"""
+
+import csv
+import hashlib
+import io
+import json
+import logging
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+from .. import config
+from .. import fields
+from ..persist import latest_state
+from ..persist import rollups
+from ..persist import storage
+
+logger = logging.getLogger("greenhouse_gateway.read_api")
+
+API_HOST = config.get("api_host", "127.0.0.1")
+API_PORT = int(config.get("api_port", 9109))  # 0 = no API
+PAGE_ROWS = max(1, int(config.get("api_page_rows", 1000)))
+MAX_PAGE_ROWS = max(PAGE_ROWS, int(config.get("api_max_page_rows", 10000)))
+CACHE_ENTRIES = int(config.get("api_cache_entries", 256))
+CLOSED_GRACE = float(config.get("api_closed_grace_seconds", 600))
+POOL_SIZE = max(1, int(config.get("api_pool_size", 4)))
+EXPORT_CHUNK_ROWS = max(1, int(config.get("export_chunk_rows", 10000)))
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+_pool: "queue.LifoQueue" = queue.LifoQueue()
+_cache: "OrderedDict[str, tuple]" = OrderedDict()  # path?query -> (etag, body)
+_cache_lock = threading.Lock()
+_stats = {
+    "requests": 0,
+    "cache_hits": 0,
+    "not_modified": 0,
+    "errors": 0,
+}
+
+
+# ---------------------------------------------------------------------
+# Read-only connections
+# ---------------------------------------------------------------------
+
+def _connect():
+    conn = sqlite3.connect(
+        f"file:{storage.DB_PATH}?mode=ro", uri=True, timeout=5, check_same_thread=False
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA query_only=1")
+    return conn
+
+
+class _Connection:
+    """Borrow a pooled read-only connection for one request."""
+
+    def __enter__(self):
+        try:
+            self.conn = _pool.get_nowait()
+        except queue.Empty:
+            try:
+                self.conn = _connect()
+            except sqlite3.OperationalError as e:
+                raise ApiError(503, f"database unavailable: {e}")
+        return self.conn
+
+    def __exit__(self, *exc):
+        if _pool.qsize() < POOL_SIZE:
+            _pool.put(self.conn)
+        else:
+            self.conn.close()
+
+
+def _close_pool() -> None:
+    while True:
+        try:
+            _pool.get_nowait().close()
+        except queue.Empty:
+            return
+
+
+# ---------------------------------------------------------------------
+# Parameters
+# ---------------------------------------------------------------------
+
+def _param(params: dict, name: str, default=None, required: bool = False):
+    values = params.get(name)
+    if not values:
+        if required:
+            raise ApiError(400, f"missing parameter {name!r}")
+        return default
+    return values[-1]
+
+
+def _timestamp(params: dict, name: str, required: bool = True) -> Optional[str]:
+    value = _param(params, name, required=required)
+    if value is None:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise ApiError(400, f"{name} is not an ISO timestamp: {value!r}")
+    # Stored timestamps are naive UTC in full ISO form and compared as
+    # strings, so "2026-01-01 05:00" or "20260101" must be rewritten too
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.isoformat()
+
+
+def _columns(params: dict) -> tuple:
+    value = _param(params, "fields")
+    if value is None:
+        return fields.SAMPLES_COLUMNS
+    names = tuple(name for name in value.split(",") if name)
+    unknown = [name for name in names if name not in fields.SAMPLES_COLUMNS]
+    if unknown:
+        raise ApiError(400, f"unknown fields {unknown}")
+    # The keyset columns are always returned
+    keys = tuple(name for name in ("device_id", "timestamp_utc") if name not in names)
+    return keys + names
+
+
+def _limit(params: dict) -> int:
+    try:
+        limit = int(_param(params, "limit", PAGE_ROWS))
+    except ValueError:
+        raise ApiError(400, "limit must be an integer")
+    return min(max(limit, 1), MAX_PAGE_ROWS)
+
+
+def _closed(end: str) -> bool:
+    return datetime.fromisoformat(end) <= datetime.utcnow() - timedelta(seconds=CLOSED_GRACE)
+
+
+def _samples_query(params: dict, columns: tuple, after: Optional[str] = None):
+    start = _timestamp(params, "start")
+    end = _timestamp(params, "end")
+    device_id = _param(params, "device")
+    sql = f"SELECT {', '.join(columns)} FROM samples WHERE timestamp_utc >= ? AND timestamp_utc < ?"
+    args = [start, end]
+    if device_id is not None:
+        sql += " AND device_id = ?"
+        args.append(device_id)
+    if after is not None:
+        ts, sep, after_device = after.partition("|")
+        if not sep:
+            raise ApiError(400, f"after is not a cursor from a previous page: {after!r}")
+        # Range-seekable on idx_samples_timestamp; device_id breaks ties
+        sql += " AND timestamp_utc >= ? AND (timestamp_utc > ? OR device_id > ?)"
+        args += [ts, ts, after_device]
+    sql += " ORDER BY timestamp_utc, device_id"
+    return sql, args, end
+
+
+# ---------------------------------------------------------------------
+# Endpoints (JSON)
+# ---------------------------------------------------------------------
+
+def _latest(params: dict) -> dict:
+    device_id = _param(params, "device")
+    if device_id is not None:
+        packet = latest_state.get_latest(device_id)
+        if packet is None:
+            raise ApiError(404, f"no packets from device {device_id!r}")
+        latest = packet
+    else:
+        latest = latest_state.get_latest_by_device()
+    age = latest_state.get_age_seconds()
+    return {"latest": latest, "age_s": None if age is None else round(age, 3)}
+
+
+def _samples(params: dict) -> dict:
+    columns = _columns(params)
+    limit = _limit(params)
+    sql, args, _ = _samples_query(params, columns, _param(params, "after"))
+    with _Connection() as conn:
+        rows = [dict(row) for row in conn.execute(sql + " LIMIT ?", args + [limit + 1])]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = f"{last['timestamp_utc']}|{last['device_id']}"
+    return {"rows": rows, "next": next_cursor}
+
+
+def _series(params: dict) -> dict:
+    device_id = _param(params, "device", fields.DEFAULT_DEVICE_ID)
+    start = _timestamp(params, "start")
+    end = _timestamp(params, "end")
+    try:
+        resolution = float(_param(params, "resolution", 60))
+    except ValueError:
+        raise ApiError(400, "resolution must be a number of seconds")
+    names = _param(params, "fields")
+    names = names.split(",") if names else None
+    with _Connection() as conn:
+        try:
+            rows = rollups.query_series(device_id, start, end, resolution, names, conn=conn)
+        except ValueError as e:
+            raise ApiError(400, str(e))
+    return {"rows": rows}
+
+
+def _daily(params: dict) -> dict:
+    start = _param(params, "start", "")
+    end = _param(params, "end", "9999")
+    with _Connection() as conn:
+        rows = conn.execute(
+            "SELECT * FROM daily_summary WHERE date >= ? AND date < ? ORDER BY date", (start, end)
+        ).fetchall()
+    return {"rows": [dict(row) for row in rows]}
+
+
+# Path -> (handler, whether closed ranges may be cached)
+_ENDPOINTS = {
+    "/latest": (_latest, False),
+    "/samples": (_samples, True),
+    "/series": (_series, True),
+    "/daily": (_daily, False),
+}
+
+
+def _cached(key: str) -> Optional[tuple]:
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None:
+            _cache.move_to_end(key)
+        return entry
+
+
+def _remember(key: str, entry: tuple) -> None:
+    if CACHE_ENTRIES <= 0:
+        return
+    with _cache_lock:
+        _cache[key] = entry
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_ENTRIES:
+            _cache.popitem(last=False)
+
+
+def _respond_json(path: str, query: str, params: dict):
+    """(etag, body) for a JSON endpoint, from the cache where possible."""
+    handler, cacheable = _ENDPOINTS[path]
+    key = f"{path}?{query}"
+    cacheable = cacheable and _closed(_timestamp(params, "end"))
+    if cacheable:
+        entry = _cached(key)
+        if entry is not None:
+            _stats["cache_hits"] += 1
+            return entry
+
+    body = json.dumps(handler(params), default=str, separators=(",", ":")).encode()
+    entry = ('"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"', body)
+    if cacheable:
+        _remember(key, entry)
+    return entry
+
+
+def clear_cache() -> None:
+    """Drop cached responses (e.g. after a replay rewrote history)."""
+    with _cache_lock:
+        _cache.clear()
+
+
+def get_stats() -> dict:
+    stats = dict(_stats)
+    stats["cached"] = len(_cache)
+    return stats
+
+
+# ---------------------------------------------------------------------
+# HTTP
+# ---------------------------------------------------------------------
+
+class _ApiHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        _stats["requests"] += 1
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        try:
+            if url.path == "/export":
+                self._export(params)
+                return
+            if url.path not in _ENDPOINTS:
+                raise ApiError(404, f"unknown endpoint {url.path}")
+            etag, body = _respond_json(url.path, url.query, params)
+        except ApiError as e:
+            self._error(e.status, str(e))
+            return
+        except Exception as e:
+            logger.exception("Error serving %s: %s", self.path, e)
+            self._error(500, "internal error")
+            return
+
+        if self.headers.get("If-None-Match") == etag:
+            _stats["not_modified"] += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status: int, message: str) -> None:
+        _stats["errors"] += 1
+        body = json.dumps({"error": message}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _export(self, params: dict) -> None:
+        fmt = _param(params, "format", "ndjson")
+        if fmt not in ("ndjson", "csv"):
+            raise ApiError(400, "format must be ndjson or csv")
+        columns = _columns(params)
+        sql, args, _ = _samples_query(params, columns)
+
+        with _Connection() as conn:
+            cur = conn.execute(sql, args)
+            # HTTP/1.0: the body ends when the connection closes
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson" if fmt == "ndjson" else "text/csv")
+            self.end_headers()
+            try:
+                self._stream(cur, fmt, columns)
+            except (BrokenPipeError, ConnectionResetError):
+                logger.debug("Export client went away")
+            except Exception as e:
+                # Too late for an error status: cut the body short instead
+                _stats["errors"] += 1
+                logger.exception("Error streaming export %s: %s", self.path, e)
+            finally:
+                cur.close()
+            self.close_connection = True
+
+    def _stream(self, cur, fmt: str, columns: tuple) -> None:
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+        while True:
+            rows = cur.fetchmany(EXPORT_CHUNK_ROWS)
+            if not rows:
+                break
+            if fmt == "ndjson":
+                chunk = "".join(json.dumps(dict(row), default=str) + "\n" for row in rows)
+            else:
+                writer.writerows(rows)
+                chunk = buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            self.wfile.write(chunk.encode())
+        if fmt == "csv" and buffer.tell():
+            self.wfile.write(buffer.getvalue().encode())
+
+    def log_message(self, format, *args):
+        logger.debug("api %s", format % args)
+
+
+_server = None
+
+
+def start_server() -> bool:
+    """Serve the API on a daemon thread. Returns False if disabled or the port is taken."""
+    global _server
+    if _server is not None or not API_PORT:
+        return _server is not None
+    try:
+        _server = ThreadingHTTPServer((API_HOST, API_PORT), _ApiHandler)
+    except OSError as e:
+        logger.warning("Read API disabled, cannot bind %s:%s: %s", API_HOST, API_PORT, e)
+        return False
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="read-api-http", daemon=True).start()
+    logger.info("Serving read API at http://%s:%s/", API_HOST, API_PORT)
+    return True
+
+
+def stop_server() -> None:
+    global _server
+    if _server is not None:
+        _server.shutdown()
+        _server.server_close()
+        _server = None
+    _close_pool()
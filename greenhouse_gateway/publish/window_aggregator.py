@@ -0,0 +1,142 @@
+# greenhouse_gateway/publish/window_aggregator.py
+
+import time
+from datetime import datetime
+from typing import Callable, Iterable, Optional
+
+# Distinct values tracked per mode field before the rarest is evicted
+DEFAULT_MODE_CAPACITY = 32
+
+
+class WindowAggregator:
+    """
+    Incremental statistics over one time window of packets.
+
+    Each packet updates running sum/count/min/max for averaging fields,
+    a bounded frequency counter for mode fields and the latest value of
+    pass-through fields. Memory does not grow with the number of
+    packets, and flush() is O(fields).
+    """
+
+    def __init__(
+        self,
+        window_seconds: float,
+        averaging_fields: Iterable[str],
+        mode_fields: Iterable[str],
+        passthrough_fields: Iterable[str] = (),
+        mode_capacity: int = DEFAULT_MODE_CAPACITY,
+    ):
+        self.window_seconds = window_seconds
+        self.averaging_fields = tuple(averaging_fields)
+        self.mode_fields = tuple(mode_fields)
+        self.passthrough_fields = tuple(passthrough_fields)
+        self.mode_capacity = mode_capacity
+        self.started_at: Optional[float] = None
+        self._reset()
+
+    def _reset(self) -> None:
+        n = len(self.averaging_fields)
+        self.count = 0
+        self._sums = [0.0] * n
+        self._counts = [0] * n
+        self._mins = [None] * n
+        self._maxs = [None] * n
+        self._modes = [{} for _ in self.mode_fields]
+        self._latest = {}
+
+    def add(self, packet: dict, now: Optional[float] = None) -> None:
+        if self.started_at is None:
+            self.started_at = time.time() if now is None else now
+        self.count += 1
+
+        sums, counts, mins, maxs = self._sums, self._counts, self._mins, self._maxs
+        for i, field in enumerate(self.averaging_fields):
+            value = packet.get(field)
+            if isinstance(value, (int, float)):
+                sums[i] += value
+                counts[i] += 1
+                if mins[i] is None or value < mins[i]:
+                    mins[i] = value
+                if maxs[i] is None or value > maxs[i]:
+                    maxs[i] = value
+
+        for field, counter in zip(self.mode_fields, self._modes):
+            if field in packet:
+                self._count_mode(counter, packet[field])
+
+        latest = self._latest
+        for field in self.passthrough_fields:
+            if field in packet:
+                latest[field] = packet[field]
+
+    def _count_mode(self, counter: dict, value) -> None:
+        if value in counter:
+            counter[value] += 1
+            return
+        if len(counter) >= self.mode_capacity:
+            # Evict the rarest value; insertion order breaks ties so the
+            # earliest-seen value wins, matching statistics.mode()
+            rarest = min(counter, key=counter.get)
+            del counter[rarest]
+        counter[value] = 1
+
+    def due(self, now: Optional[float] = None) -> bool:
+        if self.started_at is None:
+            return False
+        now = time.time() if now is None else now
+        return now - self.started_at >= self.window_seconds
+
+    def result(self) -> dict:
+        """Statistics for the packets seen so far (empty if none)."""
+        if not self.count:
+            return {}
+
+        result: dict = {}
+
+        for i, field in enumerate(self.averaging_fields):
+            if self._counts[i]:
+                result[field] = self._sums[i] / self._counts[i]
+                result[field + "_min"] = self._mins[i]
+                result[field + "_max"] = self._maxs[i]
+
+        for field, counter in zip(self.mode_fields, self._modes):
+            if counter:
+                result[field] = max(counter, key=counter.get)
+
+        # Pass-through fields win over averages/modes (latest value)
+        result.update(self._latest)
+
+        result["timestamp"] = datetime.utcnow().isoformat()
+        result["sample_count"] = self.count
+        return result
+
+    def flush(self, now: Optional[float] = None) -> dict:
+        """Return the window's statistics and start a new window."""
+        result = self.result()
+        self._reset()
+        self.started_at = time.time() if now is None else now
+        return result
+
+
+class WindowSet:
+    """Several WindowAggregators (e.g. 1 min, 5 min, 1 h) fed from one stream."""
+
+    def __init__(self):
+        self._windows = []
+
+    def add_window(
+        self,
+        name: str,
+        aggregator: WindowAggregator,
+        on_flush: Callable[[str, dict], None],
+    ) -> None:
+        self._windows.append((name, aggregator, on_flush))
+
+    def add(self, packet: dict, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        for name, aggregator, on_flush in self._windows:
+            aggregator.add(packet, now)
+            if aggregator.due(now):
+                result = aggregator.flush(now)
+                if result:
+                    on_flush(name, result)
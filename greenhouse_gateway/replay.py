@@ -0,0 +1,244 @@
+# greenhouse_gateway/replay.py
+
+"""
+Offline replay: re-ingest history through the current pipeline.
+
+Packets come from raw MQTT captures (see ingest/capture.py) or from the
+samples table of an existing database, and go through the same
+validation, normalization and enrichment as live data. Enrichment uses
+each sample's own timestamp. The results are written to a separate
+target database. Rollups are maintained by the writer as usual, and
+daily_summary is rebuilt for the replayed days at the end. Nothing is
+sent to Google Sheets and the runtime snapshot files are left alone.
+
+Rows are handed to the writer in large batches, as fast as possible,
+or paced at --speed times real time.
+
+Usage:
+    python -m greenhouse_gateway.replay --capture captures/ --target db/replay.db
+    python -m greenhouse_gateway.replay --samples db/greenhouse.db --since 2025-12-01 \\
+        --until 2026-01-01 --target db/replay.db [--device esp32] [--speed 60]
+"""
+
+import argparse
+import json
+import logging
+import sqlite3
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+from . import config
+from . import fields
+from .ingest import capture
+from .ingest import data_collector
+from .ingest import dedup
+from .ingest import validation
+from .persist import daily_summary
+from .persist import storage
+
+logger = logging.getLogger("greenhouse_gateway.replay")
+
+BATCH_ROWS = max(1, int(config.get("replay_batch_rows", 1000)))
+PROGRESS_SECONDS = 10.0
+
+# samples columns carried over as-is; the other non-sensor columns are re-derived
+_KEPT_CONTEXT = ("control_mode", "control_reason")
+
+_stats = {
+    "read": 0,
+    "malformed": 0,
+    "rejected": 0,
+    "replayed": 0,
+}
+
+
+def _epoch(iso_utc: str) -> float:
+    return datetime.fromisoformat(iso_utc).replace(tzinfo=timezone.utc).timestamp()
+
+
+def _iso_utc(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo=None).isoformat(timespec="microseconds")
+
+
+# ---------------------------------------------------------------------
+# Sources
+# ---------------------------------------------------------------------
+
+def packets_from_capture(paths: Iterable) -> Iterator[dict]:
+    """Raw packets from MQTT capture files, shaped as on_message queues them."""
+    # Imported here: mqtt_client pulls in paho, which samples replays do not need
+    from .ingest import mqtt_client
+
+    for received_at, topic, payload in capture.iter_capture(paths):
+        device_id = mqtt_client.device_id_for_topic(topic)
+        if device_id is None:
+            continue
+        _stats["read"] += 1
+        try:
+            data = json.loads(payload.decode("utf-8"))
+        except ValueError:
+            _stats["malformed"] += 1
+            continue
+        if not isinstance(data, dict):
+            _stats["malformed"] += 1
+            continue
+        data["device_id"] = device_id
+        # Same key the live gateway stored, so replays into a database
+        # that already holds these packets are skipped, not duplicated
+        data["packet_key"] = dedup.packet_key(data)
+        data["jetson_timestamp"] = _iso_utc(received_at)
+        for key in _KEPT_CONTEXT:
+            data[key] = None  # not recorded in captures
+        yield data
+
+
+def packets_from_samples(
+    db_path: Path,
+    since: str = "",
+    until: str = "9999",
+    device_id: Optional[str] = None,
+) -> Iterator[dict]:
+    """Raw packets rebuilt from stored samples, oldest first."""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        sql = (
+            f"SELECT {', '.join(fields.SAMPLES_COLUMNS)} FROM samples "
+            "WHERE timestamp_utc >= ? AND timestamp_utc < ?"
+        )
+        params = [since, until]
+        if device_id is not None:
+            sql += " AND device_id = ?"
+            params.append(device_id)
+        sql += " ORDER BY timestamp_utc"
+
+        keys = [
+            f.source if f.source is not None else (f.name if f.name in _KEPT_CONTEXT else None)
+            for f in fields.FIELDS
+        ]
+        cur = conn.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(BATCH_ROWS)
+            if not rows:
+                break
+            for row in rows:
+                _stats["read"] += 1
+                yield {key: value for key, value in zip(keys, row) if key is not None}
+    finally:
+        conn.close()
+
+
+# ---------------------------------------------------------------------
+# Pipeline
+# ---------------------------------------------------------------------
+
+def replay(packets: Iterable[dict], speed: float = 0.0) -> dict:
+    """
+    Validate, normalize, enrich and store packets in the target database.
+    speed 0 = as fast as possible, otherwise a multiple of real time.
+    Returns counters, including the local days touched.
+    """
+    batch_rows = BATCH_ROWS if not speed else 1  # paced rows are written as they come
+    batch = []
+    first_day = last_day = None
+    first_ts = wall_start = None
+    started = last_progress = time.monotonic()
+
+    for packet in packets:
+        packet = validation.validate_packet(packet)
+        if packet is None:
+            _stats["rejected"] += 1
+            continue
+
+        normalized = data_collector.normalize_packet(packet)
+        for key in _KEPT_CONTEXT:
+            normalized[key] = packet.get(key)
+        normalized["jetson_timestamp"] = dedup.unique_timestamp(
+            normalized["device_id"], normalized["jetson_timestamp"]
+        )
+        ts = _epoch(normalized["jetson_timestamp"])
+
+        if speed:
+            if first_ts is None:
+                first_ts, wall_start = ts, time.monotonic()
+            delay = (ts - first_ts) / speed - (time.monotonic() - wall_start)
+            if delay > 0:
+                time.sleep(delay)
+
+        enriched = data_collector.enrich_packet(normalized, now=datetime.fromtimestamp(ts))
+        batch.append(enriched)
+        _stats["replayed"] += 1
+
+        day = enriched["local_time"][:10]
+        first_day = min(first_day or day, day)
+        last_day = max(last_day or day, day)
+
+        if len(batch) >= batch_rows:
+            storage.insert_sensor_readings(batch)
+            batch = []
+
+        now = time.monotonic()
+        if now - last_progress >= PROGRESS_SECONDS:
+            last_progress = now
+            logger.info("Replayed %d packets (%.0f/s)", _stats["replayed"], _stats["replayed"] / (now - started))
+
+    storage.insert_sensor_readings(batch)
+    storage.flush()
+
+    if first_day is not None:
+        daily_summary.backfill(first_day, last_day)
+
+    elapsed = time.monotonic() - started
+    result = dict(_stats)
+    result.update(
+        seconds=round(elapsed, 2),
+        packets_per_s=round(_stats["replayed"] / elapsed, 1) if elapsed else None,
+        db_conflicts=storage.get_write_stats()["conflicts"],
+        first_day=first_day,
+        last_day=last_day,
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-ingest captured or stored packets into a separate database")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--capture", nargs="+", metavar="PATH", help="capture files or directories")
+    source.add_argument("--samples", metavar="DB", help="database whose samples table is replayed")
+    parser.add_argument("--target", required=True, help="database to write (must not be the live one)")
+    parser.add_argument("--since", default="", help="first UTC timestamp (samples source)")
+    parser.add_argument("--until", default="9999", help="end UTC timestamp, exclusive (samples source)")
+    parser.add_argument("--device", help="only this device (samples source)")
+    parser.add_argument("--speed", type=float, default=0.0, help="multiple of real time (0 = as fast as possible)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+
+    target = Path(args.target).resolve()
+    if target == storage.DB_PATH.resolve():
+        parser.error("refusing to replay into the live database")
+    if args.samples and target == Path(args.samples).resolve():
+        parser.error("--target must differ from --samples")
+
+    if args.capture:
+        packets = packets_from_capture(args.capture)
+    else:
+        packets = packets_from_samples(Path(args.samples), args.since, args.until, args.device)
+
+    # Before the first connection: everything below writes to the target.
+    # The live settings are put back afterwards, for callers in the same process.
+    storage.close_connection()
+    saved = storage.DB_PATH, storage.BATCH_MAX_ROWS, storage._schema_ready
+    storage.DB_PATH = target
+    storage.BATCH_MAX_ROWS = max(storage.BATCH_MAX_ROWS, BATCH_ROWS)
+    storage._schema_ready = False
+    try:
+        print(json.dumps(replay(packets, args.speed), indent=2))
+    finally:
+        storage.close_connection()
+        storage.DB_PATH, storage.BATCH_MAX_ROWS, storage._schema_ready = saved
+
+
+if __name__ == "__main__":
+    main()
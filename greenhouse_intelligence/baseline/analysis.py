@@ -0,0 +1,278 @@
+# greenhouse_intelligence/baseline/analysis.py
+
+"""
+Baseline experiment analysis.
+
+Loads the baseline-mode samples for a device with one query, splits
+them into block runs (consecutive samples with the same
+control_reason, broken at gaps), and computes per run, using NumPy
+only:
+
+  * tail means: the level each metric settled to over the last
+    TAIL_SECONDS of the block
+  * deltas: that level minus the same level in the preceding CONTROL /
+    CONTROL_INT run
+  * time to settle: seconds from block start until the metric stays
+    within SETTLE_TOLERANCE of its final level
+  * VPD slope: least-squares slope of VPD (kPa/h) over the first
+    SLOPE_SECONDS of the block
+
+Results for completed runs are cached in
+runtime/baseline_analysis_<device>.json. Later calls only query samples
+from the last cached control run onwards.
+
+Usage:
+    python -m greenhouse_intelligence.baseline.analysis [--device esp32] [--no-cache]
+"""
+
+import argparse
+import json
+import logging
+import time
+import warnings
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from greenhouse_gateway import fields
+from greenhouse_gateway.atomic_file import atomic_write_text
+from greenhouse_gateway.control import command_dispatcher
+from greenhouse_gateway.persist import storage
+
+from .scheduler import CONTROL_MODE
+
+logger = logging.getLogger("greenhouse_intelligence.baseline.analysis")
+
+METRICS = ("inside_temp_f", "inside_humidity_rh", "inside_vpd_kpa")
+
+# "Settled" = within this distance of the block's final level
+SETTLE_TOLERANCE = {
+    "inside_temp_f": 0.5,
+    "inside_humidity_rh": 2.0,
+    "inside_vpd_kpa": 0.02,
+}
+
+CONTROL_BLOCKS = ("CONTROL", "CONTROL_INT")
+
+TAIL_SECONDS = 600      # final level = mean of the last 10 minutes
+SLOPE_SECONDS = 1800    # VPD slope over the first 30 minutes
+MAX_GAP_SECONDS = 300   # a longer gap ends a run (restart, mode switch)
+
+_LOAD_SQL = f"""
+    SELECT timestamp_utc, control_reason, {", ".join(METRICS)}
+    FROM samples
+    WHERE device_id = ? AND control_mode = ? AND timestamp_utc >= ?
+    ORDER BY timestamp_utc
+"""
+
+
+def cache_path(device_id: str):
+    return command_dispatcher.RUNTIME_DIR / f"baseline_analysis_{device_id}.json"
+
+
+# ---------------------------------------------------------------------
+# Loading
+# ---------------------------------------------------------------------
+
+def load_arrays(device_id: str, since: str = "", conn=None) -> Optional[dict]:
+    """Baseline samples since an ISO timestamp as column arrays (None if empty)."""
+    conn = conn or storage.get_connection()
+    cur = conn.cursor()
+    cur.row_factory = None  # plain tuples; sqlite3.Row is slower to build
+    rows = cur.execute(_LOAD_SQL, (device_id, CONTROL_MODE, since)).fetchall()
+    if not rows:
+        return None
+    columns = list(zip(*rows))
+    arrays = {
+        "timestamp_utc": columns[0],
+        "ts": np.array(columns[0], dtype="datetime64[us]").astype(np.int64) / 1e6,
+        "reason": np.array(columns[1], dtype=object),
+    }
+    for i, name in enumerate(METRICS, 2):
+        arrays[name] = np.array(columns[i], dtype=float)  # None -> NaN
+    return arrays
+
+
+# ---------------------------------------------------------------------
+# Vectorized per-run metrics
+# ---------------------------------------------------------------------
+
+def _per_run_mean(values, mask, run_id, nruns):
+    ok = mask & np.isfinite(values)
+    total = np.bincount(run_id, weights=np.where(ok, values, 0.0), minlength=nruns)
+    count = np.bincount(run_id, weights=ok, minlength=nruns)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return total / count
+
+
+def _settle_seconds(values, target, tolerance, ts, run_id, starts, ends):
+    """Seconds from run start to the first sample after the last out-of-band one."""
+    outside = np.isfinite(values) & (np.abs(values - target[run_id]) > tolerance)
+    positions = np.flatnonzero(outside)
+    settle_idx = starts.copy()
+    if len(positions):
+        runs = run_id[positions]
+        last = np.r_[runs[1:] != runs[:-1], True]  # last outside sample per run
+        settle_idx[runs[last]] = positions[last] + 1
+    settled = settle_idx < ends  # the final sample was still out of band otherwise
+    seconds = ts[np.minimum(settle_idx, len(ts) - 1)] - ts[starts]
+    return np.where(settled & np.isfinite(target), seconds, np.nan)
+
+
+def _slope_per_hour(values, ts, run_id, starts, nruns):
+    """Least-squares slope over each run's first SLOPE_SECONDS, per hour."""
+    elapsed = ts - ts[starts][run_id]
+    ok = (elapsed <= SLOPE_SECONDS) & np.isfinite(values)
+    x = np.where(ok, elapsed / 3600.0, 0.0)
+    y = np.where(ok, values, 0.0)
+    n = np.bincount(run_id, weights=ok, minlength=nruns)
+    sx = np.bincount(run_id, weights=x, minlength=nruns)
+    sy = np.bincount(run_id, weights=y, minlength=nruns)
+    sxx = np.bincount(run_id, weights=x * x, minlength=nruns)
+    sxy = np.bincount(run_id, weights=x * y, minlength=nruns)
+    denom = n * sxx - sx * sx
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = (n * sxy - sx * sy) / denom
+    return np.where((n >= 3) & (denom > 0), slope, np.nan)
+
+
+def compute_runs(arrays: dict, now: Optional[float] = None) -> List[dict]:
+    """Split samples into block runs and compute their response metrics."""
+    ts = arrays["ts"]
+    reason = arrays["reason"]
+    n = len(ts)
+
+    boundary = np.empty(n, dtype=bool)
+    boundary[0] = True
+    boundary[1:] = (reason[1:] != reason[:-1]) | (np.diff(ts) > MAX_GAP_SECONDS)
+    starts = np.flatnonzero(boundary)
+    ends = np.append(starts[1:], n)  # exclusive
+    run_id = np.cumsum(boundary) - 1
+    nruns = len(starts)
+
+    blocks = np.array([str(r).split(" (")[0] for r in reason[starts]], dtype=object)
+    is_control = np.isin(blocks, CONTROL_BLOCKS)
+    last_control = np.maximum.accumulate(np.where(is_control, np.arange(nruns), -1))
+    prev_control = np.r_[-1, last_control[:-1]]
+
+    t_start = ts[starts]
+    t_end = ts[ends - 1]
+    tail = ts >= (t_end - TAIL_SECONDS)[run_id]
+
+    level, delta, settle = {}, {}, {}
+    for name in METRICS:
+        values = arrays[name]
+        level[name] = _per_run_mean(values, tail, run_id, nruns)
+        baseline = np.where(prev_control >= 0, level[name][np.maximum(prev_control, 0)], np.nan)
+        delta[name] = level[name] - baseline
+        settle[name] = _settle_seconds(values, level[name], SETTLE_TOLERANCE[name], ts, run_id, starts, ends)
+    vpd_slope = _slope_per_hour(arrays["inside_vpd_kpa"], ts, run_id, starts, nruns)
+
+    now = time.time() if now is None else now
+    complete = np.arange(nruns) < nruns - 1
+    complete[-1] = now - t_end[-1] > MAX_GAP_SECONDS
+
+    def _num(x):
+        return None if not np.isfinite(x) else round(float(x), 4)
+
+    timestamps = arrays["timestamp_utc"]
+    results = []
+    for i in range(nruns):
+        run = {
+            "block": blocks[i],
+            "reason": reason[starts[i]],
+            "start": timestamps[starts[i]],
+            "end": timestamps[ends[i] - 1],
+            "duration_s": round(float(t_end[i] - t_start[i]), 1),
+            "samples": int(ends[i] - starts[i]),
+            "complete": bool(complete[i]),
+            "control_start": timestamps[starts[prev_control[i]]] if prev_control[i] >= 0 else None,
+            "vpd_slope_kpa_per_h": _num(vpd_slope[i]),
+        }
+        for name in METRICS:
+            run[f"{name}_level"] = _num(level[name][i])
+            run[f"{name}_delta"] = _num(delta[name][i])
+            run[f"{name}_settle_s"] = _num(settle[name][i])
+        results.append(run)
+    return results
+
+
+# ---------------------------------------------------------------------
+# Cached analysis
+# ---------------------------------------------------------------------
+
+def _load_cache(device_id: str) -> dict:
+    try:
+        return json.loads(cache_path(device_id).read_text())
+    except (OSError, ValueError):
+        return {"runs": [], "resume_from": ""}
+
+
+def analyze(device_id: str = fields.DEFAULT_DEVICE_ID, conn=None,
+            now: Optional[float] = None, use_cache: bool = True) -> List[dict]:
+    """
+    All baseline runs for a device, oldest first. Completed runs come
+    from the cache when possible; only newer samples are queried.
+    """
+    cache = _load_cache(device_id) if use_cache else {"runs": [], "resume_from": ""}
+    cached = cache["runs"]
+    known = {run["start"] for run in cached}
+
+    # Re-read from the last cached control run so the first new block
+    # still has its preceding control level
+    arrays = load_arrays(device_id, cache.get("resume_from", ""), conn)
+    fresh = compute_runs(arrays, now) if arrays is not None else []
+
+    added = [run for run in fresh if run["complete"] and run["start"] not in known]
+    pending = [run for run in fresh if not run["complete"]]
+
+    if added and use_cache:
+        runs = cached + added
+        controls = [run["start"] for run in runs if run["block"] in CONTROL_BLOCKS]
+        atomic_write_text(
+            cache_path(device_id),
+            json.dumps({"runs": runs, "resume_from": controls[-1] if controls else ""}),
+        )
+        logger.info("Cached %d new baseline runs for %s", len(added), device_id)
+
+    return cached + added + pending
+
+
+def summarize(runs: List[dict]) -> Dict[str, dict]:
+    """Mean response per block type over completed runs."""
+    by_block: Dict[str, list] = {}
+    for run in runs:
+        if run["complete"]:
+            by_block.setdefault(run["block"], []).append(run)
+
+    keys = [f"{m}_delta" for m in METRICS] + [f"{m}_settle_s" for m in METRICS] + ["vpd_slope_kpa_per_h"]
+    summary = {}
+    for block, block_runs in by_block.items():
+        table = np.array(
+            [[np.nan if run[k] is None else run[k] for k in keys] for run in block_runs], dtype=float
+        )
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN columns
+            means = np.nanmean(table, axis=0)
+        summary[block] = {"runs": len(block_runs)}
+        summary[block].update((k, None if np.isnan(v) else round(float(v), 4)) for k, v in zip(keys, means))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze baseline fan experiment blocks")
+    parser.add_argument("--device", default=fields.DEFAULT_DEVICE_ID)
+    parser.add_argument("--no-cache", action="store_true", help="recompute every run")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+
+    try:
+        runs = analyze(args.device, use_cache=not args.no_cache)
+        print(json.dumps(summarize(runs), indent=2))
+    finally:
+        storage.close_connection()
+
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,7 @@ BASELINE_BLOCKS = {
             "exhaust_fan": "OFF",
         },
     },
-    "CONTROL-INT": {
+    "CONTROL_INT": {
         "duration_min": 15,
         "fan_intent": {
             "circulation_fan": "OFF",
@@ -0,0 +1,213 @@
+# greenhouse_intelligence/baseline/scheduler.py
+
+"""
+Baseline fan schedule.
+
+BASELINE_SEQUENCE is validated and compiled once into a timeline of
+(offset, end, block, circulation PWM, exhaust PWM) segments. The
+schedule repeats from an anchor time, so the active block at any time
+t is found by taking (t - anchor) modulo the cycle length and
+bisecting the segment offsets. Nothing accumulates from tick to tick,
+so the schedule cannot drift however late or irregular the ticks are.
+
+The anchor is saved in runtime/baseline_schedule.json together with
+a fingerprint of the compiled timeline. After a restart the scheduler
+picks up wherever the wall clock says it should be. If the blocks were
+edited, the fingerprint no longer matches and a new cycle starts.
+
+Commands are written with command_dispatcher.update_commands (an
+atomic commands.json replace). control_mode/control_reason are
+written at the same time so that enriched samples carry the active
+block.
+"""
+
+import argparse
+import bisect
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+
+from greenhouse_gateway.atomic_file import atomic_write_text
+from greenhouse_gateway.control import command_dispatcher
+
+from .blocks import BASELINE_BLOCKS, BASELINE_SEQUENCE
+from .fan_ranges import FAN_RANGES
+
+logger = logging.getLogger("greenhouse_intelligence.baseline.scheduler")
+
+STATE_PATH = command_dispatcher.RUNTIME_DIR / "baseline_schedule.json"
+
+CONTROL_MODE = "baseline"
+
+# Fan -> commands.json key
+FAN_COMMANDS = {
+    "circulation_fan": "circulation_fan_pwm",
+    "exhaust_fan": "exhaust_fan_pwm",
+}
+
+
+class Segment(NamedTuple):
+    offset: float  # seconds from the start of the cycle
+    end: float
+    index: int     # position in the sequence
+    block: str
+    circulation_fan_pwm: int
+    exhaust_fan_pwm: int
+
+
+# ---------------------------------------------------------------------
+# Validation / compilation
+# ---------------------------------------------------------------------
+
+def intent_pwm(fan: str, intent: str) -> int:
+    """PWM for a fan intent: the middle of its FAN_RANGES band."""
+    lo, hi = FAN_RANGES[fan][intent]
+    return (lo + hi) // 2
+
+
+def validate(sequence=BASELINE_SEQUENCE, blocks=BASELINE_BLOCKS) -> List[str]:
+    """Every problem with the sequence/blocks, as readable messages."""
+    problems = []
+    if not sequence:
+        problems.append("sequence is empty")
+    for position, name in enumerate(sequence):
+        if name not in blocks:
+            problems.append(f"sequence[{position}]: unknown block {name!r}")
+    for name, block in blocks.items():
+        duration = block.get("duration_min")
+        if not isinstance(duration, (int, float)) or duration <= 0:
+            problems.append(f"{name}: duration_min must be a positive number, got {duration!r}")
+        intents = block.get("fan_intent", {})
+        for fan, intent in intents.items():
+            if fan not in FAN_COMMANDS:
+                problems.append(f"{name}: unknown fan {fan!r}")
+            elif intent not in FAN_RANGES.get(fan, {}):
+                problems.append(f"{name}: unknown {fan} intent {intent!r}")
+    return problems
+
+
+def compile_timeline(sequence=BASELINE_SEQUENCE, blocks=BASELINE_BLOCKS) -> List[Segment]:
+    """Validate the sequence and lay it out as back-to-back segments."""
+    problems = validate(sequence, blocks)
+    if problems:
+        raise ValueError("Invalid baseline schedule: " + "; ".join(problems))
+
+    segments = []
+    offset = 0.0
+    for index, name in enumerate(sequence):
+        block = blocks[name]
+        intents = block.get("fan_intent", {})
+        end = offset + block["duration_min"] * 60.0
+        segments.append(Segment(
+            offset, end, index, name,
+            intent_pwm("circulation_fan", intents.get("circulation_fan", "OFF")),
+            intent_pwm("exhaust_fan", intents.get("exhaust_fan", "OFF")),
+        ))
+        offset = end
+    return segments
+
+
+def fingerprint(segments: List[Segment]) -> str:
+    return hashlib.sha1(repr([tuple(s) for s in segments]).encode()).hexdigest()[:16]
+
+
+# ---------------------------------------------------------------------
+# Scheduler
+# ---------------------------------------------------------------------
+
+class BaselineScheduler:
+    def __init__(self, segments: Optional[List[Segment]] = None, state_path=STATE_PATH):
+        self.segments = segments if segments is not None else compile_timeline()
+        self._offsets = [s.offset for s in self.segments]
+        self.cycle_seconds = self.segments[-1].end
+        self.fingerprint = fingerprint(self.segments)
+        self.state_path = state_path
+        self.anchor = None
+        self._applied = None  # (cycle number, segment index) last written
+
+    def load(self) -> bool:
+        """Restore the saved anchor if it belongs to this timeline."""
+        try:
+            state = json.loads(self.state_path.read_text())
+            if state.get("fingerprint") != self.fingerprint:
+                return False
+            self.anchor = float(state["anchor"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+        return True
+
+    def load_or_start(self, now: Optional[float] = None) -> float:
+        """Resume the saved anchor if the timeline is unchanged, else start now."""
+        if self.load():
+            logger.info("Resuming baseline schedule anchored at %s",
+                        datetime.fromtimestamp(self.anchor).isoformat())
+            return self.anchor
+        return self.start(now)
+
+    def start(self, now: Optional[float] = None) -> float:
+        self.anchor = time.time() if now is None else now
+        self._applied = None
+        atomic_write_text(
+            self.state_path,
+            json.dumps({"anchor": self.anchor, "fingerprint": self.fingerprint}),
+            fsync=True,
+        )
+        logger.info("Starting baseline schedule (%d blocks, %.0f min cycle)",
+                    len(self.segments), self.cycle_seconds / 60)
+        return self.anchor
+
+    def locate(self, t: float):
+        """(cycle number, active segment, seconds until it ends) at time t."""
+        cycle, position = divmod(t - self.anchor, self.cycle_seconds)
+        segment = self.segments[bisect.bisect_right(self._offsets, position) - 1]
+        return int(cycle), segment, segment.end - position
+
+    def block_at(self, t: float) -> Segment:
+        return self.locate(t)[1]
+
+    def tick(self, now: Optional[float] = None) -> float:
+        """
+        Write the active block's commands if it changed since the last
+        tick. Returns seconds until the next block boundary.
+        """
+        if self.anchor is None:
+            self.load_or_start(now)
+        cycle, segment, remaining = self.locate(time.time() if now is None else now)
+        if self._applied != (cycle, segment.index):
+            command_dispatcher.update_commands({
+                "circulation_fan_pwm": segment.circulation_fan_pwm,
+                "exhaust_fan_pwm": segment.exhaust_fan_pwm,
+                "control_mode": CONTROL_MODE,
+                "control_reason": f"{segment.block} ({segment.index + 1}/{len(self.segments)})",
+            })
+            self._applied = (cycle, segment.index)
+            logger.info("Baseline block %s: circulation=%d exhaust=%d for %.0f s",
+                        segment.block, segment.circulation_fan_pwm, segment.exhaust_fan_pwm, remaining)
+        return remaining
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the compiled baseline schedule")
+    parser.add_argument("--restart", action="store_true", help="start a new cycle from now")
+    args = parser.parse_args()
+
+    scheduler = BaselineScheduler()
+    if args.restart:
+        scheduler.start()
+    elif not scheduler.load():
+        scheduler.anchor = time.time()  # preview only; nothing saved
+        print("No saved schedule; showing a cycle starting now")
+    anchor = scheduler.anchor
+    _, active, _ = scheduler.locate(time.time())
+    for s in scheduler.segments:
+        marker = "*" if s is active else " "
+        print(f"{marker} {s.offset / 60:7.0f}-{s.end / 60:<7.0f} {s.block:18} "
+              f"circ={s.circulation_fan_pwm:3d} exh={s.exhaust_fan_pwm:3d}")
+    print(f"anchor {datetime.fromtimestamp(anchor).isoformat()}, cycle {scheduler.cycle_seconds / 60:.0f} min")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# tests/conftest.py
+
+"""
+Shared fixtures. Like benchmarks/suite.py, every gateway file path is
+pointed at a temporary directory before anything opens it, so tests
+never touch db/greenhouse.db or runtime/.
+"""
+
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from greenhouse_gateway import fields  # noqa: E402
+from greenhouse_gateway.control import command_dispatcher  # noqa: E402
+from greenhouse_gateway.persist import history_ring, latest_state, rollups, storage  # noqa: E402
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Temporary gateway database, archive, snapshot and commands.json."""
+    monkeypatch.setattr(storage, "DB_PATH", tmp_path / "test.db")
+    monkeypatch.setattr(storage, "_schema_ready", False)
+    monkeypatch.setattr(rollups, "ARCHIVE_PATH", tmp_path / "test_archive.db")
+    monkeypatch.setattr(latest_state, "SNAPSHOT_PATH", tmp_path / "latest_packet.json")
+    monkeypatch.setattr(history_ring, "RUNTIME_DIR", tmp_path)
+    monkeypatch.setattr(command_dispatcher, "COMMANDS_PATH", tmp_path / "commands.json")
+    yield tmp_path
+    storage.close_connection()
+
+
+def sample(timestamp: datetime, device_id: str = fields.DEFAULT_DEVICE_ID, **values) -> dict:
+    """Minimal enriched packet for storage.insert_sensor_readings()."""
+    packet = {
+        "device_id": device_id,
+        "jetson_timestamp": timestamp.isoformat(),
+        "inside_temp_f": 70.0,
+        "inside_humidity_rh": 60.0,
+    }
+    packet.update(values)
+    return packet
+
+
+def write_samples(start: datetime, count: int, step: timedelta, devices=(fields.DEFAULT_DEVICE_ID,)) -> None:
+    """Insert `count` timestamps from `start` for each device and wait for the writer."""
+    storage.insert_sensor_readings(
+        sample(start + i * step, device_id, inside_temp_f=60.0 + i)
+        for i in range(count)
+        for device_id in devices
+    )
+    assert storage.flush(timeout=10)
+
+
+def count_rows(table: str = "samples") -> int:
+    """Rows committed to `table`, read on a separate connection."""
+    conn = sqlite3.connect(storage.DB_PATH)
+    try:
+        return conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+    finally:
+        conn.close()
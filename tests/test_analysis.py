@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+np = pytest.importorskip("numpy")
+from greenhouse_gateway.control import command_dispatcher  # noqa: E402
+from greenhouse_gateway.persist import storage  # noqa: E402
+from greenhouse_intelligence.baseline import analysis  # noqa: E402
+from greenhouse_intelligence.baseline.scheduler import CONTROL_MODE  # noqa: E402
+
+from conftest import sample  # noqa: E402
+
+START = datetime(2025, 6, 1)
+STEP = 60
+
+
+def _experiment():
+    """CONTROL at 70 F, then EXHAUST_HIGH cooling to 65 F in 9 minutes, then CONTROL."""
+    packets = []
+    t = START
+
+    def add(reason, temp, vpd):
+        nonlocal t
+        packets.append(sample(t, inside_temp_f=temp, inside_humidity_rh=50.0, inside_vpd_kpa=vpd,
+                              control_mode=CONTROL_MODE, control_reason=reason))
+        t += timedelta(seconds=STEP)
+
+    for _ in range(30):
+        add("CONTROL (1/3)", 70.0, 1.0)
+    for i in range(60):
+        add("EXHAUST_HIGH (2/3)", max(65.0, 70.0 - 0.5 * i), 1.0 + 0.2 * (i * STEP / 3600))
+    for _ in range(20):
+        add("CONTROL (3/3)", 70.0, 1.0)
+    return packets
+
+
+def _arrays(packets):
+    ts = [p["jetson_timestamp"] for p in packets]
+    arrays = {
+        "timestamp_utc": ts,
+        "ts": np.array(ts, dtype="datetime64[us]").astype(np.int64) / 1e6,
+        "reason": np.array([p["control_reason"] for p in packets], dtype=object),
+    }
+    for name in analysis.METRICS:
+        arrays[name] = np.array([p[name] for p in packets], dtype=float)
+    return arrays
+
+
+def test_compute_runs():
+    runs = analysis.compute_runs(_arrays(_experiment()), now=START.timestamp() + 10 ** 6)
+
+    assert [(r["block"], r["samples"], r["complete"]) for r in runs] == [
+        ("CONTROL", 30, True), ("EXHAUST_HIGH", 60, True), ("CONTROL", 20, True),
+    ]
+    exhaust = runs[1]
+    assert exhaust["inside_temp_f_level"] == 65.0
+    assert exhaust["inside_temp_f_delta"] == -5.0
+    assert exhaust["inside_temp_f_settle_s"] == 9 * STEP  # 65.5 F is within tolerance
+    assert exhaust["inside_humidity_rh_settle_s"] == 0
+    assert exhaust["vpd_slope_kpa_per_h"] == pytest.approx(0.2)
+    assert exhaust["control_start"] == runs[0]["start"]
+    assert runs[0]["inside_temp_f_delta"] is None  # nothing before the first control run
+
+
+def test_gap_splits_a_run_and_last_run_is_open():
+    packets = _experiment()[:40]
+    later = datetime.fromisoformat(packets[-1]["jetson_timestamp"]) + timedelta(hours=1)
+    packets.append(sample(later, inside_vpd_kpa=1.0, control_mode=CONTROL_MODE,
+                          control_reason="EXHAUST_HIGH (2/3)"))
+
+    runs = analysis.compute_runs(_arrays(packets), now=later.timestamp() + 10)
+
+    assert [(r["block"], r["samples"], r["complete"]) for r in runs] == [
+        ("CONTROL", 30, True), ("EXHAUST_HIGH", 10, True), ("EXHAUST_HIGH", 1, False),
+    ]
+
+
+def test_summarize_averages_completed_runs():
+    runs = analysis.compute_runs(_arrays(_experiment()), now=START.timestamp() + 10 ** 6)
+
+    summary = analysis.summarize(runs)
+
+    assert summary["CONTROL"]["runs"] == 2
+    assert summary["EXHAUST_HIGH"]["inside_temp_f_delta"] == -5.0
+
+
+def test_analyze_caches_completed_runs(workdir, monkeypatch):
+    monkeypatch.setattr(command_dispatcher, "RUNTIME_DIR", workdir)
+    storage.insert_sensor_readings(_experiment())
+    assert storage.flush(timeout=10)
+
+    first = analysis.analyze("esp32", now=START.timestamp() + 10 ** 6)
+    since = []
+    load = analysis.load_arrays
+
+    def spy(device_id, resume_from="", conn=None):
+        since.append(resume_from)
+        return load(device_id, resume_from, conn)
+
+    monkeypatch.setattr(analysis, "load_arrays", spy)
+    second = analysis.analyze("esp32", now=START.timestamp() + 10 ** 6)
+
+    assert second == first
+    assert since == [first[2]["start"]]  # only from the last control run on
+    assert analysis.analyze("esp32", now=START.timestamp() + 10 ** 6, use_cache=False) == first
@@ -0,0 +1,175 @@
+import json
+import queue
+
+import pytest
+
+from greenhouse_gateway.control import command_dispatcher
+
+
+@pytest.fixture
+def dispatcher(workdir, monkeypatch):
+    """Fresh dispatcher state; returns the list of (device_id, command) published."""
+    monkeypatch.setattr(command_dispatcher, "_last_sent", None)
+    monkeypatch.setattr(command_dispatcher, "_last_parsed", None)
+    monkeypatch.setattr(command_dispatcher, "_cache_key", None)
+    monkeypatch.setattr(command_dispatcher, "_cached_commands", dict(command_dispatcher.DEFAULT_COMMANDS))
+    monkeypatch.setattr(command_dispatcher, "_suspended", False)
+    monkeypatch.setattr(command_dispatcher, "_controller_context", {})
+    return []
+
+
+def _sync(sent):
+    command_dispatcher.check_and_send_commands(lambda cmd, device_id=None: sent.append((device_id, cmd)))
+
+
+def _write(commands):
+    command_dispatcher.write_commands(commands)
+
+
+def test_missing_file_is_created_with_defaults(dispatcher):
+    _sync(dispatcher)
+
+    assert dispatcher == [(None, command_dispatcher.DEFAULT_COMMANDS)]
+    assert json.loads(command_dispatcher.COMMANDS_PATH.read_text()) == command_dispatcher.DEFAULT_COMMANDS
+
+
+def test_only_changes_are_sent(dispatcher):
+    _write({"exhaust_fan_pwm": 100})
+    _sync(dispatcher)
+    _sync(dispatcher)
+    _write({"exhaust_fan_pwm": 100})  # rewritten, same content
+    _sync(dispatcher)
+    _write({"exhaust_fan_pwm": 120})
+    _sync(dispatcher)
+
+    assert dispatcher == [(None, {"exhaust_fan_pwm": 100}), (None, {"exhaust_fan_pwm": 120})]
+
+
+def test_unchanged_file_is_not_reparsed(dispatcher, monkeypatch):
+    _write({"exhaust_fan_pwm": 100})
+    first = command_dispatcher.get_current_commands()
+    monkeypatch.setattr(command_dispatcher.json, "loads", lambda text: pytest.fail("re-parsed"))
+
+    assert command_dispatcher.get_current_commands() == first
+
+
+def test_parse_error_keeps_the_last_good_commands(dispatcher):
+    _write({"exhaust_fan_pwm": 100})
+    _sync(dispatcher)
+    command_dispatcher.COMMANDS_PATH.write_text('{"exhaust_fan_pwm": ')
+    _sync(dispatcher)
+
+    assert dispatcher == [(None, {"exhaust_fan_pwm": 100})]
+    assert command_dispatcher.get_current_commands() == {"exhaust_fan_pwm": 100}
+
+
+def test_update_commands_merges_into_the_file(dispatcher):
+    _write({"exhaust_fan_pwm": 100, "grow_light_pwm": 255})
+
+    command_dispatcher.update_commands({"exhaust_fan_pwm": 0})
+
+    assert json.loads(command_dispatcher.COMMANDS_PATH.read_text()) == {"exhaust_fan_pwm": 0, "grow_light_pwm": 255}
+
+
+def test_watcher_dispatches_on_write(dispatcher, monkeypatch, workdir):
+    monkeypatch.setattr(command_dispatcher, "RUNTIME_DIR", workdir)
+    _write({"exhaust_fan_pwm": 100})
+    _sync(dispatcher)
+    sent = queue.Queue()
+    if not command_dispatcher.start_watcher(lambda cmd, device_id=None: sent.put(cmd)):
+        pytest.skip("inotify unavailable")
+    try:
+        _write({"exhaust_fan_pwm": 200})
+        assert sent.get(timeout=5) == {"exhaust_fan_pwm": 200}
+    finally:
+        command_dispatcher.stop_watcher()
+
+
+def test_initial_sync_sends_shared_then_overrides(dispatcher):
+    _write({
+        "exhaust_fan_pwm": 100,
+        "control_mode": "manual",
+        "controller": "file",
+        "devices": {"bench2": {"exhaust_fan_pwm": 150, "control_reason": "test"}},
+    })
+
+    _sync(dispatcher)
+
+    assert dispatcher == [
+        (None, {"exhaust_fan_pwm": 100}),
+        ("bench2", {"exhaust_fan_pwm": 150}),
+    ]
+
+
+def test_unchanged_file_is_not_resent(dispatcher):
+    _write({"exhaust_fan_pwm": 100, "devices": {"bench2": {"exhaust_fan_pwm": 150}}})
+    _sync(dispatcher)
+    dispatcher.clear()
+
+    _sync(dispatcher)
+
+    assert dispatcher == []
+
+
+def test_shared_change_reapplies_device_overrides(dispatcher):
+    _write({"exhaust_fan_pwm": 100, "devices": {"bench2": {"exhaust_fan_pwm": 150}}})
+    _sync(dispatcher)
+    dispatcher.clear()
+
+    # bench2's merged command is unchanged, but the shared topic reaches it too
+    _write({"exhaust_fan_pwm": 120, "devices": {"bench2": {"exhaust_fan_pwm": 150}}})
+    _sync(dispatcher)
+
+    assert dispatcher == [
+        (None, {"exhaust_fan_pwm": 120}),
+        ("bench2", {"exhaust_fan_pwm": 150}),
+    ]
+
+
+def test_override_change_sends_only_that_device(dispatcher):
+    _write({"exhaust_fan_pwm": 100, "devices": {"bench2": {"exhaust_fan_pwm": 150}, "bench3": {}}})
+    _sync(dispatcher)
+    dispatcher.clear()
+
+    _write({"exhaust_fan_pwm": 100, "devices": {"bench2": {"exhaust_fan_pwm": 200}, "bench3": {}}})
+    _sync(dispatcher)
+
+    assert dispatcher == [("bench2", {"exhaust_fan_pwm": 200})]
+
+
+def test_resume_resends_everything(dispatcher):
+    _write({"exhaust_fan_pwm": 100, "devices": {"bench2": {"exhaust_fan_pwm": 150}}})
+    _sync(dispatcher)
+    command_dispatcher.suspend()
+    _sync(dispatcher)
+    dispatcher.clear()
+
+    command_dispatcher.resume(lambda cmd, device_id=None: dispatcher.append((device_id, cmd)))
+
+    assert dispatcher == [
+        (None, {"exhaust_fan_pwm": 100}),
+        ("bench2", {"exhaust_fan_pwm": 150}),
+    ]
+
+
+def test_removed_override_sends_the_shared_command_to_that_device(dispatcher):
+    _write({"exhaust_fan_pwm": 100, "devices": {"bench2": {"exhaust_fan_pwm": 150}, "bench3": {}}})
+    _sync(dispatcher)
+    dispatcher.clear()
+
+    _write({"exhaust_fan_pwm": 100, "devices": {"bench3": {}}})
+    _sync(dispatcher)
+    _sync(dispatcher)
+
+    assert dispatcher == [("bench2", {"exhaust_fan_pwm": 100})]
+
+
+def test_removed_override_is_covered_by_a_shared_change(dispatcher):
+    _write({"exhaust_fan_pwm": 100, "devices": {"bench2": {"exhaust_fan_pwm": 150}}})
+    _sync(dispatcher)
+    dispatcher.clear()
+
+    _write({"exhaust_fan_pwm": 120})
+    _sync(dispatcher)
+
+    assert dispatcher == [(None, {"exhaust_fan_pwm": 120})]
@@ -0,0 +1,78 @@
+from datetime import datetime
+
+import pytest
+
+from greenhouse_gateway.ingest import dedup
+from greenhouse_gateway.persist import storage
+
+from conftest import count_rows, sample
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(dedup, "_recent", dedup.OrderedDict())
+    monkeypatch.setattr(dedup, "_last_timestamp", {})
+    monkeypatch.setattr(dedup, "_stats", {"hits": 0, "misses": 0, "timestamp_bumps": 0})
+
+
+def test_redelivered_packet_is_dropped():
+    packet = {"device_id": "esp32", "esp32_runtime_ms": 1000, "inside_temp_f": 70.0}
+
+    assert dedup.check_packet(dict(packet))
+    assert not dedup.check_packet(dict(packet))
+    assert dedup.check_packet(dict(packet, esp32_runtime_ms=2000))
+    assert dedup.get_stats() == {"hits": 1, "misses": 2, "timestamp_bumps": 0, "cache_size": 2}
+
+
+def test_packet_key_ignores_a_stamped_key():
+    packet = {"device_id": "esp32", "esp32_runtime_ms": 1000}
+    key = dedup.packet_key(packet)
+
+    assert dedup.packet_key(dict(packet, packet_key="stale")) == key
+
+
+def test_expired_keys_are_forgotten(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(dedup.time, "monotonic", lambda: clock[0])
+    packet = {"device_id": "esp32", "esp32_runtime_ms": 1000}
+    assert dedup.check_packet(dict(packet))
+
+    clock[0] += dedup.CACHE_TTL + 1
+
+    assert dedup.check_packet(dict(packet))
+
+
+def test_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(dedup, "CACHE_SIZE", 3)
+    for runtime in range(10):
+        dedup.check_packet({"esp32_runtime_ms": runtime})
+
+    assert dedup.get_stats()["cache_size"] <= 4
+
+
+def test_colliding_timestamps_are_bumped_by_a_microsecond():
+    ts = "2025-01-01T00:00:00.000000"
+
+    assert dedup.unique_timestamp("esp32", ts) == ts
+    assert dedup.unique_timestamp("esp32", ts) == "2025-01-01T00:00:00.000001"
+    assert dedup.unique_timestamp("esp32", ts) == "2025-01-01T00:00:00.000002"
+    # Another device keeps its own timeline
+    assert dedup.unique_timestamp("bench2", ts) == ts
+    assert dedup.get_stats()["timestamp_bumps"] == 2
+
+
+def test_older_timestamps_are_left_alone():
+    dedup.unique_timestamp("esp32", "2025-01-01T00:00:01.000000")
+
+    # More than 1 ms behind: a replayed or late packet, not a collision
+    assert dedup.unique_timestamp("esp32", "2025-01-01T00:00:00.000000") == "2025-01-01T00:00:00.000000"
+
+
+def test_database_skips_replays_the_cache_missed(workdir, monkeypatch):
+    monkeypatch.setattr(storage, "_write_stats", dict.fromkeys(storage._write_stats, 0))
+    packet = sample(datetime(2025, 1, 1), packet_key="abc")
+    storage.insert_sensor_readings([packet, dict(packet), sample(datetime(2025, 1, 1, 0, 0, 1), packet_key="abc")])
+    assert storage.flush(timeout=10)
+
+    assert count_rows() == 1
+    assert storage.get_write_stats()["conflicts"] == 2
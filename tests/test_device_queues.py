@@ -0,0 +1,58 @@
+import threading
+
+from greenhouse_gateway.ingest.device_queues import DeviceQueues
+
+
+def test_drain_is_round_robin_across_devices():
+    queues = DeviceQueues(maxsize=10)
+    for i in range(5):
+        queues.put("busy", ("busy", i))
+    queues.put("quiet", ("quiet", 0))
+
+    assert queues.drain(timeout=0, max_items=3) == [("busy", 0), ("quiet", 0), ("busy", 1)]
+    assert queues.depths() == {"busy": 3, "quiet": 0}
+    assert queues.depth() == 3
+
+
+def test_drop_oldest_only_affects_the_full_device():
+    queues = DeviceQueues(maxsize=2, policy="drop_oldest")
+    queues.put("a", 1)
+    queues.put("a", 2)
+    queues.put("b", 1)
+
+    assert not queues.put("a", 3)
+    assert queues.dropped == {"a": 1}
+    assert queues.drain(timeout=0, max_items=10) == [2, 1, 3]
+
+
+def test_drop_newest_keeps_the_queue():
+    queues = DeviceQueues(maxsize=1, policy="drop_newest")
+    queues.put("a", 1)
+
+    assert not queues.put("a", 2)
+    assert queues.drain(timeout=0, max_items=10) == [1]
+
+
+def test_block_waits_for_space():
+    queues = DeviceQueues(maxsize=1, policy="block", block_timeout=5.0)
+    queues.put("a", 1)
+    result = []
+    producer = threading.Thread(target=lambda: result.append(queues.put("a", 2)))
+    producer.start()
+
+    assert queues.drain(timeout=1, max_items=1) == [1]
+    producer.join(timeout=5)
+    assert result == [True]
+    assert queues.drain(timeout=1, max_items=1) == [2]
+
+
+def test_block_gives_up_after_the_timeout():
+    queues = DeviceQueues(maxsize=1, policy="block", block_timeout=0.05)
+    queues.put("a", 1)
+
+    assert not queues.put("a", 2)
+    assert queues.dropped == {"a": 1}
+
+
+def test_drain_times_out_when_empty():
+    assert DeviceQueues(maxsize=1).drain(timeout=0.01, max_items=5) == []
@@ -0,0 +1,93 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from greenhouse_gateway.enrich import pipeline
+
+NOON = datetime(2026, 1, 1, 12, 0, 30)
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """An empty provider registry; the built-in providers are left alone."""
+    monkeypatch.setattr(pipeline, "_providers", [])
+    monkeypatch.setattr(pipeline, "_states", {})
+    monkeypatch.setattr(pipeline, "_stats", {})
+    monkeypatch.setattr(pipeline, "_merged", None)
+    monkeypatch.setattr(pipeline, "_plugins_loaded", True)
+    monkeypatch.setattr(pipeline, "_executor", None)
+    yield
+    pipeline.shutdown()
+
+
+def _counting(calls, **values):
+    def func(now):
+        calls.append(now)
+        return dict(values, minute=now.minute)
+    return func
+
+
+def test_result_is_reused_until_it_expires(registry):
+    calls = []
+    pipeline.register("clock", _counting(calls), ("minute",), valid_until=pipeline.next_minute, timeout=None)
+
+    assert pipeline.context(NOON) == {"minute": 0}
+    assert pipeline.context(NOON + timedelta(seconds=20)) == {"minute": 0}
+    assert len(calls) == 1
+
+    assert pipeline.context(NOON + timedelta(seconds=30)) == {"minute": 1}
+    # Going back before the computed-for time (a replay) refreshes too
+    assert pipeline.context(NOON - timedelta(hours=1)) == {"minute": 0}
+    assert len(calls) == 3
+
+
+def test_failing_provider_gives_nulls_until_the_retry(registry):
+    calls = []
+
+    def broken(now):
+        calls.append(now)
+        raise RuntimeError("no data")
+
+    pipeline.register("broken", broken, ("a", "b"), timeout=None)
+
+    assert pipeline.context(NOON) == {"a": None, "b": None}
+    assert pipeline.context(NOON + timedelta(seconds=pipeline.RETRY_SECONDS - 1)) == {"a": None, "b": None}
+    assert len(calls) == 1
+    pipeline.context(NOON + timedelta(seconds=pipeline.RETRY_SECONDS))
+    assert len(calls) == 2
+    assert pipeline.get_stats()["broken"] == {"calls": 2, "errors": 2, "timeouts": 0}
+
+
+def test_slow_provider_keeps_previous_values(registry):
+    release = threading.Event()
+    calls = []
+
+    def slow(now):
+        calls.append(now)
+        if len(calls) > 1:
+            release.wait(5)
+        return {"forecast": len(calls)}
+
+    pipeline.register("slow", slow, ("forecast",), valid_until=pipeline.every(10), timeout=0.05)
+    assert pipeline.context(NOON) == {"forecast": 1}
+
+    # Expired, and the refresh times out: the last values stay
+    assert pipeline.context(NOON + timedelta(seconds=10)) == {"forecast": 1}
+    assert pipeline.context(NOON + timedelta(seconds=11)) == {"forecast": 1}
+    assert len(calls) == 2  # no second call while one is pending
+
+    release.set()
+    pipeline._states["slow"].pending[0].result(timeout=5)
+    assert pipeline.context(NOON + timedelta(seconds=12)) == {"forecast": 2}
+    assert pipeline.get_stats()["slow"]["timeouts"] == 1
+
+
+def test_fields_cannot_be_claimed_twice(registry):
+    pipeline.register("first", lambda now: {}, ("a",), timeout=None)
+
+    with pytest.raises(ValueError, match="redeclares"):
+        pipeline.register("second", lambda now: {}, ("a", "b"), timeout=None)
+    # Re-registering under the same name replaces the provider
+    pipeline.register("first", lambda now: {"a": 1}, ("a",), timeout=None)
+    assert pipeline.context(NOON) == {"a": 1}
@@ -0,0 +1,50 @@
+import sqlite3
+
+from greenhouse_gateway import fields
+from greenhouse_gateway.persist import storage
+
+
+def test_samples_columns_match_the_schema(workdir):
+    conn = sqlite3.connect(workdir / "schema.db")
+    conn.executescript(storage.SCHEMA_PATH.read_text())
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(samples)")]
+    conn.close()
+
+    assert list(fields.SAMPLES_COLUMNS) == [c for c in columns if c in fields.SAMPLES_COLUMNS]
+    assert set(fields.SAMPLES_COLUMNS) <= set(columns)
+
+
+def test_normalize_packet_keeps_sensor_fields_only():
+    normalized = fields.normalize_packet({
+        "jetson_timestamp": "2025-01-01T00:00:00",
+        "inside_temp_f": 71.5,
+        "unexpected": 1,
+    })
+
+    assert set(normalized) == {f.name for f in fields.SENSOR_FIELDS}
+    assert normalized["jetson_timestamp"] == "2025-01-01T00:00:00"
+    assert normalized["inside_temp_f"] == 71.5
+    assert normalized["wifi_rssi"] is None
+
+
+def test_normalize_packet_stamps_missing_timestamp():
+    assert fields.normalize_packet({})["jetson_timestamp"]
+
+
+def test_sample_row_follows_column_order():
+    packet = {f.name: i for i, f in enumerate(fields.FIELDS)}
+
+    assert fields.sample_row(packet) == tuple(range(len(fields.FIELDS)))
+
+
+def test_sheets_sample_maps_sheets_fields():
+    payload = fields.sheets_sample({"inside_temp_f": 70.0, "tsl_infrared": 5})
+
+    assert payload["type"] == "sample"
+    assert payload["inside_temp_f"] == 70.0
+    assert "tsl_infrared" not in payload
+    assert set(payload) == {"type", *fields.SHEETS_FIELDS}
+
+
+def test_unknown_fields():
+    assert fields.unknown_fields(["inside_temp_f", "inside_temp"]) == ["inside_temp"]
@@ -0,0 +1,43 @@
+import json
+
+from benchmarks.generator import PacketGenerator
+from greenhouse_gateway.ingest import validation
+
+
+def _messages(gen, count):
+    return [gen.next_message() for _ in range(count)]
+
+
+def test_same_seed_same_stream():
+    kwargs = dict(devices=3, missing_fraction=0.2, malformed_fraction=0.1, seed=7)
+
+    assert _messages(PacketGenerator(**kwargs), 200) == _messages(PacketGenerator(**kwargs), 200)
+    assert _messages(PacketGenerator(**kwargs), 50) != _messages(PacketGenerator(**dict(kwargs, seed=8)), 50)
+
+
+def test_devices_take_turns():
+    topics = [topic for topic, _ in _messages(PacketGenerator(devices=3), 6)]
+
+    assert topics == [f"greenhouse/bench{i}/sensors" for i in (1, 2, 3, 1, 2, 3)]
+
+
+def test_well_formed_packets_pass_validation(workdir, monkeypatch):
+    invalid = []
+    monkeypatch.setattr(validation, "_record", lambda packet, errors, action: invalid.append(errors))
+    gen = PacketGenerator(devices=2, seed=3)
+
+    for _, payload in _messages(gen, 500):
+        validation.validate_packet(json.loads(payload))
+
+    assert invalid == []
+
+
+def test_missing_sensors_drop_their_fields():
+    gen = PacketGenerator(missing_fraction=1.0)
+
+    packet = gen.packet("bench1")
+
+    assert not packet["sensor_sht4_ok"]
+    assert "inside_temp_f" not in packet
+    assert "tsl_full_spectrum" not in packet
+    assert packet["esp32_runtime_ms"] == 5000
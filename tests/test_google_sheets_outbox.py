@@ -0,0 +1,201 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from greenhouse_gateway.publish import google_sheets
+from greenhouse_gateway.persist import storage
+
+# The outbox fixture replaces the worker loop; its own test runs it
+_upload_loop = google_sheets._upload_loop
+
+
+@pytest.fixture
+def outbox(workdir, monkeypatch):
+    """Outbox on the temporary database, drained by hand instead of by the worker thread."""
+    monkeypatch.setattr(google_sheets, "_upload_loop", lambda: None)
+    monkeypatch.setattr(google_sheets, "BATCH_UPLOAD", True)
+    monkeypatch.setattr(google_sheets, "OUTBOX_BATCH_SIZE", 50)
+    monkeypatch.setattr(google_sheets, "_stats", dict(
+        google_sheets._stats, depth=0, uploaded=0, failed=0, dead_lettered=0,
+    ))
+    posted = []
+    yield posted
+    google_sheets.shutdown()
+
+
+def _respond(monkeypatch, posted, answer):
+    """Replace _post: answer(payloads) -> (error, rejected)."""
+    def post(batch):
+        payloads = [p for day in batch["days"] for p in day["samples"] + day["summaries"]]
+        posted.append([p["n"] for p in payloads])
+        return answer(payloads)
+    monkeypatch.setattr(google_sheets, "_post", post)
+
+
+def _queue(*numbers, bad=()):
+    for n in numbers:
+        google_sheets._enqueue_upload({
+            "type": "sample",
+            "local_time": "2026-10-17T10:00:00",
+            "n": n,
+            "bad": n in bad,
+        })
+
+
+def _query(sql):
+    conn = sqlite3.connect(storage.DB_PATH)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def _rows():
+    return _query(
+        "SELECT json_extract(payload, '$.n'), attempts, next_attempt_at FROM sheets_outbox ORDER BY id"
+    )
+
+
+def _make_due():
+    with google_sheets._outbox_lock, google_sheets._outbox_conn:
+        google_sheets._outbox_conn.execute("UPDATE sheets_outbox SET next_attempt_at = 0")
+
+
+def test_upload_sends_batch_and_empties_outbox(outbox, monkeypatch):
+    _respond(monkeypatch, outbox, lambda payloads: (None, False))
+    _queue(1, 2, 3)
+
+    google_sheets._drain_outbox()
+
+    assert outbox == [[1, 2, 3]]
+    assert _rows() == []
+    assert google_sheets.get_outbox_stats()["uploaded"] == 3
+
+
+def test_unreachable_endpoint_backs_off_exponentially(outbox, monkeypatch):
+    _respond(monkeypatch, outbox, lambda payloads: ("ConnectionError: down", False))
+    _queue(1, 2)
+
+    first = google_sheets._drain_outbox()
+    _make_due()
+    second = google_sheets._drain_outbox()
+
+    assert first == pytest.approx(google_sheets.RETRY_BASE_SECONDS)
+    assert second == pytest.approx(min(google_sheets.RETRY_MAX_SECONDS, 2 * google_sheets.RETRY_BASE_SECONDS))
+    # Nothing is split or dropped while the endpoint is down
+    assert outbox == [[1, 2], [1, 2]]
+    assert [(n, attempts) for n, attempts, _ in _rows()] == [(1, 2), (2, 2)]
+
+    _respond(monkeypatch, outbox, lambda payloads: (None, False))
+    _make_due()
+    google_sheets._drain_outbox()
+    assert _rows() == []
+
+
+def test_rejected_payload_is_isolated_from_the_batch(outbox, monkeypatch):
+    _respond(monkeypatch, outbox, lambda payloads: (
+        ("HTTP 200: INVALID: bad row", True) if any(p["bad"] for p in payloads) else (None, False)
+    ))
+    _queue(1, 2, 3, 4, bad=(3,))
+
+    google_sheets._drain_outbox()
+
+    assert outbox == [[1, 2, 3, 4], [1, 2], [3, 4], [3], [4]]
+    assert [(n, attempts) for n, attempts, _ in _rows()] == [(3, 1)]
+    assert google_sheets.get_outbox_stats()["uploaded"] == 3
+
+
+def test_rejected_payload_is_dead_lettered_after_max_attempts(outbox, monkeypatch):
+    monkeypatch.setattr(google_sheets, "MAX_ATTEMPTS", 2)
+    _respond(monkeypatch, outbox, lambda payloads: (
+        ("HTTP 400: bad request", True) if any(p["bad"] for p in payloads) else (None, False)
+    ))
+    _queue(1, bad=(1,))
+
+    google_sheets._drain_outbox()
+    assert [(n, attempts) for n, attempts, _ in _rows()] == [(1, 1)]
+    _make_due()
+    google_sheets._drain_outbox()
+
+    assert _rows() == []
+    failed = _query("SELECT json_extract(payload, '$.n'), attempts, last_error FROM sheets_failed")
+    assert failed == [(1, 2, "HTTP 400: bad request")]
+    stats = google_sheets.get_outbox_stats()
+    assert stats["dead_lettered"] == 1
+    assert stats["depth"] == 0
+
+
+def test_transient_failure_during_bisection_keeps_the_rest_queued(outbox, monkeypatch):
+    def answer(payloads):
+        if len(payloads) == 4:
+            return "HTTP 200: INVALID: bad row", True
+        return "HTTP 503: unavailable", False
+    _respond(monkeypatch, outbox, answer)
+    _queue(1, 2, 3, 4, bad=(3,))
+
+    google_sheets._drain_outbox()
+
+    assert outbox == [[1, 2, 3, 4], [1, 2]]
+    assert [(n, attempts) for n, attempts, _ in _rows()] == [(1, 1), (2, 1), (3, 1), (4, 1)]
+
+
+@pytest.mark.parametrize("status, text, rejected", [
+    (200, "INVALID: Unsupported batch version: 2", True),
+    (200, "ERROR: Exception: Service invoked too many times", False),
+    (200, "ERROR: Lock timeout", False),
+    (400, "Bad Request", True),
+    (429, "Too Many Requests", False),
+    (503, "Service Unavailable", False),
+])
+def test_only_payload_errors_count_as_rejections(monkeypatch, status, text, rejected):
+    class Session:
+        def post(self, url, json, timeout):
+            return type("Response", (), {"status_code": status, "text": text})()
+    monkeypatch.setattr(google_sheets, "_session", Session())
+
+    error, was_rejected = google_sheets._post({"type": "batch"})
+
+    assert error == f"HTTP {status}: {text}"
+    assert was_rejected is rejected
+
+
+def test_enqueue_does_not_cut_an_outage_backoff_short(outbox, monkeypatch):
+    calls = []
+
+    def drain():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            google_sheets._outage_until = time.time() + 0.3
+            return 0.3
+        google_sheets._stop.set()
+        return 0.0
+    monkeypatch.setattr(google_sheets, "_drain_outbox", drain)
+    monkeypatch.setattr(google_sheets, "_outage_until", 0.0)
+    google_sheets._stop.clear()
+
+    worker = threading.Thread(target=_upload_loop)
+    worker.start()
+    for _ in range(5):
+        time.sleep(0.02)
+        google_sheets._wake.set()  # what _enqueue_upload does
+    worker.join(timeout=5)
+
+    assert len(calls) == 2
+    assert calls[1] - calls[0] >= 0.25
+
+
+def test_build_batch_groups_payloads_by_day():
+    batch = google_sheets._build_batch([
+        {"type": "sample", "local_time": "2026-10-16T23:55:00"},
+        {"type": "sample", "local_time": "2026-10-17T00:05:00"},
+        {"type": "summary", "date": "2026-10-16"},
+    ])
+
+    assert batch["type"] == "batch"
+    assert batch["version"] == google_sheets.BATCH_PROTOCOL_VERSION
+    assert [(day["date"], len(day["samples"]), len(day["summaries"])) for day in batch["days"]] == [
+        ("2026-10-16", 1, 1),
+        ("2026-10-17", 1, 0),
+    ]
@@ -0,0 +1,88 @@
+import math
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+np = pytest.importorskip("numpy")
+from greenhouse_gateway.persist import history_ring  # noqa: E402
+
+from conftest import sample  # noqa: E402
+
+START = datetime(2025, 1, 1)
+
+
+@pytest.fixture
+def ring(workdir):
+    yield
+    history_ring.close()
+
+
+def _append(count, device_id="esp32", start=START):
+    for i in range(count):
+        history_ring.append(sample(start + timedelta(seconds=5 * i), device_id, inside_temp_f=float(i)))
+
+
+def _reader(device_id="esp32"):
+    return history_ring.RingReader(history_ring.ring_path(device_id))
+
+
+def test_reader_sees_appended_samples_oldest_first(ring):
+    _append(5)
+
+    reader = _reader()
+    rows = reader.latest()
+
+    assert reader.cursor == 5
+    assert list(rows["inside_temp_f"]) == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert rows["timestamp"][0] == START.replace(tzinfo=timezone.utc).timestamp()
+    assert math.isnan(rows["grow_light_pwm"][0])  # missing values are NaN
+    assert list(reader.latest(2)["inside_temp_f"]) == [3.0, 4.0]
+
+
+def test_ring_wraps_at_capacity(ring):
+    writer = history_ring.RingWriter(history_ring.ring_path("small"), capacity=4)
+    for i in range(10):
+        writer.append(sample(START + timedelta(seconds=i), "small", inside_temp_f=float(i)))
+
+    reader = _reader("small")
+    assert reader.cursor == 10
+    # The slot after the newest may be mid-write, so the oldest one is dropped
+    assert list(reader.latest()["inside_temp_f"]) == [7.0, 8.0, 9.0]
+    writer.close()
+
+
+def test_window_selects_by_time(ring):
+    _append(20)  # 5 s apart
+
+    rows = _reader().window(30)
+
+    assert list(rows["inside_temp_f"]) == [13.0, 14.0, 15.0, 16.0, 17.0, 18.0, 19.0]
+
+
+def test_devices_get_separate_rings(ring):
+    _append(3, "esp32")
+    _append(2, "bench2")
+
+    assert _reader("esp32").cursor == 3
+    assert _reader("bench2").cursor == 2
+
+
+def test_reopened_ring_continues_at_its_cursor(ring):
+    _append(3)
+    history_ring.close()
+
+    _append(2, start=START + timedelta(minutes=1))
+
+    assert list(_reader().latest()["inside_temp_f"]) == [0.0, 1.0, 2.0, 0.0, 1.0]
+
+
+def test_ring_with_another_layout_is_recreated(ring):
+    writer = history_ring.RingWriter(history_ring.ring_path("esp32"), capacity=8)
+    writer.append(sample(START))
+    writer.close()
+
+    _append(1)
+
+    reader = _reader()
+    assert reader.capacity == history_ring.CAPACITY
+    assert reader.cursor == 1
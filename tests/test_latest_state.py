@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from greenhouse_gateway.persist import latest_state
+
+
+@pytest.fixture
+def state(workdir, monkeypatch):
+    monkeypatch.setattr(latest_state, "_latest", None)
+    monkeypatch.setattr(latest_state, "_updated_at", None)
+    monkeypatch.setattr(latest_state, "_dirty", False)
+    monkeypatch.setattr(latest_state, "_last_write", float("-inf"))
+    monkeypatch.setattr(latest_state, "SNAPSHOT_INTERVAL", 3600)
+
+
+def _snapshot():
+    return json.loads(latest_state.SNAPSHOT_PATH.read_text())
+
+
+def test_nothing_before_the_first_packet(state):
+    assert latest_state.get_latest() is None
+    assert latest_state.get_age_seconds() is None
+
+
+def test_snapshot_writes_are_rate_limited(state):
+    latest_state.update({"n": 1})
+    latest_state.update({"n": 2})
+
+    assert latest_state.get_latest() == {"n": 2}
+    assert _snapshot() == {"n": 1}  # second write coalesced into the next flush
+
+    latest_state.flush_snapshot(force=True)
+    assert _snapshot() == {"n": 2}
+
+
+def test_clean_snapshot_is_not_rewritten(state):
+    latest_state.update({"n": 1})
+    latest_state.SNAPSHOT_PATH.unlink()
+
+    latest_state.flush_snapshot(force=True)
+
+    assert not latest_state.SNAPSHOT_PATH.exists()
+
+
+def test_get_latest_returns_a_copy(state):
+    latest_state.update({"n": 1})
+    latest_state.get_latest()["n"] = 99
+
+    assert latest_state.get_latest() == {"n": 1}
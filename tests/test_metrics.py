@@ -0,0 +1,67 @@
+import pytest
+
+from greenhouse_gateway import metrics
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(metrics, "_histograms", {stage: metrics.Histogram() for stage in metrics.STAGES})
+    monkeypatch.setattr(metrics, "_counters", {})
+    monkeypatch.setattr(metrics, "_gauges", {})
+
+
+def test_histogram_quantile_is_a_bucket_bound():
+    hist = metrics.Histogram(buckets=(0.001, 0.01, 0.1))
+    for value in [0.0005] * 90 + [0.05] * 10:
+        hist.observe(value)
+
+    assert hist.quantile(0.5) == 0.001
+    assert hist.quantile(0.95) == 0.1
+    assert metrics.Histogram().quantile(0.5) is None
+
+
+def test_values_on_a_bound_fall_in_that_bucket():
+    hist = metrics.Histogram(buckets=(0.001, 0.01))
+    hist.observe(0.001)
+    hist.observe(1.0)
+
+    assert hist.snapshot()[0] == [1, 0, 1]
+
+
+def test_summary(registry):
+    metrics.observe("validate", 0.002)
+    metrics.observe("validate", 0.004)
+    metrics.inc("packets")
+    metrics.inc("packets", 2)
+    metrics.register_gauge("queue_depth", lambda: 3)
+    metrics.register_gauge("broken", lambda: 1 / 0)
+
+    summary = metrics.summary()
+
+    assert summary["stages"] == {"validate": {"count": 2, "mean_ms": 3.0, "p95_ms": 5.0}}
+    assert summary["counters"] == {"packets": 3}
+    assert summary["gauges"] == {"queue_depth": 3}
+
+
+def test_render_prometheus(registry):
+    metrics.observe("dedup", 0.00002)
+    metrics.inc("dropped")
+    metrics.register_gauge("device_queue_depth", lambda: {"bench2": 4, "esp32": 0})
+
+    text = metrics.render_prometheus()
+
+    assert 'greenhouse_stage_seconds_bucket{stage="dedup",le="1e-05"} 0' in text
+    assert 'greenhouse_stage_seconds_bucket{stage="dedup",le="2.5e-05"} 1' in text
+    assert 'greenhouse_stage_seconds_bucket{stage="dedup",le="+Inf"} 1' in text
+    assert 'greenhouse_stage_seconds_count{stage="dedup"} 1' in text
+    assert "greenhouse_dropped_total 1" in text
+    assert 'greenhouse_device_queue_depth{device="bench2"} 4' in text
+    assert text.endswith("\n")
+
+
+def test_device_label_values_are_escaped(registry):
+    metrics.register_gauge("device_queue_depth", lambda: {'a\\b"c\nd': 1})
+
+    text = metrics.render_prometheus()
+
+    assert 'greenhouse_device_queue_depth{device="a\\\\b\\"c\\nd"} 1' in text
@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from greenhouse_gateway.persist import rollups, storage
+
+from conftest import write_samples
+
+pq = pytest.importorskip("pyarrow.parquet")
+from greenhouse_gateway.persist import parquet_export  # noqa: E402
+
+
+@pytest.fixture
+def exports(workdir, monkeypatch):
+    export_dir = workdir / "exports" / "samples"
+    monkeypatch.setattr(parquet_export, "EXPORT_DIR", export_dir)
+    monkeypatch.setattr(parquet_export, "STATE_PATH", export_dir / "_export_state.json")
+    monkeypatch.setattr(rollups, "RAW_RETENTION_DAYS", 30.0)
+    monkeypatch.setattr(rollups, "RAW_ARCHIVE", True)
+    return export_dir
+
+
+def _day_start(days_ago: int) -> datetime:
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=days_ago)
+
+
+def _exported_rows(day: datetime) -> int:
+    return pq.ParquetFile(parquet_export._partition_path(day.date().isoformat())).metadata.num_rows
+
+
+def _write_old_day_and_today():
+    old = _day_start(40)
+    write_samples(old, 24, timedelta(hours=1))
+    # The newest row is never pruned, so keep one from today
+    write_samples(_day_start(0), 1, timedelta(hours=1))
+    return old
+
+
+def test_prune_does_not_shrink_an_exported_day(exports):
+    old = _write_old_day_and_today()
+    assert parquet_export.export()[old.date().isoformat()] == 24
+
+    # A retention run that stops partway through the day
+    removed = rollups.prune_raw(now=old + timedelta(days=rollups.RAW_RETENTION_DAYS, hours=12))
+    assert removed == 12
+
+    assert old.date().isoformat() not in parquet_export.export()
+    assert old.date().isoformat() not in parquet_export.export(full=True)
+    assert _exported_rows(old) == 24
+
+
+def test_shrunken_recent_day_keeps_its_export_without_state(exports):
+    day = _day_start(1)
+    write_samples(day, 10, timedelta(minutes=10))
+    write_samples(_day_start(0), 1, timedelta(hours=1))
+    parquet_export.export()
+
+    conn = storage.get_connection()
+    with conn:
+        conn.execute("DELETE FROM samples WHERE timestamp_utc < ?", ((day + timedelta(minutes=30)).isoformat(),))
+    parquet_export.STATE_PATH.unlink()  # fall back to the Parquet footer
+
+    assert day.date().isoformat() not in parquet_export.export()
+    assert _exported_rows(day) == 10
+
+
+def test_recent_day_is_reexported_when_it_grows(exports):
+    day = _day_start(1)
+    write_samples(day, 5, timedelta(minutes=10))
+    parquet_export.export()
+
+    write_samples(day + timedelta(hours=1), 5, timedelta(minutes=10))
+
+    assert parquet_export.export() == {day.date().isoformat(): 10}
+    assert parquet_export.export() == {}
@@ -0,0 +1,140 @@
+import json
+import queue
+import threading
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer
+from urllib.parse import urlencode
+
+import pytest
+
+from greenhouse_gateway.publish import read_api
+
+from conftest import write_samples
+
+START = datetime(2025, 3, 1)
+DEVICES = ("bench2", "esp32")
+COUNT = 5  # timestamps per device
+
+
+@pytest.fixture
+def api(workdir, monkeypatch):
+    """Read API on a free port over COUNT samples per device; returns get(path, params, headers)."""
+    write_samples(START, COUNT, timedelta(minutes=1), devices=DEVICES)
+    monkeypatch.setattr(read_api, "_pool", queue.LifoQueue())
+    monkeypatch.setattr(read_api, "_cache", OrderedDict())
+    server = ThreadingHTTPServer(("127.0.0.1", 0), read_api._ApiHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def get(path, params=None, headers=None):
+        url = f"http://127.0.0.1:{server.server_port}{path}?{urlencode(params or {})}"
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url, headers=headers or {})) as resp:
+                return resp.status, dict(resp.headers), resp.read()
+        except urllib.error.HTTPError as e:
+            return e.code, dict(e.headers), e.read()
+
+    yield get
+    server.shutdown()
+    server.server_close()
+    read_api._close_pool()
+
+
+RANGE = {"start": START.isoformat(), "end": (START + timedelta(hours=1)).isoformat()}
+
+
+def _pages(get, limit, **params):
+    params = dict(RANGE, fields="inside_temp_f", limit=limit, **params)
+    pages = []
+    while True:
+        status, _, body = get("/samples", params)
+        assert status == 200
+        page = json.loads(body)
+        pages.append(page["rows"])
+        if page["next"] is None:
+            return pages
+        params["after"] = page["next"]
+
+
+def test_samples_pages_cover_the_range_once_in_order(api):
+    pages = _pages(api, 3)
+
+    assert [len(page) for page in pages] == [3, 3, 3, 1]
+    keys = [(row["timestamp_utc"], row["device_id"]) for page in pages for row in page]
+    assert keys == sorted(keys)
+    assert len(set(keys)) == COUNT * len(DEVICES)
+
+
+def test_page_boundary_between_devices_at_one_timestamp(api):
+    # limit=1 puts a page break between the two devices of every timestamp
+    pages = _pages(api, 1)
+
+    assert len(pages) == COUNT * len(DEVICES)
+    assert [page[0]["device_id"] for page in pages[:2]] == list(DEVICES)
+
+
+def test_device_filter(api):
+    pages = _pages(api, 100, device="bench2")
+
+    assert len(pages) == 1
+    assert {row["device_id"] for row in pages[0]} == {"bench2"}
+    assert len(pages[0]) == COUNT
+
+
+def test_etag_answers_if_none_match_with_304(api):
+    status, headers, body = api("/samples", dict(RANGE, limit=4))
+    assert status == 200
+    etag = headers["ETag"]
+
+    status, headers, body = api("/samples", dict(RANGE, limit=4), {"If-None-Match": etag})
+    assert status == 304
+    assert body == b""
+    assert headers["ETag"] == etag
+
+    status, _, _ = api("/samples", dict(RANGE, limit=5), {"If-None-Match": etag})
+    assert status == 200
+
+
+def test_closed_range_is_served_from_cache(api):
+    hits = read_api.get_stats()["cache_hits"]
+    first = api("/samples", dict(RANGE, limit=4))
+    second = api("/samples", dict(RANGE, limit=4))
+
+    assert first[2] == second[2]
+    assert read_api.get_stats()["cache_hits"] == hits + 1
+
+
+def test_utc_offset_timestamps_match_naive_utc(api):
+    naive = _pages(api, 100)
+    zulu = _pages(api, 100, start=START.isoformat() + "Z")
+    offset = _pages(api, 100, start=(START - timedelta(hours=5)).isoformat() + "-05:00")
+
+    assert naive == zulu == offset
+
+
+def test_other_iso_forms_match_the_stored_form(api):
+    end = START + timedelta(minutes=3)
+    expected = _pages(api, 100, end=end.isoformat())
+    spaced = _pages(api, 100, start="2025-03-01 00:00", end="2025-03-01 00:03")
+    basic = _pages(api, 100, start="20250301", end=end.isoformat())
+
+    assert len(expected[0]) == 3 * len(DEVICES)
+    assert spaced == basic == expected
+
+
+def test_bad_parameters_are_rejected(api):
+    assert api("/samples", {"start": "yesterday", "end": RANGE["end"]})[0] == 400
+    assert api("/samples", dict(RANGE, after="2025-03-01T00:01:00"))[0] == 400
+    assert api("/samples", dict(RANGE, fields="no_such_field"))[0] == 400
+    assert api("/nope")[0] == 404
+
+
+def test_export_streams_every_row(api):
+    status, _, body = api("/export", dict(RANGE, fields="inside_temp_f"))
+
+    assert status == 200
+    rows = [json.loads(line) for line in body.decode().splitlines()]
+    assert len(rows) == COUNT * len(DEVICES)
@@ -0,0 +1,124 @@
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from greenhouse_gateway.persist import rollups, storage
+
+from conftest import count_rows, sample, write_samples
+
+START = datetime(2025, 1, 1)
+
+
+@pytest.fixture
+def retention(workdir, monkeypatch):
+    monkeypatch.setattr(rollups, "RAW_RETENTION_DAYS", 30.0)
+    monkeypatch.setattr(rollups, "RAW_ARCHIVE", True)
+
+
+def test_rollups_match_the_raw_samples(workdir):
+    storage.insert_sensor_readings(
+        sample(START + i * timedelta(seconds=10), inside_temp_f=60.0 + i % 13, grow_light_pwm=255 if i % 3 else 0)
+        for i in range(720)  # two hours, written in several batches
+    )
+    assert storage.flush(timeout=10)
+
+    raw = rollups.query_series("esp32", START.isoformat(), (START + timedelta(hours=2)).isoformat(), 1,
+                               names=["inside_temp_f", "grow_light_pwm"])
+    for resolution in (60, 600, 3600):
+        series = rollups.query_series("esp32", START.isoformat(), (START + timedelta(hours=2)).isoformat(),
+                                      resolution, names=["inside_temp_f", "grow_light_pwm"])
+        assert len(series) == 7200 // resolution
+        assert sum(row["samples"] for row in series) == 720
+        for row in series:
+            bucket = [r for r in raw if row["time"] <= r["time"] < _plus(row["time"], resolution)]
+            temps = [r["inside_temp_f"] for r in bucket]
+            assert row["inside_temp_f"] == pytest.approx(sum(temps) / len(temps))
+            assert row["inside_temp_f_min"] == min(temps)
+            assert row["inside_temp_f_max"] == max(temps)
+            assert row["grow_light_pwm_duty"] == pytest.approx(
+                sum(r["grow_light_pwm"] > 0 for r in bucket) / len(bucket)
+            )
+
+
+def _plus(timestamp: str, seconds: int) -> str:
+    return (datetime.fromisoformat(timestamp) + timedelta(seconds=seconds)).isoformat()
+
+
+def test_table_for_resolution():
+    assert rollups.table_for_resolution(1) == "samples"
+    assert rollups.table_for_resolution(300) == "samples_1m"
+    assert rollups.table_for_resolution(86400) == "samples_1h"
+
+
+def test_unknown_field_is_rejected(workdir):
+    with pytest.raises(ValueError, match="not rolled up"):
+        rollups.query_series("esp32", START.isoformat(), START.isoformat(), 60, names=["firmware_version"])
+
+
+def test_pruned_rows_move_to_the_archive(retention):
+    write_samples(START, 24, timedelta(hours=1))
+    write_samples(START + timedelta(days=60), 1, timedelta(hours=1))
+
+    assert rollups.prune_raw(now=START + timedelta(days=60)) == 24
+
+    conn = storage.get_connection()
+    assert conn.execute("SELECT count(*) FROM archive.samples").fetchone()[0] == 24
+    assert conn.execute("SELECT count(*) FROM main.samples").fetchone()[0] == 1
+    # The rollups keep the pruned history
+    hourly = rollups.query_series("esp32", START.isoformat(), (START + timedelta(days=1)).isoformat(), 3600)
+    assert len(hourly) == 24
+
+
+def test_prune_keeps_the_newest_row(retention):
+    write_samples(START, 5, timedelta(hours=1))
+
+    assert rollups.prune_raw(now=START + timedelta(days=60)) == 4
+    assert storage.get_connection().execute("SELECT count(*) FROM samples").fetchone()[0] == 1
+
+
+def test_prune_is_chunked_and_time_bounded(retention, monkeypatch):
+    monkeypatch.setattr(rollups, "RETENTION_CHUNK_ROWS", 3)
+    monkeypatch.setattr(rollups, "RETENTION_MAX_SECONDS", 0)
+    write_samples(START, 10, timedelta(hours=1))
+
+    assert rollups.prune_raw(now=START + timedelta(days=60)) == 0
+
+    monkeypatch.setattr(rollups, "RETENTION_MAX_SECONDS", 5)
+    assert rollups.prune_raw(now=START + timedelta(days=60)) == 9
+
+
+def test_archive_from_an_older_schema_gains_new_columns(retention):
+    archive = sqlite3.connect(rollups.ARCHIVE_PATH)
+    archive.execute("CREATE TABLE samples (device_id TEXT, timestamp_utc TEXT, inside_temp_f REAL)")
+    archive.commit()
+    archive.close()
+    write_samples(START, 24, timedelta(hours=1))
+    write_samples(START + timedelta(days=60), 1, timedelta(hours=1))
+
+    assert rollups.prune_raw(now=START + timedelta(days=60)) == 24
+
+    conn = storage.get_connection()
+    archived = {row[1] for row in conn.execute("PRAGMA archive.table_info(samples)")}
+    assert {"packet_key", "weather_stale", "inside_humidity_rh"} <= archived
+    assert conn.execute(
+        "SELECT count(*) FROM archive.samples WHERE inside_humidity_rh = 60.0"
+    ).fetchone()[0] == 24
+
+
+def test_retention_runs_on_its_own_thread_after_an_interval(retention, monkeypatch):
+    monkeypatch.setattr(rollups, "RETENTION_INTERVAL", 0.3)
+    write_samples(START, 24, timedelta(hours=1))
+    started = time.monotonic()
+
+    assert rollups.start_retention()
+    try:
+        assert count_rows() == 24  # nothing pruned at startup
+        while count_rows() > 1 and time.monotonic() - started < 5:
+            time.sleep(0.02)
+    finally:
+        rollups.stop_retention()
+
+    assert count_rows() == 1
+    assert time.monotonic() - started >= 0.3
@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from greenhouse_gateway.control import command_dispatcher
+from greenhouse_intelligence.baseline import scheduler
+
+BLOCKS = {
+    "REST": {"duration_min": 10, "fan_intent": {"circulation_fan": "OFF", "exhaust_fan": "OFF"}},
+    "VENT": {"duration_min": 5, "fan_intent": {"circulation_fan": "LOW", "exhaust_fan": "HIGH"}},
+}
+SEQUENCE = ["REST", "VENT", "REST"]
+ANCHOR = 1_000_000.0
+
+
+@pytest.fixture
+def baseline(workdir, monkeypatch):
+    monkeypatch.setattr(command_dispatcher, "_cache_key", None)
+    segments = scheduler.compile_timeline(SEQUENCE, BLOCKS)
+    return scheduler.BaselineScheduler(segments, state_path=workdir / "baseline_schedule.json")
+
+
+def test_compile_lays_blocks_back_to_back():
+    segments = scheduler.compile_timeline(SEQUENCE, BLOCKS)
+
+    assert [(s.offset, s.end, s.block) for s in segments] == [
+        (0.0, 600.0, "REST"), (600.0, 900.0, "VENT"), (900.0, 1500.0, "REST"),
+    ]
+    assert segments[1].exhaust_fan_pwm == scheduler.intent_pwm("exhaust_fan", "HIGH")
+
+
+def test_validate_reports_every_problem():
+    blocks = dict(BLOCKS, BAD={"duration_min": 0, "fan_intent": {"exhaust_fan": "TURBO", "heater": "ON"}})
+
+    problems = scheduler.validate(["REST", "MISSING"], blocks)
+
+    assert len(problems) == 4
+    with pytest.raises(ValueError, match="MISSING"):
+        scheduler.compile_timeline(["REST", "MISSING"], BLOCKS)
+
+
+@pytest.mark.parametrize("elapsed, cycle, block, index, remaining", [
+    (0, 0, "REST", 0, 600),
+    (599.5, 0, "REST", 0, 0.5),
+    (600, 0, "VENT", 1, 300),
+    (1499, 0, "REST", 2, 1),
+    (1500, 1, "REST", 0, 600),
+    (10 * 1500 + 700, 10, "VENT", 1, 200),
+    (-100, -1, "REST", 2, 100),
+])
+def test_locate(baseline, elapsed, cycle, block, index, remaining):
+    baseline.anchor = ANCHOR
+
+    found_cycle, segment, left = baseline.locate(ANCHOR + elapsed)
+
+    assert (found_cycle, segment.block, segment.index) == (cycle, block, index)
+    assert left == pytest.approx(remaining)
+
+
+def test_tick_writes_each_block_once(baseline):
+    baseline.start(ANCHOR)
+
+    assert baseline.tick(ANCHOR + 650) == pytest.approx(250)
+    first = command_dispatcher.COMMANDS_PATH.stat().st_mtime_ns
+    baseline.tick(ANCHOR + 700)
+
+    assert command_dispatcher.COMMANDS_PATH.stat().st_mtime_ns == first
+    commands = json.loads(command_dispatcher.COMMANDS_PATH.read_text())
+    assert commands["exhaust_fan_pwm"] == scheduler.intent_pwm("exhaust_fan", "HIGH")
+    assert commands["control_mode"] == scheduler.CONTROL_MODE
+    assert commands["control_reason"] == "VENT (2/3)"
+
+
+def test_saved_anchor_survives_a_restart(baseline, workdir):
+    baseline.start(ANCHOR)
+
+    again = scheduler.BaselineScheduler(baseline.segments, state_path=baseline.state_path)
+    assert again.load_or_start(ANCHOR + 5000) == ANCHOR
+
+    # Edited blocks invalidate the saved anchor
+    edited = scheduler.compile_timeline(["VENT", "REST"], BLOCKS)
+    fresh = scheduler.BaselineScheduler(edited, state_path=baseline.state_path)
+    assert fresh.load_or_start(ANCHOR + 5000) == ANCHOR + 5000
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+import sqlite3
+
+from greenhouse_gateway import fields
+from greenhouse_gateway.persist import storage
+
+from conftest import write_samples
+
+LEGACY_COLUMNS = ("timestamp_utc", "local_time", "inside_temp_f", "inside_humidity_rh")
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _create_legacy_db(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(f"""
+        CREATE TABLE samples (
+            timestamp_utc TEXT PRIMARY KEY,
+            local_time TEXT,
+            inside_temp_f REAL,
+            inside_humidity_rh REAL
+        );
+        CREATE INDEX idx_samples_timestamp ON samples(timestamp_utc);
+    """)
+    conn.executemany(
+        f"INSERT INTO samples ({', '.join(LEGACY_COLUMNS)}) VALUES (?, ?, ?, ?)",
+        [
+            ("2025-01-01T00:00:00", "2024-12-31T19:00:00", 70.0, 55.0),
+            ("2025-01-01T00:01:00", "2024-12-31T19:01:00", 70.5, 54.0),
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_single_device_table_is_rekeyed_by_device(workdir):
+    _create_legacy_db(storage.DB_PATH)
+
+    conn = storage.get_connection()
+
+    assert "samples_legacy" not in {
+        row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    }
+    columns = _columns(conn, "samples")
+    assert columns[:2] == ["device_id", "timestamp_utc"]
+    rows = conn.execute(
+        "SELECT device_id, timestamp_utc, inside_temp_f FROM samples ORDER BY timestamp_utc"
+    ).fetchall()
+    assert [tuple(row) for row in rows] == [
+        (fields.DEFAULT_DEVICE_ID, "2025-01-01T00:00:00", 70.0),
+        (fields.DEFAULT_DEVICE_ID, "2025-01-01T00:01:00", 70.5),
+    ]
+
+
+def test_second_device_can_share_a_timestamp_after_migration(workdir):
+    _create_legacy_db(storage.DB_PATH)
+
+    write_samples(datetime(2025, 1, 1), 1, timedelta(minutes=1), devices=("bench2",))
+
+    conn = storage.get_connection()
+    rows = conn.execute(
+        "SELECT device_id FROM samples WHERE timestamp_utc = '2025-01-01T00:00:00' ORDER BY device_id"
+    ).fetchall()
+    assert [row[0] for row in rows] == sorted(["bench2", fields.DEFAULT_DEVICE_ID])
+
+
+def test_migration_resumes_from_a_half_copied_table(workdir):
+    _create_legacy_db(storage.DB_PATH)
+    # Stopped after the rename, before the copy: samples_legacy is left over
+    conn = sqlite3.connect(storage.DB_PATH)
+    conn.executescript("""
+        DROP INDEX idx_samples_timestamp;
+        ALTER TABLE samples RENAME TO samples_legacy;
+    """)
+    conn.close()
+
+    conn = storage.get_connection()
+
+    assert conn.execute("SELECT count(*) FROM samples").fetchone()[0] == 2
+    assert _columns(conn, "samples_legacy") == []
+
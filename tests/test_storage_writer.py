@@ -0,0 +1,86 @@
+import queue
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from greenhouse_gateway.persist import storage
+
+from conftest import count_rows, sample
+
+START = datetime(2025, 1, 1)
+
+
+def _wait_for_rows(expected, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while count_rows() < expected and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return count_rows()
+
+
+def test_rows_wait_for_the_batch_delay(workdir, monkeypatch):
+    monkeypatch.setattr(storage, "BATCH_MAX_DELAY_MS", 60000)
+    for i in range(5):
+        storage.insert_sensor_reading(sample(START + timedelta(seconds=i)))
+
+    time.sleep(0.2)
+    assert count_rows() == 0  # not committed yet: the batch is still open
+
+    assert storage.flush(timeout=10)
+    assert count_rows() == 5
+
+
+def test_full_batch_is_committed_without_waiting(workdir, monkeypatch):
+    monkeypatch.setattr(storage, "BATCH_MAX_DELAY_MS", 60000)
+    monkeypatch.setattr(storage, "BATCH_MAX_ROWS", 5)
+    for i in range(5):
+        storage.insert_sensor_reading(sample(START + timedelta(seconds=i)))
+
+    assert _wait_for_rows(5) == 5
+
+
+def test_one_bad_row_does_not_lose_the_batch(workdir):
+    storage.insert_sensor_reading(sample(START))
+    storage.insert_sensor_reading(sample(START))  # same primary key
+    storage.insert_sensor_reading(sample(START + timedelta(seconds=1)))
+
+    assert storage.flush(timeout=10)
+    assert count_rows() == 2
+
+
+def test_close_commits_pending_rows(workdir, monkeypatch):
+    monkeypatch.setattr(storage, "BATCH_MAX_DELAY_MS", 60000)
+    storage.insert_sensor_reading(sample(START))
+
+    storage.close_connection()
+
+    assert count_rows() == 1
+
+
+def test_dead_writer_is_restarted(workdir, monkeypatch):
+    monkeypatch.setattr(storage, "_write_stats", dict.fromkeys(storage._write_stats, 0))
+    storage.insert_sensor_reading(sample(START))
+    assert storage.flush(timeout=10)
+    dead = storage._writer_thread
+    storage._write_queue.put(None)  # not a (table, rows) item: the writer crashes
+    dead.join(timeout=5)
+    assert not dead.is_alive()
+
+    storage.insert_sensor_reading(sample(START + timedelta(seconds=1)))
+    assert storage.flush(timeout=10)
+
+    assert storage._writer_thread is not dead
+    assert storage.get_write_stats()["restarts"] == 1
+    assert count_rows() == 2
+
+
+def test_full_queue_gives_up_after_the_enqueue_timeout(workdir, monkeypatch):
+    # A writer that is alive but stalled never makes room
+    monkeypatch.setattr(storage, "_ensure_writer", lambda: None)
+    monkeypatch.setattr(storage, "_write_queue", queue.Queue(maxsize=1))
+    monkeypatch.setattr(storage, "ENQUEUE_TIMEOUT", 0.2)
+    monkeypatch.setattr(storage, "_LIVENESS_CHECK_SECONDS", 0.05)
+    storage.insert_sensor_reading(sample(START))
+
+    with pytest.raises(RuntimeError, match="queue full"):
+        storage.insert_sensor_reading(sample(START + timedelta(seconds=1)))
@@ -0,0 +1,70 @@
+import json
+from collections import defaultdict
+
+import pytest
+
+from greenhouse_gateway.ingest import validation
+from greenhouse_gateway.persist import storage
+
+from conftest import count_rows
+
+
+@pytest.fixture
+def validator(workdir, monkeypatch):
+    monkeypatch.setattr(validation, "VALIDATION_POLICY", "nullify")
+    monkeypatch.setattr(validation, "_stats", {"checked": 0, "rejected_packets": 0, "nullified_fields": 0})
+    monkeypatch.setattr(validation, "_rejects", defaultdict(lambda: defaultdict(int)))
+
+
+def _quarantined():
+    assert storage.flush(timeout=10)
+    return count_rows("quarantined_packets")
+
+
+def test_good_packet_passes_unchanged(validator):
+    packet = {"jetson_timestamp": "2025-01-01T00:00:00", "inside_temp_f": 70, "firmware_version": "1.2"}
+
+    assert validation.validate_packet(packet) is packet
+    assert validation.get_stats() == {"checked": 1, "rejected_packets": 0, "nullified_fields": 0, "rejects": {}}
+
+
+@pytest.mark.parametrize("value, reason", [
+    ("70", validation.TYPE),
+    (True, validation.TYPE),
+    (float("nan"), validation.NAN),
+    (float("inf"), validation.INFINITE),
+    (1e6, validation.OUT_OF_RANGE),
+])
+def test_bad_value_is_nullified_and_quarantined(validator, value, reason):
+    cleaned = validation.validate_packet({"inside_temp_f": value, "inside_humidity_rh": 50.0})
+
+    assert cleaned == {"inside_temp_f": None, "inside_humidity_rh": 50.0}
+    assert validation.get_stats()["rejects"] == {"inside_temp_f": {reason: 1}}
+    assert validation.get_stats()["nullified_fields"] == 1
+    assert _quarantined() == 1
+
+
+def test_fractional_value_for_integer_field_is_a_type_error(validator):
+    cleaned = validation.validate_packet({"wifi_rssi": -60.5})
+
+    assert cleaned == {"wifi_rssi": None}
+    assert validation.get_stats()["rejects"] == {"wifi_rssi": {validation.TYPE: 1}}
+
+
+def test_reject_policy_skips_the_packet(validator, monkeypatch):
+    monkeypatch.setattr(validation, "VALIDATION_POLICY", "reject")
+
+    assert validation.validate_packet({"inside_temp_f": "hot"}) is None
+    assert validation.get_stats()["rejected_packets"] == 1
+
+    assert _quarantined() == 1
+    conn = storage.open_connection()
+    action, errors = conn.execute("SELECT action, errors FROM quarantined_packets").fetchone()
+    conn.close()
+    assert action == "rejected"
+    assert json.loads(errors) == {"inside_temp_f": validation.TYPE}
+
+
+def test_non_dict_packet_is_rejected(validator):
+    assert validation.validate_packet(["not", "a", "packet"]) is None
+    assert validation.get_stats()["rejects"] == {"packet": {validation.NOT_A_DICT: 1}}
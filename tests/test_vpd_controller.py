@@ -0,0 +1,72 @@
+import pytest
+
+from greenhouse_gateway.control import command_dispatcher, vpd_controller
+
+
+@pytest.fixture
+def controller(workdir, monkeypatch):
+    """An engaged controller on a fake clock; .sent lists (device_id, command)."""
+    monkeypatch.setattr(command_dispatcher, "_suspended", False)
+    monkeypatch.setattr(command_dispatcher, "_controller_context", {})
+    monkeypatch.setattr(command_dispatcher, "_last_sent", None)
+    monkeypatch.setattr(command_dispatcher, "_last_parsed", None)
+    monkeypatch.setattr(command_dispatcher, "_cache_key", None)
+    monkeypatch.setattr(vpd_controller, "SMOOTHING", 1.0)
+    clock = [1000.0]
+    monkeypatch.setattr(vpd_controller.time, "monotonic", lambda: clock[0])
+    command_dispatcher.write_commands({"exhaust_fan_pwm": 0})
+
+    sent = []
+    ctl = vpd_controller.VpdController(lambda cmd, device_id=None: sent.append((device_id, cmd)))
+    ctl.sent = sent
+    ctl.clock = clock
+    return ctl
+
+
+def _packet(vpd, device_id="bench2"):
+    return {"device_id": device_id, "inside_vpd_kpa": vpd}
+
+
+def test_humid_air_steps_up_once_per_interval(controller):
+    start = vpd_controller.INITIAL_STAGE
+    low = vpd_controller.VPD_MIN - 2 * vpd_controller.HYSTERESIS
+
+    controller.on_packet(_packet(low))
+    controller.on_packet(_packet(low))  # rate limited
+    controller.clock[0] += vpd_controller.MIN_STEP_SECONDS
+    controller.on_packet(_packet(low))
+
+    assert controller.active
+    assert controller.sent == [
+        ("bench2", vpd_controller.stage_command(start + 1)),
+        ("bench2", vpd_controller.stage_command(start + 2)),
+    ]
+    context = command_dispatcher.get_control_context("bench2")
+    assert context["control_mode"] == "vpd"
+    assert context["control_reason"].endswith(f"up, stage {start + 3}/{len(vpd_controller.STAGES)}")
+
+
+def test_deadband_holds_the_stage(controller):
+    middle = (vpd_controller.VPD_MIN + vpd_controller.VPD_MAX) / 2
+
+    controller.on_packet(_packet(middle))
+    controller.clock[0] += vpd_controller.MIN_STEP_SECONDS
+    controller.on_packet(_packet(vpd_controller.VPD_MAX + vpd_controller.HYSTERESIS / 2))
+
+    # Only the initial stage is published, to the default node on the shared topic
+    controller.on_packet(_packet(middle, device_id="esp32"))
+    assert controller.sent == [
+        ("bench2", vpd_controller.stage_command(vpd_controller.INITIAL_STAGE)),
+        (None, vpd_controller.stage_command(vpd_controller.INITIAL_STAGE)),
+    ]
+
+
+def test_file_switch_releases_the_fans(controller):
+    controller.on_packet(_packet(0.2))
+    controller.sent.clear()
+
+    command_dispatcher.write_commands({"exhaust_fan_pwm": 0, "controller": "file"})
+    controller.on_packet(_packet(0.05))
+
+    assert not controller.active
+    assert controller.sent == [(None, {"exhaust_fan_pwm": 0})]
@@ -0,0 +1,192 @@
+from collections import deque
+
+import pytest
+
+from greenhouse_gateway import fields
+from greenhouse_gateway.control import command_dispatcher
+from greenhouse_gateway.ingest import watchdog
+from greenhouse_gateway.ingest.watchdog import TimerWheel
+from greenhouse_gateway.persist import storage
+
+
+# ---------------------------------------------------------------------
+# TimerWheel
+# ---------------------------------------------------------------------
+
+def test_wheel_fires_at_the_deadline():
+    wheel = TimerWheel(1.0, slots=8)
+    wheel.set(("a", None), 5.0)
+
+    assert wheel.advance(4.9) == []
+    assert wheel.advance(5.0) == [("a", None)]
+    assert len(wheel) == 0
+    assert wheel.advance(20.0) == []
+
+
+def test_wheel_refresh_moves_the_entry_lazily():
+    wheel = TimerWheel(1.0, slots=8)
+    key = ("a", None)
+    wheel.set(key, 5.0)
+    wheel.set(key, 7.0)  # refreshed: the slot-5 entry is rescheduled when it comes due
+
+    assert wheel.advance(5.0) == []
+    assert len(wheel) == 1
+    assert wheel.advance(7.0) == [key]
+
+
+def test_wheel_keeps_deadlines_beyond_one_revolution():
+    wheel = TimerWheel(1.0, slots=8)
+    wheel.set(("far", None), 20.0)
+    wheel.set(("near", None), 3.0)
+
+    assert wheel.advance(10.0) == [("near", None)]  # slot 20 % 8 == 4 passed once already
+    assert wheel.advance(19.0) == []
+    assert wheel.advance(20.0) == [("far", None)]
+
+
+def test_wheel_catches_up_after_a_long_pause():
+    wheel = TimerWheel(1.0, slots=8)
+    keys = [(str(i), None) for i in range(20)]
+    for i, key in enumerate(keys):
+        wheel.set(key, float(i))
+
+    assert sorted(wheel.advance(1000.0)) == sorted(keys)
+    assert len(wheel) == 0
+
+
+# ---------------------------------------------------------------------
+# Device / field deadlines
+# ---------------------------------------------------------------------
+
+@pytest.fixture
+def events(workdir, monkeypatch):
+    """Fresh watchdog state on a wheel starting at t=0; returns (device, sensor, event) seen."""
+    monkeypatch.setattr(watchdog, "_wheel", TimerWheel(watchdog.CHECK_SECONDS))
+    monkeypatch.setattr(watchdog, "_last_values", {})
+    monkeypatch.setattr(watchdog, "_stale", {})
+    monkeypatch.setattr(watchdog, "_recent", deque(maxlen=watchdog.RECENT_EVENTS))
+    monkeypatch.setattr(watchdog, "_publish", None)
+    monkeypatch.setattr(watchdog, "STUCK_TIMEOUT", 120.0)
+    seen = []
+    monkeypatch.setattr(watchdog, "_listeners", [
+        lambda event: seen.append((event["device_id"], event["sensor"], event["event"]))
+    ])
+    return seen
+
+
+def _packet(device_id="bench2", value=70.0):
+    packet = {"device_id": device_id}
+    for offset, (_, source) in enumerate(watchdog._SOURCES):
+        packet[source] = value + offset
+    return packet
+
+
+def _run(start, end, packet=None, every=10.0):
+    """Tick every CHECK_SECONDS from start to end, observing `packet` every `every` s."""
+    t = start
+    while t <= end:
+        if packet is not None and (t - start) % every == 0:
+            watchdog.observe(packet, now=t)
+        watchdog.tick(now=t)
+        t += watchdog.CHECK_SECONDS
+
+
+def test_silent_device_goes_offline_and_comes_back(events):
+    watchdog.observe(_packet(), now=0.0)
+    _run(0.0, watchdog.DEVICE_TIMEOUT + watchdog.CHECK_SECONDS)
+
+    assert events == [("bench2", None, "offline")]
+    assert watchdog.get_status()["stale"] == {"bench2": ["device"]}
+
+    watchdog.observe(_packet(value=71.0), now=100.0)
+    assert events[-1] == ("bench2", None, "online")
+    assert watchdog.get_status()["stale"] == {}
+
+
+def test_offline_device_fields_are_not_reported_stuck(events):
+    watchdog.observe(_packet(), now=0.0)
+    _run(0.0, 3 * watchdog.STUCK_TIMEOUT)
+
+    assert events == [("bench2", None, "offline")]
+
+    # Back online with the same values: field deadlines restart from now
+    restart = 3 * watchdog.STUCK_TIMEOUT + watchdog.CHECK_SECONDS
+    _run(restart, restart + watchdog.STUCK_TIMEOUT - watchdog.CHECK_SECONDS, _packet())
+    assert events == [("bench2", None, "offline"), ("bench2", None, "online")]
+
+
+def test_unchanged_values_are_stuck_until_they_change(events):
+    _run(0.0, watchdog.STUCK_TIMEOUT + watchdog.CHECK_SECONDS, _packet())
+
+    stuck = sorted(sensor for _, sensor, event in events if event == "stuck")
+    assert stuck == sorted(name for name, _ in watchdog._SOURCES)
+    assert all(event == "stuck" for _, _, event in events)
+
+    events.clear()
+    t = watchdog.STUCK_TIMEOUT + 2 * watchdog.CHECK_SECONDS
+    watchdog.observe(_packet(value=75.0), now=t)
+    assert sorted(sensor for _, sensor, event in events if event == "recovered") == stuck
+    assert watchdog.get_status()["stale"] == {}
+
+
+def test_events_are_recorded(events):
+    watchdog.observe(_packet(), now=0.0)
+    _run(0.0, watchdog.DEVICE_TIMEOUT + watchdog.CHECK_SECONDS)
+    assert storage.flush(timeout=10)
+
+    rows = storage.get_connection().execute(
+        "SELECT device_id, sensor, event FROM sensor_events"
+    ).fetchall()
+    assert [tuple(row) for row in rows] == [("bench2", None, "offline")]
+
+
+@pytest.fixture
+def safe_mode(events, monkeypatch):
+    """Safe mode on; returns the (device_id, command) published."""
+    monkeypatch.setattr(watchdog, "SAFE_MODE", True)
+    monkeypatch.setattr(watchdog, "_safe_devices", set())
+    monkeypatch.setattr(command_dispatcher, "_last_sent", None)
+    monkeypatch.setattr(command_dispatcher, "_last_parsed", None)
+    monkeypatch.setattr(command_dispatcher, "_cache_key", None)
+    monkeypatch.setattr(command_dispatcher, "_suspended", False)
+    command_dispatcher.write_commands({"exhaust_fan_pwm": 100, "devices": {"bench2": {"exhaust_fan_pwm": 150}}})
+    sent = []
+    monkeypatch.setattr(watchdog, "_publish", lambda cmd, device_id=None: sent.append((device_id, cmd)))
+    return sent
+
+
+def test_safe_mode_and_recovery_only_reach_that_device(safe_mode):
+    watchdog.observe(_packet("bench2"), now=0.0)
+    _run(0.0, watchdog.DEVICE_TIMEOUT + watchdog.CHECK_SECONDS)
+    watchdog.observe(_packet("bench2", value=71.0), now=100.0)
+
+    assert safe_mode == [
+        ("bench2", watchdog.SAFE_COMMANDS),
+        ("bench2", {"exhaust_fan_pwm": 150}),
+    ]
+
+
+def test_default_device_safe_mode_waits_for_the_others(safe_mode, events):
+    watchdog.observe(_packet(fields.DEFAULT_DEVICE_ID), now=0.0)
+    # bench2 keeps reporting while the default device goes silent
+    _run(0.0, watchdog.DEVICE_TIMEOUT + watchdog.CHECK_SECONDS, _packet("bench2", value=80.0))
+
+    assert (fields.DEFAULT_DEVICE_ID, None, "offline") in events
+    assert safe_mode == []
+
+    # Back online: nothing to undo
+    watchdog.observe(_packet(fields.DEFAULT_DEVICE_ID, value=71.0), now=100.0)
+    assert safe_mode == []
+
+
+def test_lone_default_device_uses_the_shared_topic(safe_mode):
+    watchdog.observe(_packet(fields.DEFAULT_DEVICE_ID), now=0.0)
+    _run(0.0, watchdog.DEVICE_TIMEOUT + watchdog.CHECK_SECONDS)
+    watchdog.observe(_packet(fields.DEFAULT_DEVICE_ID, value=71.0), now=100.0)
+
+    # The shared command reset bench2 too, so its override follows
+    assert safe_mode == [
+        (None, watchdog.SAFE_COMMANDS),
+        (None, {"exhaust_fan_pwm": 100}),
+        ("bench2", {"exhaust_fan_pwm": 150}),
+    ]
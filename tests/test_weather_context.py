@@ -0,0 +1,64 @@
+from datetime import datetime
+
+import pytest
+
+from greenhouse_gateway.enrich import weather_context
+
+START = datetime(2026, 1, 1).timestamp()
+
+HOURLY = {
+    "time": [START + 3600 * i for i in range(4)],
+    "outside_temp_f": [30.0, 40.0, 50.0, 60.0],
+    "outside_humidity_rh": [80.0, 70.0, None, 50.0],
+    "weather_code": [0, 3, 61, 61],
+}
+
+
+@pytest.fixture
+def provider(tmp_path, monkeypatch):
+    """Stub provider with a fresh forecast; returns its fetch time."""
+    monkeypatch.setattr(weather_context, "_providers", dict(weather_context._providers, stub=lambda: HOURLY))
+    monkeypatch.setattr(weather_context, "PROVIDER", "stub")
+    monkeypatch.setattr(weather_context, "CACHE_PATH", tmp_path / "weather_forecast.json")
+    monkeypatch.setattr(weather_context, "_forecast", None)
+    monkeypatch.setattr(weather_context, "_cache_loaded", True)
+    assert weather_context.refresh()
+    return weather_context._forecast.fetched_at
+
+
+def test_lookup_interpolates_between_hours(provider):
+    weather = weather_context.lookup(START + 4500, now=provider)
+
+    assert weather["outside_temp_f"] == pytest.approx(42.5)
+    assert weather["outside_humidity_rh"] == 70.0  # next hour missing: nearest hour
+    assert weather["weather_code"] == "3"
+    assert weather["cloud_coverage_pct"] is None  # not provided
+
+
+def test_uncovered_or_old_forecast_is_stale(provider, monkeypatch):
+    assert weather_context.lookup(START - 1, now=provider) is None
+    assert weather_context.lookup(START + 4 * 3600, now=provider) is None
+    assert weather_context.lookup(START, now=provider + weather_context.MAX_AGE_SECONDS + 1) is None
+
+    monkeypatch.setattr(weather_context, "MAX_AGE_SECONDS", float("inf"))
+    weather = weather_context.enrich_weather(datetime.fromtimestamp(START - 3600))
+    assert weather["weather_stale"] == 1
+    assert weather["outside_temp_f"] is None
+
+
+def test_cached_forecast_survives_a_restart(provider, monkeypatch):
+    monkeypatch.setattr(weather_context, "_forecast", None)
+    monkeypatch.setattr(weather_context, "_cache_loaded", False)
+    monkeypatch.setattr(weather_context, "MAX_AGE_SECONDS", float("inf"))
+
+    weather = weather_context.enrich_weather(datetime.fromtimestamp(START + 3600))
+
+    assert weather["weather_stale"] == 0
+    assert weather["outside_temp_f"] == 40.0
+
+
+def test_uneven_forecast_is_refused(provider, monkeypatch):
+    monkeypatch.setitem(weather_context._providers, "stub", lambda: dict(HOURLY, time=[0, 3600, 9000, 10800]))
+
+    assert not weather_context.refresh()
+    assert weather_context.lookup(START, now=provider) is not None  # previous forecast kept
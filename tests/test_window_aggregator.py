@@ -0,0 +1,79 @@
+import random
+from statistics import mode
+
+import pytest
+
+from greenhouse_gateway.publish.window_aggregator import WindowAggregator, WindowSet
+
+
+def _aggregator(window_seconds=60.0, **kwargs):
+    return WindowAggregator(
+        window_seconds,
+        averaging_fields=["temp"],
+        mode_fields=["fan"],
+        passthrough_fields=["local_time"],
+        **kwargs,
+    )
+
+
+def test_result_matches_a_full_pass_over_the_window():
+    rng = random.Random(7)
+    packets = [
+        {"temp": rng.uniform(50, 90), "fan": rng.choice([0, 128, 255]), "local_time": str(i)}
+        for i in range(500)
+    ]
+    packets[10]["temp"] = None  # non-numeric values are skipped
+    aggregator = _aggregator()
+    for packet in packets:
+        aggregator.add(packet, now=0.0)
+
+    result = aggregator.result()
+
+    temps = [p["temp"] for p in packets if p["temp"] is not None]
+    assert result["temp"] == pytest.approx(sum(temps) / len(temps))
+    assert result["temp_min"] == min(temps)
+    assert result["temp_max"] == max(temps)
+    assert result["fan"] == mode(p["fan"] for p in packets)
+    assert result["local_time"] == "499"
+    assert result["sample_count"] == 500
+
+
+def test_mode_ties_go_to_the_earliest_value():
+    aggregator = _aggregator()
+    for fan in (255, 0, 0, 255):
+        aggregator.add({"fan": fan}, now=0.0)
+
+    assert aggregator.result()["fan"] == 255
+
+
+def test_mode_counter_stays_bounded():
+    aggregator = _aggregator(mode_capacity=3)
+    for fan in [1] * 5 + list(range(100, 200)):
+        aggregator.add({"fan": fan}, now=0.0)
+
+    assert len(aggregator._modes[0]) == 3
+    assert aggregator.result()["fan"] == 1
+
+
+def test_flush_starts_a_new_window():
+    aggregator = _aggregator(window_seconds=60.0)
+    assert not aggregator.due(now=0.0)
+    aggregator.add({"temp": 70.0}, now=0.0)
+    assert not aggregator.due(now=59.0)
+    assert aggregator.due(now=60.0)
+
+    assert aggregator.flush(now=60.0)["temp"] == 70.0
+    assert aggregator.result() == {}
+    assert not aggregator.due(now=100.0)
+
+
+def test_window_set_flushes_each_window_on_its_own_schedule():
+    flushed = []
+    windows = WindowSet()
+    windows.add_window("1m", _aggregator(60.0), lambda name, result: flushed.append((name, result["sample_count"])))
+    windows.add_window("5m", _aggregator(300.0), lambda name, result: flushed.append((name, result["sample_count"])))
+
+    for second in range(0, 301, 30):
+        windows.add({"temp": 70.0}, now=float(second))
+
+    assert flushed == [("1m", 3), ("1m", 2), ("1m", 2), ("1m", 2), ("1m", 2), ("5m", 11)]